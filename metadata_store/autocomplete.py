@@ -0,0 +1,345 @@
+import bisect
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from metadata_store.models import Location, Department, Category, SubCategory, Product, Tombstone, HIERARCHY_PATHS
+from metadata_store.shard_directory import shard_directory
+from metadata_store.sharding import CATALOG_SHARDS
+
+logger = logging.getLogger(__name__)
+
+AUTOCOMPLETE_INDEX_ENABLED = getattr(settings, 'AUTOCOMPLETE_INDEX_ENABLED', True)
+AUTOCOMPLETE_INDEX_MAX_ENTRIES = getattr(settings, 'AUTOCOMPLETE_INDEX_MAX_ENTRIES', 2000000)
+AUTOCOMPLETE_REFRESH_INTERVAL = getattr(settings, 'AUTOCOMPLETE_REFRESH_INTERVAL', 5)
+
+AUTOCOMPLETE_MODELS = {model._meta.model_name: model for model in (Location, Department, Category, SubCategory, Product)}
+
+# Changes are re-read this far behind the last sync, so rows committed by transactions
+# that started before it aren't missed; applying them again is harmless.
+SYNC_OVERLAP = timedelta(seconds=60)
+
+# Above this many changes per sync the index is re-sorted once instead of per change.
+INCREMENTAL_SYNC_LIMIT = 1000
+
+
+def get_parent_field(model):
+    """
+    Returns the name of the foreign key to a model's parent in the hierarchy.
+
+    Args:
+        model (Model): A catalog model.
+
+    Returns:
+        str: The field name, e.g. ``subcategory``, or None for locations.
+    """
+    return HIERARCHY_PATHS[model].split('__')[0] or None
+
+
+def get_scope_lookup(model, scope_model_name):
+    """
+    Returns the lookup filtering a model's objects to those under (or being) a hierarchy node.
+
+    Args:
+        model (Model): A catalog model.
+        scope_model_name (str): The model name of the node, ``location`` or ``department``.
+
+    Returns:
+        str: The lookup, e.g. ``subcategory__category__department``, or None if the model
+        is above the node in the hierarchy.
+    """
+    if model._meta.model_name == scope_model_name:
+        return 'pk'
+    parts = HIERARCHY_PATHS[model].split('__')
+    if scope_model_name not in parts:
+        return None
+    return '__'.join(parts[:parts.index(scope_model_name) + 1])
+
+
+def search_database(prefix, model_names, location_id=None, department_id=None, limit=10):
+    """
+    Finds the objects whose name starts with a prefix, case-insensitively, with one query
+    per model and shard served by the ``UPPER(name) text_pattern_ops`` indexes.
+
+    Args:
+        prefix (str): The name prefix.
+        model_names (list): The model names to search.
+        location_id (str): Restricts the results to this location's subtree.
+        department_id (str): Restricts the results to this department's subtree.
+        limit (int): The maximum number of results.
+
+    Returns:
+        list: The matches ordered by name, as dicts with ``type``, ``id``, ``name`` and ``parent_id``.
+    """
+    shards = CATALOG_SHARDS
+    if location_id is not None:
+        shards = [shard for shard in [shard_directory.get_shard(location_id)] if shard]
+    results = []
+    for model_name, alias in ((model_name, alias) for model_name in model_names for alias in shards):
+        model = AUTOCOMPLETE_MODELS[model_name]
+        queryset = model.objects.using(alias).filter(name__istartswith=prefix)
+        for scope_model_name, scope_id in (('location', location_id), ('department', department_id)):
+            if scope_id is None:
+                continue
+            lookup = get_scope_lookup(model, scope_model_name)
+            if lookup is None:
+                queryset = queryset.none()
+                break
+            queryset = queryset.filter(**{lookup: scope_id})
+        parent_field = get_parent_field(model)
+        fields = ['pk', 'name', f'{parent_field}_id'] if parent_field else ['pk', 'name']
+        for pk, name, *parent_id in queryset.order_by('name').values_list(*fields)[:limit]:
+            results.append({'type': model_name, 'id': str(pk), 'name': name,
+                            'parent_id': str(parent_id[0]) if parent_id else None})
+    return sorted(results, key=lambda result: (result['name'].casefold(), result['id']))[:limit]
+
+
+class PrefixIndex:
+    """
+    In-memory index of the catalog's names for prefix lookups.
+
+    Names are kept casefolded in a sorted list, so the matches of a prefix are a contiguous
+    run found by binary search. Saves and deletes in this process are applied by the model
+    signals once they commit; changes made by other processes are picked up at most every
+    ``refresh_interval`` seconds from ``updated_at`` and the tombstones, like the change feed.
+
+    Catalogs of more than ``max_entries`` names aren't indexed and lookups fall back to
+    `search_database`.
+    """
+    def __init__(self, max_entries, refresh_interval, enabled=True):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.refresh_interval = refresh_interval
+        self.keys = []
+        self.entries = {}
+        self.loaded = False
+        self.available = False
+        self.watermark = None
+        self.refreshed_at = 0
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+
+    def fetch(self, model, queryset):
+        """
+        Reads the index entries of a queryset.
+
+        Args:
+            model (Model): The model of the queryset.
+            queryset (QuerySet): The objects to read.
+
+        Returns:
+            list: ``(pk, (model_name, name, parent_id))`` pairs.
+        """
+        model_name = model._meta.model_name
+        parent_field = get_parent_field(model)
+        fields = ['pk', 'name', f'{parent_field}_id'] if parent_field else ['pk', 'name']
+        return [
+            (str(pk), (model_name, name, str(parent_id[0]) if parent_id else None))
+            for pk, name, *parent_id in queryset.values_list(*fields).iterator(chunk_size=10000)
+        ]
+
+    def load(self):
+        """
+        Builds the index from the database.
+        """
+        started_at = timezone.now()
+        total = sum(model.objects.using(alias).count()
+                    for model in AUTOCOMPLETE_MODELS.values() for alias in CATALOG_SHARDS)
+        if total > self.max_entries:
+            logger.warning("The catalog has %s names, more than the %s the autocomplete index holds; "
+                           "lookups will use the database", total, self.max_entries)
+            self.loaded = True
+            return
+        entries = {}
+        for model in AUTOCOMPLETE_MODELS.values():
+            for alias in CATALOG_SHARDS:
+                entries.update(self.fetch(model, model.objects.using(alias)))
+        keys = sorted((name.casefold(), pk) for pk, (model_name, name, parent_id) in entries.items())
+        with self.lock:
+            self.entries, self.keys = entries, keys
+            self.watermark = started_at
+            self.loaded = self.available = True
+
+    def sync(self):
+        """
+        Applies the changes made since the last load or sync, by this or other processes.
+        """
+        started_at = timezone.now()
+        since = self.watermark - SYNC_OVERLAP
+        upserts = []
+        removals = []
+        for alias in CATALOG_SHARDS:
+            for model in AUTOCOMPLETE_MODELS.values():
+                upserts.extend(self.fetch(model, model.objects.using(alias).filter(updated_at__gte=since)))
+            removals.extend(str(pk) for pk in Tombstone.objects.using(alias).filter(
+                updated_at__gte=since, model_name__in=AUTOCOMPLETE_MODELS).values_list('object_id', flat=True))
+
+        with self.lock:
+            if len(upserts) + len(removals) > INCREMENTAL_SYNC_LIMIT:
+                self.entries.update(upserts)
+                for pk in removals:
+                    self.entries.pop(pk, None)
+                self.keys = sorted((name.casefold(), pk) for pk, (model_name, name, parent_id) in self.entries.items())
+            else:
+                for pk, entry in upserts:
+                    self.put(pk, entry)
+                for pk in removals:
+                    self.discard(pk)
+            self.watermark = started_at
+
+    def refresh(self):
+        """
+        Loads the index on first use and syncs it when it is older than ``refresh_interval``.
+
+        Lookups don't wait for a sync already running in another thread; they use the
+        index as it is.
+        """
+        if self.loaded and time.monotonic() - self.refreshed_at < self.refresh_interval:
+            return
+        if not self.refresh_lock.acquire(blocking=not self.loaded):
+            return
+        try:
+            if not self.loaded:
+                self.load()
+            elif self.available:
+                try:
+                    self.sync()
+                except Exception:
+                    logger.exception("Failed to sync the autocomplete index")
+            self.refreshed_at = time.monotonic()
+        finally:
+            self.refresh_lock.release()
+
+    def put(self, pk, entry):
+        """
+        Adds or replaces an entry; the caller holds ``lock``.
+        """
+        previous = self.entries.get(pk)
+        self.entries[pk] = entry
+        if previous is not None:
+            if previous[1] == entry[1]:
+                return
+            self.remove_key((previous[1].casefold(), pk))
+        bisect.insort(self.keys, (entry[1].casefold(), pk))
+
+    def discard(self, pk):
+        """
+        Removes an entry if present; the caller holds ``lock``.
+        """
+        previous = self.entries.pop(pk, None)
+        if previous is not None:
+            self.remove_key((previous[1].casefold(), pk))
+
+    def remove_key(self, key):
+        """
+        Removes a key from the sorted keys; the caller holds ``lock``.
+        """
+        position = bisect.bisect_left(self.keys, key)
+        if position < len(self.keys) and self.keys[position] == key:
+            del self.keys[position]
+
+    def upsert(self, instance):
+        """
+        Indexes a saved catalog object.
+
+        Args:
+            instance (Model): The saved object.
+        """
+        if not self.available:
+            return
+        model = type(instance)
+        parent_field = get_parent_field(model)
+        parent_id = getattr(instance, f'{parent_field}_id') if parent_field else None
+        with self.lock:
+            self.put(str(instance.pk), (model._meta.model_name, instance.name,
+                                        str(parent_id) if parent_id else None))
+
+    def remove(self, pk):
+        """
+        Removes a deleted catalog object from the index.
+
+        Args:
+            pk: The primary key of the object.
+        """
+        if not self.available:
+            return
+        with self.lock:
+            self.discard(str(pk))
+
+    def in_scope(self, pk, scope_id):
+        """
+        Checks whether an entry is a hierarchy node or under it; the caller holds ``lock``.
+        """
+        while pk is not None:
+            if pk == scope_id:
+                return True
+            entry = self.entries.get(pk)
+            pk = entry[2] if entry else None
+        return False
+
+    def search(self, prefix, model_names, location_id=None, department_id=None, limit=10):
+        """
+        Finds the objects whose name starts with a prefix, case-insensitively.
+
+        Args:
+            prefix (str): The name prefix.
+            model_names (list): The model names to search.
+            location_id (str): Restricts the results to this location's subtree.
+            department_id (str): Restricts the results to this department's subtree.
+            limit (int): The maximum number of results.
+
+        Returns:
+            list: The matches ordered by name, as dicts with ``type``, ``id``, ``name`` and
+            ``parent_id``, or None if the index isn't available.
+        """
+        if not self.enabled:
+            return None
+        self.refresh()
+        if not self.available:
+            return None
+        prefix = prefix.casefold()
+        scope_ids = [str(scope_id) for scope_id in (location_id, department_id) if scope_id is not None]
+        results = []
+        with self.lock:
+            position = bisect.bisect_left(self.keys, (prefix,))
+            while position < len(self.keys) and len(results) < limit:
+                key, pk = self.keys[position]
+                if not key.startswith(prefix):
+                    break
+                model_name, name, parent_id = self.entries[pk]
+                if model_name in model_names and all(self.in_scope(pk, scope_id) for scope_id in scope_ids):
+                    results.append({'type': model_name, 'id': pk, 'name': name, 'parent_id': parent_id})
+                position += 1
+        return results
+
+
+autocomplete_index = PrefixIndex(
+    max_entries=AUTOCOMPLETE_INDEX_MAX_ENTRIES,
+    refresh_interval=AUTOCOMPLETE_REFRESH_INTERVAL,
+    enabled=AUTOCOMPLETE_INDEX_ENABLED,
+)
+
+
+def autocomplete(prefix, model_names, location_id=None, department_id=None, limit=10):
+    """
+    Finds the objects whose name starts with a prefix, from the in-memory index when it is
+    available and from the database otherwise.
+
+    Args:
+        prefix (str): The name prefix.
+        model_names (list): The model names to search.
+        location_id (str): Restricts the results to this location's subtree.
+        department_id (str): Restricts the results to this department's subtree.
+        limit (int): The maximum number of results.
+
+    Returns:
+        list: The matches ordered by name, as dicts with ``type``, ``id``, ``name`` and ``parent_id``.
+    """
+    results = autocomplete_index.search(prefix, model_names, location_id, department_id, limit)
+    if results is None:
+        results = search_database(prefix, model_names, location_id, department_id, limit)
+    return results
@@ -0,0 +1,145 @@
+import hashlib
+import math
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from metadata_store.sharding import get_catalog_db
+
+
+class RedisBloomFilter:
+    """
+    Bloom filter kept in a Redis bitmap, so every worker shares the same set of members.
+
+    ``might_contain`` answers False only for values that were never added, which lets
+    lookups of unknown ids be rejected without touching the database. Until the filter
+    has been built with `rebuild` it answers True for everything.
+
+    Attributes:
+        key (str): The Redis key of the bitmap.
+        size (int): The number of bits in the bitmap.
+        hash_count (int): The number of bits set per value.
+    """
+    def __init__(self, name, capacity, error_rate, enabled=True):
+        self.enabled = enabled
+        self.key = f"bloom:{name}"
+        self.ready_key = f"{self.key}:ready"
+        self.size = int(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+
+    def get_offsets(self, value):
+        """
+        Returns the bit offsets of a value, using double hashing over a single digest.
+
+        Args:
+            value: The value, converted with ``str``.
+
+        Returns:
+            list: The bit offsets.
+        """
+        digest = hashlib.blake2b(str(value).encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big') | 1
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+
+    def add(self, value):
+        """
+        Adds a value to the filter, and again once the surrounding transaction commits so
+        the value also lands in a filter swapped in by a concurrent `rebuild`.
+
+        Args:
+            value: The value to add.
+        """
+        if not self.enabled:
+            return
+        self._set_bits(self.key, [value])
+        transaction.on_commit(lambda: self._set_bits(self.key, [value]), using=get_catalog_db())
+
+    def might_contain(self, value):
+        """
+        Checks whether a value may have been added to the filter.
+
+        Args:
+            value: The value to check.
+
+        Returns:
+            bool: False if the value was definitely never added, True otherwise.
+        """
+        return self.might_contain_many([value])[0]
+
+    def might_contain_many(self, values):
+        """
+        Checks whether values may have been added to the filter, in one Redis round trip.
+
+        Args:
+            values (list): The values to check.
+
+        Returns:
+            list: Per value, in order, False if it was definitely never added, True otherwise.
+        """
+        if not self.enabled or not values:
+            return [True] * len(values)
+        client = get_redis_connection('default')
+        pipeline = client.pipeline(transaction=False)
+        pipeline.exists(self.ready_key)
+        for value in values:
+            for offset in self.get_offsets(value):
+                pipeline.getbit(self.key, offset)
+        ready, *bits = pipeline.execute()
+        if not ready:
+            return [True] * len(values)
+        return [all(bits[i:i + self.hash_count]) for i in range(0, len(bits), self.hash_count)]
+
+    def rebuild(self, querysets, chunk_size=10000):
+        """
+        Rebuilds the filter from the primary keys of querysets and swaps it in atomically.
+
+        Values created while the filter is built are added again after the swap.
+
+        Args:
+            querysets (list): The querysets, e.g. one per shard, whose objects' primary keys
+                are the members.
+            chunk_size (int): The number of keys written per Redis round trip.
+
+        Returns:
+            int: The number of values added.
+        """
+        started_at = timezone.now()
+        building_key = f"{self.key}:building"
+        client = get_redis_connection('default')
+        client.delete(building_key)
+        client.setbit(building_key, self.size - 1, 0)
+        count = 0
+        chunk = []
+        for queryset in querysets:
+            for pk in queryset.values_list('pk', flat=True).iterator(chunk_size=chunk_size):
+                chunk.append(pk)
+                if len(chunk) == chunk_size:
+                    count += self._set_bits(building_key, chunk)
+                    chunk = []
+        count += self._set_bits(building_key, chunk)
+        client.rename(building_key, self.key)
+        client.set(self.ready_key, 1)
+        for queryset in querysets:
+            self._set_bits(self.key, queryset.filter(created_at__gte=started_at).values_list('pk', flat=True))
+        return count
+
+    def _set_bits(self, key, values):
+        client = get_redis_connection('default')
+        pipeline = client.pipeline(transaction=False)
+        count = 0
+        for value in values:
+            for offset in self.get_offsets(value):
+                pipeline.setbit(key, offset, 1)
+            count += 1
+        pipeline.execute()
+        return count
+
+
+product_id_filter = RedisBloomFilter(
+    'product_ids',
+    capacity=getattr(settings, 'PRODUCT_BLOOM_FILTER_CAPACITY', 1000000),
+    error_rate=getattr(settings, 'PRODUCT_BLOOM_FILTER_ERROR_RATE', 0.01),
+    enabled=getattr(settings, 'PRODUCT_BLOOM_FILTER_ENABLED', False),
+)
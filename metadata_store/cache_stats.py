@@ -0,0 +1,207 @@
+import atexit
+import logging
+import pickle
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+CACHE_STATS_ENABLED = getattr(settings, 'CACHE_STATS_ENABLED', False)
+CACHE_STATS_FLUSH_INTERVAL = getattr(settings, 'CACHE_STATS_FLUSH_INTERVAL', 10)
+CACHE_STATS_TRACKED_KEYS = getattr(settings, 'CACHE_STATS_TRACKED_KEYS', 10000)
+
+STATS_KEY = 'cache_stats'
+PREFIXES_KEY = f'{STATS_KEY}:prefixes'
+SIZES_KEY = f'{STATS_KEY}:sizes'
+HITS_KEY = f'{STATS_KEY}:hits'
+COUNTERS = ('hits', 'misses', 'sets', 'bytes')
+
+
+def get_prefix_key(prefix):
+    return f'{STATS_KEY}:prefix:{prefix}'
+
+
+def get_size(value):
+    """
+    Returns the size of a cached value, as pickled by the cache backend.
+    """
+    return len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+
+class CacheStats:
+    """
+    Counts cache hits, misses and written bytes per key prefix, and the size and hits of
+    individual keys, shared by every worker through Redis.
+
+    Counts are buffered in the process and added to Redis at most every ``flush_interval``
+    seconds in one pipeline, so recording costs no round trip. Per key, the size of the
+    ``tracked_keys`` largest entries written is kept along with the hits of recently read
+    keys, for `report` to list the biggest and coldest entries.
+    """
+    def __init__(self, flush_interval, tracked_keys, enabled=True):
+        self.enabled = enabled
+        self.flush_interval = flush_interval
+        self.tracked_keys = tracked_keys
+        self.lock = threading.Lock()
+        self.flushed_at = time.monotonic()
+        self.reset_buffers()
+
+    def reset_buffers(self):
+        self.counters = defaultdict(Counter)
+        self.key_hits = Counter()
+        self.key_sizes = {}
+
+    def record_hits(self, prefix, keys):
+        """
+        Counts reads served from the cache.
+
+        Args:
+            prefix (str): The key prefix.
+            keys (iterable): The keys read.
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            for key in keys:
+                self.counters[prefix]['hits'] += 1
+                self.key_hits[key] += 1
+        self.maybe_flush()
+
+    def record_misses(self, prefix, count=1):
+        """
+        Counts reads the cache didn't hold.
+
+        Args:
+            prefix (str): The key prefix.
+            count (int): The number of missed keys.
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[prefix]['misses'] += count
+        self.maybe_flush()
+
+    def record_sets(self, prefix, entries):
+        """
+        Counts entries written to the cache and their size.
+
+        Args:
+            prefix (str): The key prefix.
+            entries (dict): The values written, by key.
+        """
+        if not self.enabled:
+            return
+        sizes = {key: get_size(value) for key, value in entries.items()}
+        with self.lock:
+            self.counters[prefix]['sets'] += len(sizes)
+            self.counters[prefix]['bytes'] += sum(sizes.values())
+            self.key_sizes.update(sizes)
+        self.maybe_flush()
+
+    def maybe_flush(self):
+        if time.monotonic() - self.flushed_at >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """
+        Adds the buffered counts to Redis. Counts that can't be written are dropped.
+        """
+        with self.lock:
+            counters, key_hits, key_sizes = self.counters, self.key_hits, self.key_sizes
+            self.reset_buffers()
+            self.flushed_at = time.monotonic()
+        if not counters:
+            return
+        try:
+            pipeline = get_redis_connection('default').pipeline(transaction=False)
+            pipeline.sadd(PREFIXES_KEY, *counters)
+            for prefix, counts in counters.items():
+                for name, count in counts.items():
+                    pipeline.hincrby(get_prefix_key(prefix), name, count)
+            for key, hits in key_hits.items():
+                pipeline.zincrby(HITS_KEY, hits, key)
+            if key_sizes:
+                pipeline.zadd(SIZES_KEY, key_sizes)
+            # Keeps the largest entries' sizes and the hits of the most read keys.
+            pipeline.zremrangebyrank(SIZES_KEY, 0, -self.tracked_keys - 1)
+            pipeline.zremrangebyrank(HITS_KEY, 0, -self.tracked_keys * 4 - 1)
+            pipeline.execute()
+        except Exception:
+            logger.warning("Failed to record cache statistics", exc_info=True)
+
+    def report(self, limit=20):
+        """
+        Reads the statistics recorded by every worker.
+
+        Entries whose key has expired or been invalidated are dropped from the per-key
+        statistics first.
+
+        Args:
+            limit (int): The number of keys to list as biggest and coldest.
+
+        Returns:
+            dict: ``prefixes`` maps each prefix to its counters and hit ratio; ``biggest``
+            and ``coldest`` list ``(key, size, hits, ttl)`` of live entries.
+        """
+        self.flush()
+        client = get_redis_connection('default')
+        prefixes = {}
+        for prefix in sorted(member.decode() for member in client.smembers(PREFIXES_KEY)):
+            counts = {name.decode(): int(value) for name, value in client.hgetall(get_prefix_key(prefix)).items()}
+            counts = {name: counts.get(name, 0) for name in COUNTERS}
+            reads = counts['hits'] + counts['misses']
+            counts['hit_ratio'] = counts['hits'] / reads if reads else None
+            prefixes[prefix] = counts
+
+        sizes = [(member.decode(), int(size)) for member, size in client.zrange(SIZES_KEY, 0, -1, withscores=True)]
+        pipeline = client.pipeline(transaction=False)
+        for key, size in sizes:
+            pipeline.ttl(cache.make_key(key))
+            pipeline.zscore(HITS_KEY, key)
+        results = pipeline.execute()
+        entries, expired = [], []
+        for (key, size), ttl, hits in zip(sizes, results[::2], results[1::2]):
+            if ttl == -2:
+                expired.append(key)
+            else:
+                entries.append((key, size, int(hits or 0), ttl))
+        if expired:
+            client.zrem(SIZES_KEY, *expired)
+            client.zrem(HITS_KEY, *expired)
+        return {
+            'prefixes': prefixes,
+            'biggest': sorted(entries, key=lambda entry: -entry[1])[:limit],
+            'coldest': sorted(entries, key=lambda entry: (entry[2], -entry[1]))[:limit],
+        }
+
+    def hottest_keys(self, limit):
+        """
+        Returns the most read keys recorded by every worker.
+
+        Args:
+            limit (int): The number of keys.
+
+        Returns:
+            list: The keys, most read first.
+        """
+        client = get_redis_connection('default')
+        return [member.decode() for member in client.zrevrange(HITS_KEY, 0, limit - 1)]
+
+    def reset(self):
+        """
+        Deletes the recorded statistics.
+        """
+        with self.lock:
+            self.reset_buffers()
+        client = get_redis_connection('default')
+        prefixes = [member.decode() for member in client.smembers(PREFIXES_KEY)]
+        client.delete(PREFIXES_KEY, SIZES_KEY, HITS_KEY, *map(get_prefix_key, prefixes))
+
+
+cache_stats = CacheStats(CACHE_STATS_FLUSH_INTERVAL, CACHE_STATS_TRACKED_KEYS, enabled=CACHE_STATS_ENABLED)
+atexit.register(cache_stats.flush)
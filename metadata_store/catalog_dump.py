@@ -0,0 +1,231 @@
+import json
+import os
+from datetime import datetime, timezone
+
+from django.db import connections, transaction
+
+from metadata_store.models import Location, Department, Category, SubCategory, Product, LocationShard
+from metadata_store.partitioning import drop_partition, sync_partitions
+from metadata_store.shard_directory import shard_directory
+from metadata_store.sharding import CATALOG_SHARDS
+
+# The catalog tables, parents first.
+DUMP_MODELS = [Location, Department, Category, SubCategory, Product]
+
+DUMP_FORMATS = {'binary': 'bin', 'csv': 'csv'}
+
+MANIFEST_NAME = 'manifest.json'
+
+# The primary key, unique and foreign key constraints of a table, which a load drops and
+# adds back; those of partitions are inherited from the partitioned table's.
+CONSTRAINTS_SQL = """
+SELECT conname, contype, pg_get_constraintdef(oid)
+FROM pg_constraint
+WHERE conrelid = %s::regclass AND contype IN ('p', 'u', 'f')
+"""
+
+# The indexes of a table that don't back a constraint.
+SECONDARY_INDEXES_SQL = """
+SELECT index_class.relname, pg_get_indexdef(index_class.oid)
+FROM pg_index
+JOIN pg_class index_class ON index_class.oid = pg_index.indexrelid
+WHERE pg_index.indrelid = %s::regclass
+  AND NOT EXISTS (SELECT 1 FROM pg_constraint WHERE pg_constraint.conindid = pg_index.indexrelid)
+"""
+
+
+class CatalogDumpError(Exception):
+    """
+    Raised when a catalog dump can't be written or loaded.
+    """
+
+
+def get_columns(model):
+    """
+    Returns the table columns of a model, in the order they are dumped.
+    """
+    return [field.column for field in model._meta.concrete_fields]
+
+
+def get_copy_options(dump_format):
+    return "FORMAT binary" if dump_format == 'binary' else "FORMAT csv, HEADER"
+
+
+def get_postgres_cursor(alias):
+    """
+    Opens a cursor on a catalog database, which has to be Postgres for ``COPY``.
+    """
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        raise CatalogDumpError(f"The {alias} database isn't PostgreSQL; catalog dumps use COPY.")
+    return connection.cursor()
+
+
+def dump_catalog(directory, dump_format='binary'):
+    """
+    Dumps the catalog tables of every shard with ``COPY ... TO STDOUT``.
+
+    Each shard is dumped in one repeatable read transaction, so its tables are
+    consistent with each other. The files are written to ``<directory>/<shard>/`` with a
+    manifest listing the format, columns and row counts.
+
+    Args:
+        directory (str): The directory to write the dump to.
+        dump_format (str): ``binary`` or ``csv``.
+
+    Returns:
+        dict: The manifest.
+    """
+    manifest = {'format': dump_format, 'created_at': datetime.now(timezone.utc).isoformat(), 'shards': {}}
+    for alias in CATALOG_SHARDS:
+        shard_directory_path = os.path.join(directory, alias)
+        os.makedirs(shard_directory_path, exist_ok=True)
+        tables = manifest['shards'][alias] = {}
+        # Inside a caller's transaction the tables are read at its isolation level.
+        outermost = not connections[alias].in_atomic_block
+        with transaction.atomic(using=alias), get_postgres_cursor(alias) as cursor:
+            if outermost:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+            for model in DUMP_MODELS:
+                qn = connections[alias].ops.quote_name
+                columns = get_columns(model)
+                file_name = f"{model._meta.model_name}.{DUMP_FORMATS[dump_format]}"
+                with open(os.path.join(shard_directory_path, file_name), 'wb') as file:
+                    # A query rather than the table, as COPY TO doesn't read the partitions of a partitioned table.
+                    cursor.copy_expert(
+                        f"COPY (SELECT {', '.join(map(qn, columns))} FROM {qn(model._meta.db_table)}) "
+                        f"TO STDOUT WITH ({get_copy_options(dump_format)})",
+                        file,
+                    )
+                tables[model._meta.model_name] = {'file': file_name, 'columns': columns, 'rows': cursor.rowcount}
+    with open(os.path.join(directory, MANIFEST_NAME), 'w') as file:
+        json.dump(manifest, file, indent=2)
+    return manifest
+
+
+def read_manifest(directory):
+    """
+    Reads and checks the manifest of a dump against the current models.
+
+    Args:
+        directory (str): The dump directory.
+
+    Returns:
+        dict: The manifest.
+    """
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME)) as file:
+            manifest = json.load(file)
+    except FileNotFoundError:
+        raise CatalogDumpError(f"No catalog dump in {directory}.")
+    for alias, tables in manifest['shards'].items():
+        for model in DUMP_MODELS:
+            table = tables.get(model._meta.model_name)
+            if table is None or table['columns'] != get_columns(model):
+                raise CatalogDumpError(f"The {model._meta.model_name} table of the {alias} dump doesn't match "
+                                       f"the current schema; migrate the source database and dump it again.")
+    return manifest
+
+
+def drop_constraints_and_indexes(cursor, qn):
+    """
+    Drops the constraints and indexes of the catalog tables, like ``pg_restore`` loads
+    tables before building them: an index is built faster in one pass than maintained
+    row by row, and a foreign key is validated with one join instead of a trigger per row.
+
+    Args:
+        cursor (CursorWrapper): A cursor in the load transaction.
+        qn (callable): The connection's name quoting function.
+
+    Returns:
+        list: The statements recreating them, keys before the indexes and foreign keys.
+    """
+    keys, indexes, foreign_keys = [], [], []
+    for model in DUMP_MODELS:
+        table = qn(model._meta.db_table)
+        cursor.execute(CONSTRAINTS_SQL, [model._meta.db_table])
+        for name, constraint_type, definition in cursor.fetchall():
+            statement = (f"ALTER TABLE {table} ADD CONSTRAINT {qn(name)} {definition}",
+                         f"ALTER TABLE {table} DROP CONSTRAINT {qn(name)}")
+            (foreign_keys if constraint_type == 'f' else keys).append(statement)
+    for create, drop in foreign_keys + keys:
+        cursor.execute(drop)
+    for model in DUMP_MODELS:
+        cursor.execute(SECONDARY_INDEXES_SQL, [model._meta.db_table])
+        for name, definition in cursor.fetchall():
+            cursor.execute(f"DROP INDEX {qn(name)}")
+            # Partitioned indexes are reported ON ONLY the parent; recreating them on the
+            # whole table builds the partitions' indexes too.
+            indexes.append(definition.replace(' ON ONLY ', ' ON ', 1))
+    return [create for create, drop in keys] + indexes + [create for create, drop in foreign_keys]
+
+
+def load_catalog(directory, database=None, truncate=False, maintenance_work_mem=None):
+    """
+    Loads a catalog dump with ``COPY ... FROM STDIN``.
+
+    Each dumped shard is loaded into the shard of the same name, or every one into
+    ``database``, in one transaction per target: the constraints and indexes are dropped,
+    the tables are copied parents first, then the keys and indexes are rebuilt, the
+    foreign keys validated and the tables analyzed. On partitioned product tables the
+    locations' partitions are created before the products are copied.
+
+    Args:
+        directory (str): The dump directory.
+        database (str): The catalog database to load every shard into, if not their own.
+        truncate (bool): Whether to empty the catalog tables of the targets first; by
+            default the targets have to be empty.
+        maintenance_work_mem (str): The Postgres ``maintenance_work_mem`` for the index
+            builds, e.g. ``1GB``.
+
+    Returns:
+        dict: The number of rows loaded per model.
+    """
+    manifest = read_manifest(directory)
+    sources = {}
+    for alias in manifest['shards']:
+        target = database or alias
+        if target not in CATALOG_SHARDS:
+            raise CatalogDumpError(f"The dump has a {alias} shard but {target} isn't a catalog database; "
+                                   f"pass a database to load it into.")
+        sources.setdefault(target, []).append(alias)
+
+    copy_options = get_copy_options(manifest['format'])
+    counts = dict.fromkeys((model._meta.model_name for model in DUMP_MODELS), 0)
+    for target, aliases in sources.items():
+        qn = connections[target].ops.quote_name
+        with transaction.atomic(using=target), get_postgres_cursor(target) as cursor:
+            if truncate:
+                for location_id in Location.objects.using(target).values_list('pk', flat=True).iterator():
+                    drop_partition(location_id, target)
+                cursor.execute(f"TRUNCATE {', '.join(qn(model._meta.db_table) for model in DUMP_MODELS)} CASCADE")
+            elif any(model.objects.using(target).exists() for model in DUMP_MODELS):
+                raise CatalogDumpError(f"The catalog tables of {target} aren't empty; truncate them to load a dump.")
+            if maintenance_work_mem:
+                cursor.execute("SELECT set_config('maintenance_work_mem', %s, true)", [maintenance_work_mem])
+            rebuild_statements = drop_constraints_and_indexes(cursor, qn)
+
+            for model in DUMP_MODELS:
+                if model is Product:
+                    sync_partitions(target)
+                for alias in aliases:
+                    table = manifest['shards'][alias][model._meta.model_name]
+                    with open(os.path.join(directory, alias, table['file']), 'rb') as file:
+                        cursor.copy_expert(
+                            f"COPY {qn(model._meta.db_table)} ({', '.join(map(qn, table['columns']))}) "
+                            f"FROM STDIN WITH ({copy_options})",
+                            file,
+                        )
+                    counts[model._meta.model_name] += cursor.rowcount
+
+            for statement in rebuild_statements:
+                cursor.execute(statement)
+            for model in DUMP_MODELS:
+                cursor.execute(f"ANALYZE {qn(model._meta.db_table)}")
+
+        if truncate:
+            for location_id in LocationShard.objects.filter(shard=target).values_list('location_id', flat=True):
+                shard_directory.unregister(location_id)
+        for location in Location.objects.using(target).only('pk', 'name').iterator():
+            shard_directory.register(location)
+    return counts
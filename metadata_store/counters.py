@@ -0,0 +1,121 @@
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from metadata_store.models import Location, Department, Category, SubCategory, Product, HIERARCHY_PATHS
+from metadata_store.sharding import CATALOG_SHARDS, get_catalog_db, use_shard
+
+# The models carrying a product_count, from the root down; counters are always updated in
+# this order so concurrent transactions lock the levels in the same order.
+COUNTED_MODELS = [Location, Department, Category, SubCategory]
+
+
+def get_hierarchy_chains(model, pks):
+    """
+    Returns the hierarchy nodes from each given node up to its location, with one query.
+
+    Args:
+        model (Model): The model of the nodes.
+        pks (iterable): The primary keys of the nodes.
+
+    Returns:
+        dict: Each found primary key mapped to its ``(model, pk)`` chain, the node itself first.
+    """
+    path = HIERARCHY_PATHS[model]
+    lookups = []
+    ancestor_models = []
+    ancestor_model = model
+    for part in path.split('__') if path else []:
+        ancestor_model = ancestor_model._meta.get_field(part).related_model
+        lookups.append(f"{lookups[-1]}__{part}" if lookups else part)
+        ancestor_models.append(ancestor_model)
+    return {
+        pk: [(model, pk)] + list(zip(ancestor_models, ancestor_pks))
+        for pk, *ancestor_pks in model.objects.filter(pk__in=set(pks)).values_list('pk', *lookups)
+    }
+
+
+def apply_product_count_deltas(deltas):
+    """
+    Adds deltas to the product counts of hierarchy nodes with ``F()`` increments, with one
+    UPDATE per model and distinct delta.
+
+    Args:
+        deltas (dict): ``(model, pk)`` pairs mapped to the change of their product count.
+    """
+    grouped = defaultdict(list)
+    for (model, pk), delta in deltas.items():
+        if delta:
+            grouped[(model, delta)].append(pk)
+    if not grouped:
+        return
+    with transaction.atomic(using=get_catalog_db()):
+        for model in COUNTED_MODELS:
+            for (delta_model, delta), pks in grouped.items():
+                if delta_model is model:
+                    model.objects.filter(pk__in=pks).update(product_count=F('product_count') + delta)
+
+
+def adjust_product_counts(subcategory_deltas):
+    """
+    Updates the product counts of subcategories and all their ancestors after products
+    were added to or removed from them.
+
+    Args:
+        subcategory_deltas (dict): Subcategory ids mapped to the number of products added
+            (positive) or removed (negative).
+    """
+    deltas = Counter()
+    for subcategory_id, chain in get_hierarchy_chains(SubCategory, subcategory_deltas).items():
+        for node in chain:
+            deltas[node] += subcategory_deltas[subcategory_id]
+    apply_product_count_deltas(deltas)
+
+
+def get_product_lookup(model):
+    """
+    Returns the product lookup to a hierarchy model, e.g. ``subcategory__category`` for categories.
+
+    Args:
+        model (Model): A model carrying a product_count.
+
+    Returns:
+        str: The lookup.
+    """
+    parts = HIERARCHY_PATHS[Product].split('__')
+    return '__'.join(parts[:parts.index(model._meta.model_name) + 1])
+
+
+def reconcile_product_counts(dry_run=False):
+    """
+    Recounts the products under every hierarchy node of every shard and corrects the counts
+    that drifted, e.g. after writes that bypassed the model signals.
+
+    Corrections are applied as increments of the difference found, so products added or
+    removed concurrently keep being counted.
+
+    Args:
+        dry_run (bool): Only report the drift without correcting it.
+
+    Returns:
+        dict: The number of drifted nodes per model name.
+    """
+    drifted = {model._meta.model_name: 0 for model in COUNTED_MODELS}
+    for alias in CATALOG_SHARDS:
+        with use_shard(alias):
+            for model in COUNTED_MODELS:
+                lookup = get_product_lookup(model)
+                actual = Coalesce(Subquery(
+                    Product.objects.filter(**{lookup: OuterRef('pk')}).order_by()
+                    .values(lookup).annotate(count=Count('pk')).values('count')
+                ), Value(0))
+                rows = model.objects.annotate(actual=actual).exclude(product_count=F('actual'))
+                deltas = {(model, pk): count - product_count for pk, product_count, count in
+                          rows.values_list('pk', 'product_count', 'actual').iterator()}
+                drifted[model._meta.model_name] += len(deltas)
+                if not dry_run:
+                    apply_product_count_deltas(deltas)
+    return drifted
+
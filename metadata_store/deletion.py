@@ -0,0 +1,189 @@
+import threading
+import uuid
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import OperationalError, connections, transaction
+
+from metadata_store.counters import apply_product_count_deltas, get_hierarchy_chains
+from metadata_store.events import get_hierarchy_names, make_event, publish_events
+from metadata_store.models import Location, Product, Tombstone, HIERARCHY_PATHS
+from metadata_store.partitioning import (PARTITION_DROP_LOCK_TIMEOUT, drop_partition, drop_partition_or_defer,
+                                         has_partition)
+from metadata_store.shard_directory import shard_directory
+from metadata_store.sharding import use_shard
+from metadata_store.signals import invalidate_caches
+
+DELETE_CHUNK_SIZE = getattr(settings, 'SUBTREE_DELETE_CHUNK_SIZE', 5000)
+DELETE_JOB_TTL = 60 * 60 * 24
+
+# Above this many deleted products all product caches are cleared at once instead of per product.
+PER_PRODUCT_INVALIDATION_LIMIT = 100
+
+
+def get_subtree_querysets(instance):
+    """
+    Returns the querysets of the objects under a hierarchy node, the node included,
+    ordered from the leaves up so each level can be deleted once its children are gone.
+
+    Args:
+        instance (Model): The Location, Department, Category or SubCategory to delete.
+
+    Returns:
+        list: The querysets, products first and the node itself last.
+    """
+    model_name = instance._meta.model_name
+    querysets = []
+    for model, path in HIERARCHY_PATHS.items():
+        if model is type(instance):
+            querysets.append(model.objects.filter(pk=instance.pk))
+            break
+        parts = path.split('__')
+        lookup = '__'.join(parts[:parts.index(model_name) + 1])
+        if model is Product and model_name == 'location':
+            lookup = 'location'
+        querysets.append(model.objects.filter(**{lookup: instance.pk}))
+    return querysets
+
+
+def delete_subtree(instance, chunk_size=DELETE_CHUNK_SIZE, on_progress=None):
+    """
+    Deletes a hierarchy node and everything under it with set-based, chunked deletes.
+
+    Unlike ``instance.delete()`` this never loads the subtree into memory and sends no
+    per-object signals; tombstones for the change feed are written in bulk with each
+    chunk, along with the product count of the node's ancestors, and the product caches
+    are invalidated once at the end. The products of a location with its own partition
+    are deleted by dropping the partition, unless the product table can't be locked within
+    ``PARTITION_DROP_LOCK_TIMEOUT``; they are then deleted in chunks like other rows and the
+    emptied partition is dropped after the location. A single ``delete`` event marked
+    ``subtree`` is published for the node.
+
+    Args:
+        instance (Model): The Location, Department, Category or SubCategory to delete.
+        chunk_size (int): The number of rows deleted per transaction.
+        on_progress (callable): Called with the running counts after each chunk.
+
+    Returns:
+        dict: The number of deleted objects per model name.
+    """
+    db = instance._state.db
+    with use_shard(db):
+        counts = {}
+        product_ids = []
+        ancestors = get_hierarchy_chains(type(instance), [instance.pk]).get(instance.pk, [])[1:]
+        event = make_event('delete', instance._meta.model_name, instance.pk, instance.name,
+                           get_hierarchy_names(instance), subtree=True)
+        querysets = get_subtree_querysets(instance)
+        drop_partition_later = False
+        if isinstance(instance, Location) and has_partition(instance.pk, using=db):
+            try:
+                with transaction.atomic(using=db):
+                    counts['product'] = 0
+                    ids = querysets[0].values_list('pk', flat=True).iterator(chunk_size=chunk_size)
+                    for chunk in iter(lambda: list(islice(ids, chunk_size)), []):
+                        Tombstone.objects.bulk_create([Tombstone(model_name='product', object_id=pk) for pk in chunk])
+                        counts['product'] += len(chunk)
+                        if len(product_ids) <= PER_PRODUCT_INVALIDATION_LIMIT:
+                            product_ids.extend(chunk)
+                    drop_partition(instance.pk, using=db, lock_timeout=PARTITION_DROP_LOCK_TIMEOUT)
+            except OperationalError:
+                # The product table is busy: delete the products row by row and drop the
+                # emptied partition once the location is gone.
+                del counts['product']
+                product_ids.clear()
+                drop_partition_later = True
+            else:
+                if on_progress:
+                    on_progress(counts)
+                querysets = querysets[1:]
+        for queryset in querysets:
+            model = queryset.model
+            model_name = model._meta.model_name
+            counts[model_name] = 0
+            while True:
+                with transaction.atomic(using=db):
+                    ids = list(queryset.values_list('pk', flat=True)[:chunk_size])
+                    if not ids:
+                        break
+                    Tombstone.objects.bulk_create([Tombstone(model_name=model_name, object_id=pk) for pk in ids])
+                    chunk = model.objects.filter(pk__in=ids)
+                    chunk._raw_delete(chunk.db)
+                    if model is Product:
+                        apply_product_count_deltas({node: -len(ids) for node in ancestors})
+                counts[model_name] += len(ids)
+                if model is Product and len(product_ids) <= PER_PRODUCT_INVALIDATION_LIMIT:
+                    product_ids.extend(ids)
+                if on_progress:
+                    on_progress(counts)
+
+        key_formats = ['count:*']
+        if counts.get('product'):
+            if len(product_ids) <= PER_PRODUCT_INVALIDATION_LIMIT:
+                key_formats += [f'product_retrieve:{pk}:*' for pk in product_ids]
+            else:
+                key_formats.append('product_retrieve:*')
+            key_formats += ['product_list:*', 'product_list_ids:*']
+        invalidate_caches(key_formats)
+        publish_events([event], using=db)
+        if drop_partition_later:
+            location_id = instance.pk
+            transaction.on_commit(lambda: drop_partition_or_defer(location_id, db), using=db)
+    if isinstance(instance, Location):
+        shard_directory.unregister(instance.pk)
+    return counts
+
+
+def get_delete_job(job_id):
+    """
+    Returns the status of an asynchronous subtree delete.
+
+    Args:
+        job_id (str): The job id.
+
+    Returns:
+        dict: The job status, or None if the job is unknown or expired.
+    """
+    return cache.get(f"delete_job:{job_id}")
+
+
+def start_delete_job(instance):
+    """
+    Deletes a hierarchy node and its subtree in a background thread.
+
+    The job status is kept in the cache under ``delete_job:{id}`` for a day.
+
+    Args:
+        instance (Model): The Location, Department, Category or SubCategory to delete.
+
+    Returns:
+        dict: The initial job status.
+    """
+    job = {
+        'id': str(uuid.uuid4()),
+        'status': 'pending',
+        'model': instance._meta.model_name,
+        'object_id': str(instance.pk),
+        'deleted': {},
+        'error': None,
+    }
+    cache_key = f"delete_job:{job['id']}"
+    cache.set(cache_key, job, DELETE_JOB_TTL)
+
+    def update(**changes):
+        job.update(changes)
+        cache.set(cache_key, job, DELETE_JOB_TTL)
+
+    def run():
+        update(status='running')
+        try:
+            counts = delete_subtree(instance, on_progress=lambda counts: update(deleted=dict(counts)))
+            update(status='done', deleted=counts)
+        except Exception as exc:
+            update(status='failed', error=str(exc))
+        finally:
+            connections.close_all()
+
+    transaction.on_commit(lambda: threading.Thread(target=run, daemon=True).start(), using=instance._state.db)
+    return dict(job)
@@ -0,0 +1,440 @@
+import asyncio
+import json
+import logging
+import re
+from io import BytesIO
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connections, transaction
+from django_redis import get_redis_connection
+from redis import asyncio as aioredis
+from rest_framework.exceptions import APIException, NotAuthenticated
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from metadata_store.models import HIERARCHY_PATHS
+from metadata_store.utils import str_to_list
+
+logger = logging.getLogger(__name__)
+
+EVENT_STREAM_ENABLED = getattr(settings, 'EVENT_STREAM_ENABLED', True)
+EVENT_STREAM_REDIS_URL = getattr(settings, 'EVENT_STREAM_REDIS_URL', settings.CACHES['default'].get('LOCATION'))
+EVENT_STREAM_MAX_LENGTH = getattr(settings, 'EVENT_STREAM_MAX_LENGTH', 100000)
+EVENT_STREAM_QUEUE_SIZE = getattr(settings, 'EVENT_STREAM_QUEUE_SIZE', 1000)
+EVENT_STREAM_HEARTBEAT = getattr(settings, 'EVENT_STREAM_HEARTBEAT', 15)
+EVENT_STREAM_MAX_DURATION = getattr(settings, 'EVENT_STREAM_MAX_DURATION', 300)
+
+# The Redis stream keeping recent events for resuming subscribers; new events are also
+# published on the pub/sub channel of the same name.
+EVENT_STREAM_KEY = 'events:catalog'
+
+# The levels of the hierarchy events are filtered on, from the root down.
+HIERARCHY_LEVELS = ('location', 'department', 'category', 'subcategory')
+
+EVENT_MODELS = [model._meta.model_name for model in reversed(HIERARCHY_PATHS)]
+
+# Appends an event to the stream and publishes it with its stream id in one step, so
+# subscribers see events in stream order.
+PUBLISH_SCRIPT = """
+local id = redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[1], '*', 'event', ARGV[2])
+redis.call('PUBLISH', KEYS[1], id .. ' ' .. ARGV[2])
+return id
+"""
+
+EVENT_ID_PATTERN = re.compile(r'^\d+-\d+$')
+
+
+def get_hierarchy_names(instance):
+    """
+    Returns the names of the hierarchy levels a catalog object is under, its own included.
+
+    The names are read through the object's parent, so they can still be read while the
+    object is being deleted.
+
+    Args:
+        instance (Model): The catalog object.
+
+    Returns:
+        dict: Level names mapped to names, e.g. ``{'location': 'Berlin', 'department': 'Food'}``.
+    """
+    model = type(instance)
+    names = {}
+    if model._meta.model_name in HIERARCHY_LEVELS:
+        names[model._meta.model_name] = instance.name
+    path = HIERARCHY_PATHS[model]
+    if path:
+        parent_field, *ancestors = path.split('__')
+        parent_model = model._meta.get_field(parent_field).related_model
+        lookups = ['name'] + ['__'.join(ancestors[:depth + 1]) + '__name' for depth in range(len(ancestors))]
+        values = parent_model.objects.using(instance._state.db).filter(
+            pk=getattr(instance, f'{parent_field}_id')).values_list(*lookups).first()
+        names.update(zip([parent_field] + ancestors, values or [None] * len(lookups)))
+    return names
+
+
+def make_event(op, model_name, pk, name, names, **extra):
+    """
+    Builds a change event.
+
+    Args:
+        op (str): ``create``, ``update`` or ``delete``.
+        model_name (str): The model name of the changed object.
+        pk: The primary key of the changed object.
+        name (str): The name of the changed object.
+        names (dict): The names of the hierarchy levels the object is under, see `get_hierarchy_names`.
+        **extra: Additional fields of the event.
+
+    Returns:
+        dict: The event.
+    """
+    return {'op': op, 'model': model_name, 'id': str(pk), 'name': name,
+            **{level: names.get(level) for level in HIERARCHY_LEVELS}, **extra}
+
+
+def publish_events(events, using):
+    """
+    Publishes change events once the current transaction commits; nothing is published
+    if it rolls back.
+
+    Args:
+        events (list): The events, see `make_event`.
+        using (str): The database alias of the transaction.
+    """
+    if EVENT_STREAM_ENABLED and events:
+        transaction.on_commit(lambda: send_events(events), using=using)
+
+
+def send_events(events):
+    """
+    Appends events to the Redis stream and publishes them, in one round trip.
+
+    The change is already committed, so failures are logged rather than raised;
+    subscribers that miss events can still catch up from the change feed.
+
+    Args:
+        events (list): The events.
+    """
+    try:
+        client = get_redis_connection('default')
+        script = client.register_script(PUBLISH_SCRIPT)
+        pipeline = client.pipeline(transaction=False)
+        for event in events:
+            script(keys=[EVENT_STREAM_KEY], args=[EVENT_STREAM_MAX_LENGTH, json.dumps(event)], client=pipeline)
+        pipeline.execute()
+    except Exception:
+        logger.exception("Failed to publish %s catalog events", len(events))
+
+
+def parse_event_id(event_id):
+    """
+    Returns the sortable form of a stream id, e.g. ``(1700000000000, 3)`` for ``1700000000000-3``.
+    """
+    milliseconds, sequence = event_id.split('-')
+    return int(milliseconds), int(sequence)
+
+
+class EventBroker:
+    """
+    Fans the events published in Redis out to the event stream subscribers of this process.
+
+    A single pub/sub connection per process listens on the channel, however many
+    subscribers there are; each subscriber gets a bounded queue. A subscriber whose
+    queue fills up, or that was connected while the listener lost Redis, receives
+    ``None`` and is expected to reconnect and resume from its last event id.
+    """
+    def __init__(self, url, key, queue_size):
+        self.url = url
+        self.key = key
+        self.queue_size = queue_size
+        self.loop = None
+        self.client = None
+        self.listener = None
+        self.ready = None
+        self.subscribers = set()
+
+    async def subscribe(self):
+        """
+        Registers a subscriber, starting the listener of the running event loop if needed.
+
+        Returns once the channel subscription is active, so no event published afterwards is missed.
+
+        Returns:
+            asyncio.Queue: The queue receiving ``(event id, event)`` pairs.
+        """
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self.loop = loop
+            self.client = aioredis.from_url(self.url)
+            self.ready = asyncio.Event()
+            self.subscribers = set()
+            self.listener = loop.create_task(self.listen())
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.add(queue)
+        await self.ready.wait()
+        return queue
+
+    def unsubscribe(self, queue):
+        """
+        Removes a subscriber.
+
+        Args:
+            queue (asyncio.Queue): The queue returned by `subscribe`.
+        """
+        self.subscribers.discard(queue)
+
+    def drop(self, queue):
+        """
+        Disconnects a subscriber, discarding its pending events.
+        """
+        self.subscribers.discard(queue)
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    async def listen(self):
+        """
+        Receives the published events and hands them to the subscribers, reconnecting to
+        Redis after failures.
+        """
+        while True:
+            pubsub = self.client.pubsub()
+            try:
+                await pubsub.subscribe(self.key)
+                self.ready.set()
+                async for message in pubsub.listen():
+                    if message['type'] != 'message':
+                        continue
+                    event_id, data = message['data'].decode().split(' ', 1)
+                    item = (event_id, json.loads(data))
+                    for queue in list(self.subscribers):
+                        try:
+                            queue.put_nowait(item)
+                        except asyncio.QueueFull:
+                            self.drop(queue)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Lost the catalog event subscription, reconnecting")
+                self.ready.clear()
+                for queue in list(self.subscribers):
+                    self.drop(queue)
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    async def replay(self, last_event_id, batch_size=1000):
+        """
+        Reads the events published after an event id from the stream.
+
+        Args:
+            last_event_id (str): The id of the last event the subscriber received.
+            batch_size (int): The number of events read per round trip.
+
+        Yields:
+            tuple: ``(event id, event)`` pairs, or a single None if events after
+            ``last_event_id`` were already trimmed from the stream.
+        """
+        if not EVENT_ID_PATTERN.match(last_event_id):
+            yield None
+            return
+        oldest = await self.client.xrange(self.key, count=1)
+        if oldest and parse_event_id(oldest[0][0].decode()) > parse_event_id(last_event_id):
+            yield None
+            return
+        while True:
+            entries = await self.client.xrange(self.key, min=f'({last_event_id}', count=batch_size)
+            for event_id, fields in entries:
+                last_event_id = event_id.decode()
+                yield last_event_id, json.loads(fields[b'event'])
+            if len(entries) < batch_size:
+                return
+
+
+event_broker = EventBroker(EVENT_STREAM_REDIS_URL, EVENT_STREAM_KEY, EVENT_STREAM_QUEUE_SIZE)
+
+
+def format_event(event_id, event):
+    """
+    Formats an event as a server-sent event, named after its operation.
+    """
+    return f"id: {event_id}\nevent: {event['op']}\ndata: {json.dumps(event)}\n\n"
+
+
+def matches(event, model_names, filters):
+    """
+    Checks whether an event is about one of the given models and under the given hierarchy.
+
+    Args:
+        event (dict): The event.
+        model_names (set): The model names subscribed to.
+        filters (dict): Level names mapped to the names the event's hierarchy must have.
+
+    Returns:
+        bool: Whether the event matches.
+    """
+    return event['model'] in model_names and all(event.get(level) == name for level, name in filters.items())
+
+
+async def stream_events(model_names, filters, last_event_id=None):
+    """
+    Generates the server-sent events of a subscriber.
+
+    Events published after ``last_event_id`` are replayed from the stream first; a
+    ``reset`` event tells the client they were already trimmed and it has to reload its
+    data. Comments are sent every ``EVENT_STREAM_HEARTBEAT`` seconds to keep idle
+    connections open, and the stream ends after ``EVENT_STREAM_MAX_DURATION`` seconds or
+    when the subscriber falls behind; clients then reconnect with their last event id.
+
+    Args:
+        model_names (set): The model names subscribed to.
+        filters (dict): Level names mapped to the names the events' hierarchy must have.
+        last_event_id (str): The id of the last event the client received, if resuming.
+
+    Yields:
+        str: The chunks of the response.
+    """
+    queue = await event_broker.subscribe()
+    try:
+        yield f"retry: {EVENT_STREAM_HEARTBEAT * 1000}\n\n"
+        if last_event_id:
+            async for item in event_broker.replay(last_event_id):
+                if item is None:
+                    last_event_id = None
+                    yield "event: reset\ndata: {}\n\n"
+                    break
+                last_event_id, event = item
+                if matches(event, model_names, filters):
+                    yield format_event(last_event_id, event)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + EVENT_STREAM_MAX_DURATION
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=min(EVENT_STREAM_HEARTBEAT, remaining))
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if item is None:
+                return
+            event_id, event = item
+            if last_event_id and parse_event_id(event_id) <= parse_event_id(last_event_id):
+                continue
+            last_event_id = event_id
+            if matches(event, model_names, filters):
+                yield format_event(event_id, event)
+    finally:
+        event_broker.unsubscribe(queue)
+
+
+def authenticate(request):
+    """
+    Authenticates a request with the API's authentication classes.
+
+    The database connections used are closed right away rather than when the request
+    finishes, as event streams stay open for minutes.
+
+    Args:
+        request (HttpRequest): The request.
+
+    Returns:
+        User: The authenticated user, or an anonymous user.
+
+    Raises:
+        APIException: If the credentials are invalid.
+    """
+    try:
+        return Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]).user
+    finally:
+        connections.close_all()
+
+
+async def send_json(send, status, data):
+    """
+    Sends a JSON response through an ASGI ``send`` callable.
+    """
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json')]})
+    await send({'type': 'http.response.body', 'body': json.dumps(data).encode()})
+
+
+async def wait_for_disconnect(receive):
+    """
+    Returns once the client of an ASGI request disconnects.
+    """
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+class EventStreamApplication:
+    """
+    ASGI application serving the catalog event stream at ``path`` as server-sent events,
+    and passing every other request to Django.
+
+    Streams are served outside Django's request handling, which in Django 4.2 keeps a
+    thread per open streaming response and doesn't notice clients disconnecting, so a
+    worker can hold thousands of idle subscribers. Requests are authenticated like the
+    rest of the API.
+
+    Query parameters:
+        type: Comma separated model names to receive events of; all of them by default.
+        location_name, department_name, category_name, subcategory_name: Restrict the
+            events to a node's subtree, like the product list filters.
+
+    The ``Last-Event-ID`` header, sent by ``EventSource`` when it reconnects, resumes the
+    stream after that event.
+    """
+    def __init__(self, application, path):
+        self.application = application
+        self.path = path
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == self.path:
+            await self.handle(scope, receive, send)
+        else:
+            await self.application(scope, receive, send)
+
+    async def handle(self, scope, receive, send):
+        """
+        Validates an event stream request and streams the events until the client disconnects.
+
+        Args:
+            scope (dict): The ASGI connection scope.
+            receive (callable): The ASGI receive callable.
+            send (callable): The ASGI send callable.
+        """
+        request = ASGIRequest(scope, BytesIO())
+        if request.method != 'GET':
+            return await send_json(send, 405, {'detail': f'Method "{request.method}" not allowed.'})
+        try:
+            # The shared thread pool, since a thread-sensitive call would keep a thread per stream.
+            user = await sync_to_async(authenticate, thread_sensitive=False)(request)
+        except APIException as exc:
+            return await send_json(send, exc.status_code, {'detail': exc.detail})
+        if not user.is_authenticated:
+            return await send_json(send, NotAuthenticated.status_code, {'detail': NotAuthenticated.default_detail})
+        model_names = str_to_list(request.GET.get('type')) or EVENT_MODELS
+        if any(model_name not in EVENT_MODELS for model_name in model_names):
+            return await send_json(send, 400, {'detail': f"type must be among: {', '.join(EVENT_MODELS)}."})
+        filters = {level: request.GET[f'{level}_name'] for level in HIERARCHY_LEVELS if request.GET.get(f'{level}_name')}
+
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'), (b'cache-control', b'no-cache'), (b'x-accel-buffering', b'no'),
+        ]})
+        chunks = stream_events(set(model_names), filters, request.headers.get('Last-Event-ID'))
+
+        async def stream():
+            try:
+                async for chunk in chunks:
+                    await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+                await send({'type': 'http.response.body', 'body': b''})
+            finally:
+                await chunks.aclose()
+
+        tasks = [asyncio.ensure_future(stream()), asyncio.ensure_future(wait_for_disconnect(receive))]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,119 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from metadata_store.warming import cache_warmer
+
+logger = logging.getLogger(__name__)
+
+CACHE_INVALIDATION_ASYNC = getattr(settings, 'CACHE_INVALIDATION_ASYNC', True)
+CACHE_INVALIDATION_WINDOW = getattr(settings, 'CACHE_INVALIDATION_WINDOW', 0.1)
+
+
+def delete_cache_keys(keys_format_list):
+    """
+    Deletes the cache entries matching the provided key formats and schedules the
+    hottest of them for warming.
+
+    Args:
+        keys_format_list (iterable): Cache key formats to delete.
+    """
+    keys_format_list = list(keys_format_list)
+    for key_format in keys_format_list:
+        for key in cache.keys(key_format):
+            cache.delete(key)
+    cache_warmer.schedule(keys_format_list)
+
+
+class InvalidationQueue:
+    """
+    Applies cache invalidations in a background thread, off the write path.
+
+    Key formats enqueued within ``window`` seconds of each other are merged, so a burst
+    of writes deletes each key format once. When ``asynchronous`` is False the
+    invalidations are applied right away in the calling thread.
+
+    Subclasses queue other work the same way by overriding `apply`.
+    """
+    thread_name = 'cache-invalidator'
+
+    def __init__(self, window, asynchronous=True):
+        self.window = window
+        self.asynchronous = asynchronous
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def enqueue(self, keys_format_list):
+        """
+        Queues key formats for invalidation.
+
+        Args:
+            keys_format_list (iterable): Cache key formats to invalidate.
+        """
+        if not self.asynchronous:
+            self.apply(keys_format_list)
+            return
+        self.queue.put(list(keys_format_list))
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name=self.thread_name, daemon=True)
+                self.thread.start()
+
+    def collect(self):
+        """
+        Waits for queued key formats and merges everything arriving within the window.
+
+        Returns:
+            list: The unique key formats in arrival order.
+        """
+        keys_format_list = dict.fromkeys(self.queue.get())
+        deadline = time.monotonic() + self.window
+        while (remaining := deadline - time.monotonic()) > 0:
+            try:
+                keys_format_list.update(dict.fromkeys(self.queue.get(timeout=remaining)))
+            except queue.Empty:
+                break
+        return list(keys_format_list)
+
+    def run(self):
+        """
+        Worker loop applying merged invalidations.
+        """
+        while True:
+            keys_format_list = self.collect()
+            try:
+                self.apply(keys_format_list)
+            except Exception:
+                logger.exception("Failed to invalidate %s", keys_format_list)
+
+    def apply(self, keys_format_list):
+        """
+        Deletes the cache entries matching merged key formats.
+
+        Args:
+            keys_format_list (list): The unique key formats.
+        """
+        delete_cache_keys(keys_format_list)
+
+    def flush(self):
+        """
+        Applies every queued invalidation in the calling thread, e.g. before the process exits.
+        """
+        keys_format_list = {}
+        while True:
+            try:
+                keys_format_list.update(dict.fromkeys(self.queue.get_nowait()))
+            except queue.Empty:
+                break
+        if keys_format_list:
+            self.apply(list(keys_format_list))
+
+
+invalidation_queue = InvalidationQueue(window=CACHE_INVALIDATION_WINDOW, asynchronous=CACHE_INVALIDATION_ASYNC)
+atexit.register(invalidation_queue.flush)
@@ -0,0 +1,110 @@
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from psycopg2.extras import execute_values
+
+from metadata_store.ids import uuid7
+
+
+class Command(BaseCommand):
+    """
+    Custom Django management command comparing a plain and a location-partitioned product table in Postgres.
+    """
+    help = 'Benchmarks location-filtered list latency and location delete time with and without partitioning'
+
+    layouts = ['plain', 'partitioned']
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000, help='Rows inserted per table')
+        parser.add_argument('--locations', type=int, default=50, help='Locations the rows are spread over')
+        parser.add_argument('--queries', type=int, default=200, help='Filtered list queries timed per table')
+        parser.add_argument('--batch-size', type=int, default=10000, help='Rows per INSERT statement')
+
+    def handle(self, *args, **options):
+        """
+        Handles the command execution.
+
+        Loads the same rows into a temporary table shaped like ``metadata_store_product``,
+        once plain and once partitioned by location, then times the newest-first page of
+        random locations and the delete of one location: a ``DELETE`` on the plain table,
+        a partition detach and drop on the partitioned one.
+
+        Args:
+            *args: Variable length argument list.
+            **options: Arbitrary keyword arguments.
+        """
+        if connection.vendor != 'postgresql':
+            raise CommandError('This benchmark needs a PostgreSQL database.')
+        location_ids = [uuid.uuid4() for _ in range(options['locations'])]
+        for layout in self.layouts:
+            latencies, delete_time = self.benchmark(layout, location_ids, options['rows'], options['queries'],
+                                                    options['batch_size'])
+            quantiles = statistics.quantiles(latencies, n=100)
+            self.stdout.write(
+                f"{layout}: list p50 {quantiles[49] * 1000:,.2f} ms, p95 {quantiles[94] * 1000:,.2f} ms, "
+                f"location delete {delete_time * 1000:,.1f} ms"
+            )
+
+    def benchmark(self, layout, location_ids, rows, queries, batch_size):
+        """
+        Loads rows into a fresh temporary table and times the queries against it.
+
+        Args:
+            layout (str): ``plain`` or ``partitioned``.
+            location_ids (list): The location ids the rows are spread over.
+            rows (int): The number of rows to insert.
+            queries (int): The number of filtered list queries to time.
+            batch_size (int): The number of rows per INSERT statement.
+
+        Returns:
+            tuple: The latency of each list query and the location delete time, in seconds.
+        """
+        table = f"benchmark_{layout}_product"
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+            columns = ("id uuid NOT NULL, location_id uuid NOT NULL, created_at timestamptz NOT NULL, "
+                       "name varchar(255) NOT NULL, PRIMARY KEY (id, location_id)")
+            if layout == 'partitioned':
+                cursor.execute(f"CREATE TEMPORARY TABLE {table} ({columns}) PARTITION BY LIST (location_id)")
+                for location_id in location_ids:
+                    cursor.execute(f"CREATE TEMPORARY TABLE {table}_{location_id.hex} PARTITION OF {table} "
+                                   f"FOR VALUES IN (%s)", [str(location_id)])
+            else:
+                cursor.execute(f"CREATE TEMPORARY TABLE {table} ({columns})")
+            cursor.execute(f"CREATE INDEX ON {table} (location_id, created_at DESC)")
+
+            now = datetime.now(timezone.utc)
+            random.seed(0)
+            for offset in range(0, rows, batch_size):
+                batch = [
+                    (str(uuid7()), str(random.choice(location_ids)), now - timedelta(seconds=random.randrange(10 ** 7)),
+                     f"product {offset + i}")
+                    for i in range(min(batch_size, rows - offset))
+                ]
+                execute_values(cursor.cursor, f"INSERT INTO {table} (id, location_id, created_at, name) VALUES %s",
+                               batch, template="(%s::uuid, %s::uuid, %s, %s)", page_size=batch_size)
+            cursor.execute(f"ANALYZE {table}")
+
+            latencies = []
+            for _ in range(queries):
+                started_at = time.monotonic()
+                cursor.execute(f"SELECT id, name, created_at FROM {table} WHERE location_id = %s "
+                               f"ORDER BY created_at DESC LIMIT 20", [str(random.choice(location_ids))])
+                cursor.fetchall()
+                latencies.append(time.monotonic() - started_at)
+
+            location_id = location_ids[0]
+            started_at = time.monotonic()
+            if layout == 'partitioned':
+                cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {table}_{location_id.hex}")
+                cursor.execute(f"DROP TABLE {table}_{location_id.hex}")
+            else:
+                cursor.execute(f"DELETE FROM {table} WHERE location_id = %s", [str(location_id)])
+            delete_time = time.monotonic() - started_at
+            cursor.execute(f"DROP TABLE {table}")
+        return latencies, delete_time
@@ -0,0 +1,75 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from psycopg2.extras import execute_values
+
+from metadata_store.ids import uuid7
+
+
+class Command(BaseCommand):
+    """
+    Custom Django management command comparing uuid4 and UUIDv7 primary keys in Postgres.
+    """
+    help = 'Benchmarks insert throughput and primary key index size of uuid4 vs UUIDv7 keys'
+
+    generators = {
+        'uuid4': uuid.uuid4,
+        'uuid7': uuid7,
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000, help='Rows inserted per key type')
+        parser.add_argument('--batch-size', type=int, default=10000, help='Rows per INSERT statement')
+
+    def handle(self, *args, **options):
+        """
+        Handles the command execution.
+
+        Inserts the same number of rows keyed by each generator into a temporary table
+        shaped like ``metadata_store_product`` and reports the insert rate and index sizes.
+
+        Args:
+            *args: Variable length argument list.
+            **options: Arbitrary keyword arguments.
+        """
+        if connection.vendor != 'postgresql':
+            raise CommandError('This benchmark needs a PostgreSQL database.')
+        for name, generator in self.generators.items():
+            elapsed, index_size, table_size = self.benchmark(name, generator, options['rows'], options['batch_size'])
+            self.stdout.write(
+                f"{name}: {options['rows'] / elapsed:,.0f} rows/s, "
+                f"pk index {index_size / 2 ** 20:,.1f} MiB, table {table_size / 2 ** 20:,.1f} MiB"
+            )
+
+    def benchmark(self, name, generator, rows, batch_size):
+        """
+        Inserts rows keyed by a generator into a fresh temporary table.
+
+        Args:
+            name (str): The name of the key type.
+            generator (callable): Returns a new primary key.
+            rows (int): The number of rows to insert.
+            batch_size (int): The number of rows per INSERT statement.
+
+        Returns:
+            tuple: The elapsed seconds, the primary key index size and the table size in bytes.
+        """
+        table = f"benchmark_{name}"
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+            cursor.execute(
+                f"CREATE TEMPORARY TABLE {table} ("
+                f"id uuid PRIMARY KEY, created_at timestamptz NOT NULL DEFAULT now(), name varchar(255) NOT NULL)"
+            )
+            started_at = time.monotonic()
+            for offset in range(0, rows, batch_size):
+                batch = [(str(generator()), f"product {offset + i}") for i in range(min(batch_size, rows - offset))]
+                execute_values(cursor.cursor, f"INSERT INTO {table} (id, name) VALUES %s", batch,
+                               template="(%s::uuid, %s)", page_size=batch_size)
+            elapsed = time.monotonic() - started_at
+            cursor.execute(f"SELECT pg_relation_size('{table}_pkey'), pg_relation_size('{table}')")
+            index_size, table_size = cursor.fetchone()
+            cursor.execute(f"DROP TABLE {table}")
+        return elapsed, index_size, table_size
@@ -0,0 +1,173 @@
+import random
+import time
+import tracemalloc
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from metadata_store.memory_profiling import format_statistics, memory_profiler, take_snapshot
+from metadata_store.models import Location, Product
+from metadata_store.sharding import CATALOG_SHARDS
+
+MIB = 2 ** 20
+
+
+class Command(BaseCommand):
+    """
+    Custom Django management command soak testing the API for memory growth.
+    """
+    help = 'Replays API traffic in-process for a while and reports how the memory of the worker grows over time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duration', type=float, default=300, help='Seconds to replay traffic for')
+        parser.add_argument('--interval', type=float, default=30, help='Seconds between memory reports')
+        parser.add_argument('--log', help='File of GET request paths to replay, one per line, optionally after the '
+                                          'method; by default a mix of catalog reads is generated')
+        parser.add_argument('--username', help='User the requests are made as; by default the first staff user')
+        parser.add_argument('--objects', type=int, default=200, help='Products and locations sampled per shard '
+                                                                     'for the generated traffic')
+        parser.add_argument('--top', type=int, default=10, help='Allocation sites listed at the end')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the request order')
+
+    def handle(self, *args, **options):
+        """
+        Handles the command execution.
+
+        Sends the requests through the whole middleware and view stack with the test
+        client, in random order and without rate limits, with allocations traced by
+        `memory_profiler`. Every interval the traced memory and RSS are reported; at the
+        end, the growth rate after the first interval, the allocation sites that grew the
+        most since then and the allocations per endpoint.
+
+        Args:
+            *args: Variable length argument list.
+            **options: Arbitrary keyword arguments.
+        """
+        paths = self.read_log(options['log']) if options['log'] else self.generate_traffic(options['objects'])
+        if not paths:
+            raise CommandError('No requests to replay; populate the catalog or pass a log.')
+        client = APIClient()
+        client.force_authenticate(self.get_user(options['username']))
+        random.seed(options['seed'])
+
+        memory_profiler.enabled = True
+        memory_profiler.sample_interval = 0
+        memory_profiler.start()
+        self.stdout.write(f"{'seconds':>8} {'requests':>9} {'req/s':>7} {'traced MiB':>11} {'RSS MiB':>9} "
+                          f"{'growth MiB':>11}")
+        statuses = Counter()
+        rows, warm_snapshot = [], None
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+                               REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {}}):
+            started_at = reported_at = time.monotonic()
+            while True:
+                now = time.monotonic()
+                if now - reported_at >= options['interval'] or now - started_at >= options['duration']:
+                    reported_at = now
+                    rows.append(self.report_interval(now - started_at, sum(statuses.values()), rows))
+                    if warm_snapshot is None:
+                        warm_snapshot = take_snapshot()
+                    if now - started_at >= options['duration']:
+                        break
+                statuses[client.get(random.choice(paths)).status_code] += 1
+
+        self.stdout.write(f"\nResponses: {', '.join(f'{count} x {code}' for code, count in sorted(statuses.items()))}")
+        if len(rows) > 2:
+            slope = self.get_slope([(seconds, traced) for seconds, requests, traced in rows[1:]])
+            per_request = (rows[-1][2] - rows[1][2]) / max(rows[-1][1] - rows[1][1], 1)
+            self.stdout.write(f"Traced memory growth after the first interval: {slope * 60 / MIB:,.3f} MiB/min, "
+                              f"{per_request:,.0f} bytes/request")
+        self.stdout.write("\nAllocation sites that grew the most after the first interval:")
+        for site in format_statistics(take_snapshot().compare_to(warm_snapshot, 'lineno'), options['top']):
+            self.stdout.write(f"  {site['size_diff'] / 1024:>+10,.1f} KiB {site['count_diff']:>+8}  "
+                              f"{site['traceback'][0]}")
+        self.write_endpoints(memory_profiler.report()['endpoints'])
+
+    def read_log(self, path):
+        with open(path) as file:
+            return [line.split()[-1] for line in file if line.strip()]
+
+    def generate_traffic(self, limit):
+        """
+        Generates a mix of catalog reads: products in both shapes, product pages with and
+        without ``detail=true``, locations, their departments and autocomplete lookups.
+
+        Args:
+            limit (int): The number of products and locations sampled per shard.
+
+        Returns:
+            list: The request paths, repeated to weigh the mix.
+        """
+        products, locations = [], []
+        for alias in CATALOG_SHARDS:
+            products += Product.objects.using(alias).values_list('pk', 'name')[:limit]
+            locations += Location.objects.using(alias).values_list('pk', flat=True)[:limit]
+        paths = []
+        for pk, name in products:
+            paths += [f'/api/v1/products/{pk}/'] * 3 + [f'/api/v1/products/{pk}/?detail=true',
+                                                        f'/api/v1/autocomplete/?q={name[:3]}']
+        for pk in locations:
+            paths += [f'/api/v1/locations/{pk}/departments/', f'/api/v1/locations/{pk}/departments/?detail=true']
+        if products:
+            for page in range(1, 6):
+                paths += [f'/api/v1/products/?page={page}'] * 5
+                paths.append(f'/api/v1/products/?page={page}&page_size=50&detail=true')
+        if locations:
+            paths += ['/api/v1/locations/'] * 5
+        return paths
+
+    def get_user(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f"No user {username}.")
+        user = User.objects.filter(is_staff=True).order_by('pk').first()
+        if user is None:
+            raise CommandError('No staff user; pass --username.')
+        return user
+
+    def report_interval(self, seconds, requests, rows):
+        """
+        Writes the memory of the process after an interval.
+
+        Args:
+            seconds (float): The seconds since the soak started.
+            requests (int): The number of requests sent so far.
+            rows (list): The earlier ``(seconds, requests, traced)`` rows.
+
+        Returns:
+            tuple: The ``(seconds, requests, traced)`` row.
+        """
+        sample = memory_profiler.sample()
+        traced = tracemalloc.get_traced_memory()[0]
+        rate = requests / seconds if seconds else 0
+        growth = (traced - rows[0][2]) / MIB if rows else 0
+        rss = f"{sample['rss'] / MIB:,.1f}" if sample['rss'] is not None else '-'
+        self.stdout.write(f"{seconds:>8.0f} {requests:>9} {rate:>7.0f} {traced / MIB:>11,.1f} {rss:>9} "
+                          f"{growth:>+11,.2f}")
+        return seconds, requests, traced
+
+    def get_slope(self, points):
+        """
+        Fits a line through ``(x, y)`` points by least squares.
+
+        Returns:
+            float: Its slope.
+        """
+        mean_x = sum(x for x, y in points) / len(points)
+        mean_y = sum(y for x, y in points) / len(points)
+        variance = sum((x - mean_x) ** 2 for x, y in points)
+        return sum((x - mean_x) * (y - mean_y) for x, y in points) / variance if variance else 0
+
+    def write_endpoints(self, endpoints):
+        self.stdout.write(f"\n{'endpoint':<52} {'requests':>9} {'net KiB':>9} {'peak KiB':>9} {'max KiB':>9}  phases "
+                          f"(peak KiB)")
+        for endpoint, stats in endpoints.items():
+            phases = ', '.join(f"{name} {phase['peak_max'] / 1024:,.0f}" for name, phase in stats['phases'].items())
+            self.stdout.write(f"{endpoint:<52} {stats['requests']:>9} {stats['net'] / 1024:>9,.0f} "
+                              f"{stats['peak_mean'] / 1024:>9,.0f} {stats['peak_max'] / 1024:>9,.0f}  {phases}")
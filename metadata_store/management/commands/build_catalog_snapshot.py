@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from metadata_store.snapshots import SNAPSHOT_PATH, write_snapshot
+
+
+class Command(BaseCommand):
+    """
+    Custom Django management command to write a read-only snapshot of the catalog.
+    """
+    help = 'Writes a memory-mappable snapshot of the whole catalog and swaps it in for the snapshot endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=SNAPSHOT_PATH, help='Path of the snapshot file')
+        parser.add_argument('--chunk-size', type=int, default=10000, help='Rows fetched per round trip')
+
+    def handle(self, *args, **options):
+        """
+        Handles the command execution.
+
+        Args:
+            *args: Variable length argument list.
+            **options: Arbitrary keyword arguments.
+        """
+        snapshot = write_snapshot(options['output'], chunk_size=options['chunk_size'])
+        counts = ', '.join(f"{count} {name}" for name, count in snapshot['counts'].items())
+        self.stdout.write(self.style.SUCCESS(f"Wrote snapshot {snapshot['version']} to {options['output']}: {counts}"))
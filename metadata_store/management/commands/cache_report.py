@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from metadata_store.cache_stats import cache_stats
+
+
+class Command(BaseCommand):
+    """
+    Custom Django management command reporting cache effectiveness, for tuning TTLs.
+    """
+    help = 'Reports cache hits, misses and bytes per key prefix, and the biggest and coldest cached keys'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=20, help='Keys listed as biggest and coldest')
+        parser.add_argument('--reset', action='store_true', help='Delete the statistics after reporting them')
+
+    def handle(self, *args, **options):
+        """
+        Handles the command execution.
+
+        Args:
+            *args: Variable length argument list.
+            **options: Arbitrary keyword arguments.
+        """
+        report = cache_stats.report(limit=options['limit'])
+        self.stdout.write(f"{'prefix':<36} {'hits':>10} {'misses':>10} {'hit ratio':>9} {'sets':>10} {'avg bytes':>10}")
+        for prefix, counts in report['prefixes'].items():
+            hit_ratio = f"{counts['hit_ratio']:.1%}" if counts['hit_ratio'] is not None else '-'
+            average = counts['bytes'] // counts['sets'] if counts['sets'] else 0
+            self.stdout.write(f"{prefix:<36} {counts['hits']:>10} {counts['misses']:>10} {hit_ratio:>9} "
+                              f"{counts['sets']:>10} {average:>10}")
+        for title, entries in (('Biggest keys', report['biggest']), ('Coldest keys', report['coldest'])):
+            self.stdout.write(f"\n{title} (bytes, hits, seconds left):")
+            for key, size, hits, ttl in entries:
+                self.stdout.write(f"  {size:>10} {hits:>8} {ttl:>6}  {key}")
+        if options['reset']:
+            cache_stats.reset()
+            self.stdout.write(self.style.SUCCESS('Reset the cache statistics'))
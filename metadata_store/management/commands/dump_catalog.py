@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from metadata_store.catalog_dump import DUMP_FORMATS, CatalogDumpError, dump_catalog
+
+
+class Command(BaseCommand):
+    """
+    Custom Django management command to export the catalog with Postgres COPY.
+    """
+    help = 'Dumps the location, department, category, subcategory and product tables of every shard with COPY'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Directory to write the dump to')
+        parser.add_argument('--format', choices=list(DUMP_FORMATS), default='binary', help='COPY format')
+
+    def handle(self, *args, **options):
+        """
+        Handles the command execution.
+
+        Args:
+            *args: Variable length argument list.
+            **options: Arbitrary keyword arguments.
+        """
+        try:
+            manifest = dump_catalog(options['directory'], options['format'])
+        except CatalogDumpError as exc:
+            raise CommandError(str(exc))
+        for alias, tables in manifest['shards'].items():
+            counts = ', '.join(f"{table['rows']} {model_name}" for model_name, table in tables.items())
+            self.stdout.write(self.style.SUCCESS(f"{alias}: dumped {counts}"))
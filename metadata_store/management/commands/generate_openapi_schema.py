@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from metadata_store.openapi import OPENAPI_SCHEMA_PATH, write_openapi_schema
+
+
+class Command(BaseCommand):
+    """
+    Custom Django management command to generate the OpenAPI document served by the API.
+    """
+    help = 'Generates the OpenAPI document of the API into the file served at api/v1/schema/'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=OPENAPI_SCHEMA_PATH, help='Path of the OpenAPI document')
+
+    def handle(self, *args, **options):
+        """
+        Handles the command execution.
+
+        Args:
+            *args: Variable length argument list.
+            **options: Arbitrary keyword arguments.
+        """
+        size = write_openapi_schema(options['output'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote the OpenAPI document to {options['output']} ({size} bytes)"))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from metadata_store.bloom import product_id_filter
+from metadata_store.catalog_dump import CatalogDumpError, load_catalog
+from metadata_store.invalidation import delete_cache_keys
+from metadata_store.models import Product
+from metadata_store.sharding import CATALOG_SHARDS
+
+
+class Command(BaseCommand):
+    """
+    Custom Django management command to restore a catalog dump with Postgres COPY.
+    """
+    help = 'Loads a catalog written by dump_catalog, deferring constraints and rebuilding the indexes afterwards'
+
+    # Every cached catalog response, as a load bypasses the model signals.
+    cache_key_formats = ['product_list:*', 'product_list_ids:*', 'product_retrieve:*', 'not_found:*', 'count:*']
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Directory of the dump')
+        parser.add_argument('--database', choices=CATALOG_SHARDS,
+                            help='Catalog database to load every dumped shard into, instead of the shard of the same name')
+        parser.add_argument('--truncate', action='store_true', help='Empty the catalog tables before loading')
+        parser.add_argument('--maintenance-work-mem', default='512MB', help='Postgres memory for the index builds')
+
+    def handle(self, *args, **options):
+        """
+        Handles the command execution.
+
+        Loads the dump, then clears the cached responses and rebuilds the product id Bloom
+        filter. Running workers pick up the loaded names for autocomplete once restarted.
+
+        Args:
+            *args: Variable length argument list.
+            **options: Arbitrary keyword arguments.
+        """
+        try:
+            counts = load_catalog(options['directory'], database=options['database'], truncate=options['truncate'],
+                                  maintenance_work_mem=options['maintenance_work_mem'])
+        except CatalogDumpError as exc:
+            raise CommandError(str(exc))
+        delete_cache_keys(self.cache_key_formats)
+        if product_id_filter.enabled:
+            product_id_filter.rebuild([Product.objects.using(alias) for alias in CATALOG_SHARDS])
+        counts = ', '.join(f"{count} {model_name}" for model_name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Loaded {counts}"))
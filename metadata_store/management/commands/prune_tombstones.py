@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from metadata_store.tombstones import TOMBSTONE_RETENTION, prune_tombstones
+
+
+class Command(BaseCommand):
+    """
+    Custom Django management command to delete the delete tombstones the change feed no longer serves.
+    """
+    help = 'Deletes the delete tombstones older than TOMBSTONE_RETENTION from every shard'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention', type=int, default=TOMBSTONE_RETENTION,
+                            help='Seconds to keep tombstones for, by default TOMBSTONE_RETENTION')
+        parser.add_argument('--dry-run', action='store_true', help='Count the expired tombstones without deleting them')
+
+    def handle(self, *args, **options):
+        """
+        Handles the command execution.
+
+        Args:
+            *args: Variable length argument list.
+            **options: Arbitrary keyword arguments.
+        """
+        if options['retention'] is None:
+            raise CommandError('TOMBSTONE_RETENTION is not set; pass --retention.')
+        pruned = prune_tombstones(options['retention'], dry_run=options['dry_run'])
+        for alias, count in pruned.items():
+            self.stdout.write(f"{alias}: {count} expired")
+        verb = 'Found' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(f"{verb} {sum(pruned.values())} expired tombstones"))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from metadata_store.bloom import product_id_filter
+from metadata_store.models import Product
+from metadata_store.sharding import CATALOG_SHARDS
+
+
+class Command(BaseCommand):
+    """
+    Custom Django management command to rebuild the Bloom filter of existing product ids.
+    """
+    help = 'Rebuilds the Bloom filter used to answer lookups of unknown product ids without the database'
+
+    def handle(self, *args, **kwargs):
+        """
+        Handles the command execution.
+
+        Args:
+            *args: Variable length argument list.
+            **kwargs: Arbitrary keyword arguments.
+        """
+        if not product_id_filter.enabled:
+            raise CommandError('Set PRODUCT_BLOOM_FILTER_ENABLED = True to use the product id Bloom filter.')
+        count = product_id_filter.rebuild([Product.objects.using(alias) for alias in CATALOG_SHARDS])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the product id Bloom filter with {count} ids'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from metadata_store.counters import reconcile_product_counts
+
+
+class Command(BaseCommand):
+    """
+    Custom Django management command to correct the denormalized product counts of the hierarchy.
+    """
+    help = 'Recounts the products under every location, department, category and subcategory and fixes drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report the drift without correcting it')
+
+    def handle(self, *args, **options):
+        """
+        Handles the command execution.
+
+        Args:
+            *args: Variable length argument list.
+            **options: Arbitrary keyword arguments.
+        """
+        drifted = reconcile_product_counts(dry_run=options['dry_run'])
+        for model_name, count in drifted.items():
+            self.stdout.write(f"{model_name}: {count} drifted")
+        verb = 'Found' if options['dry_run'] else 'Corrected'
+        self.stdout.write(self.style.SUCCESS(f"{verb} {sum(drifted.values())} drifted product counts"))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from metadata_store.partitioning import drop_orphaned_partitions, is_partitioned, sync_partitions
+from metadata_store.sharding import CATALOG_SHARDS
+
+
+class Command(BaseCommand):
+    """
+    Custom Django management command to create the missing product partitions of the locations
+    and drop those of deleted locations.
+    """
+    help = ('Creates a product partition for every location without one, moving its products out of the default '
+            'partition, and drops the partitions of deleted locations')
+
+    def handle(self, *args, **kwargs):
+        """
+        Handles the command execution.
+
+        Args:
+            *args: Variable length argument list.
+            **kwargs: Arbitrary keyword arguments.
+        """
+        for alias in CATALOG_SHARDS:
+            if not is_partitioned(alias):
+                self.stdout.write(f"{alias}: the product table isn't partitioned")
+                continue
+            created = sync_partitions(alias)
+            dropped = drop_orphaned_partitions(alias)
+            self.stdout.write(self.style.SUCCESS(f"{alias}: created {created} and dropped {dropped} product partitions"))
@@ -0,0 +1,331 @@
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from collections import defaultdict, deque
+from contextlib import nullcontext
+from datetime import datetime, timezone
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MEMORY_PROFILING_ENABLED = getattr(settings, 'MEMORY_PROFILING_ENABLED', False)
+MEMORY_PROFILING_FRAMES = getattr(settings, 'MEMORY_PROFILING_FRAMES', 5)
+MEMORY_PROFILING_SAMPLE_INTERVAL = getattr(settings, 'MEMORY_PROFILING_SAMPLE_INTERVAL', 60)
+MEMORY_PROFILING_SAMPLES = getattr(settings, 'MEMORY_PROFILING_SAMPLES', 60)
+MEMORY_PROFILING_TOP_SITES = getattr(settings, 'MEMORY_PROFILING_TOP_SITES', 20)
+
+# The phases of a request measured separately, besides the request as a whole.
+PHASES = ('queryset', 'serialization', 'rendering', 'cache')
+
+# Allocations made by the profiler itself and by imports are left out of snapshots.
+SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+]
+
+NULL_PHASE = nullcontext()
+
+
+def get_rss():
+    """
+    Returns the resident set size of the process in bytes, or None off Linux.
+    """
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+def take_snapshot():
+    return tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+
+
+def format_statistics(statistics, limit):
+    """
+    Lists the largest allocation sites of a snapshot or of a snapshot diff.
+
+    Args:
+        statistics (list): ``tracemalloc.Statistic`` or ``StatisticDiff`` objects, largest first.
+        limit (int): The number of sites to list.
+
+    Returns:
+        list: Per site, its ``traceback`` (most recent call last), ``size`` and ``count``, and
+        for diffs their ``size_diff`` and ``count_diff``.
+    """
+    sites = []
+    for statistic in statistics[:limit]:
+        site = {
+            'traceback': [f'{frame.filename}:{frame.lineno}' for frame in statistic.traceback],
+            'size': statistic.size,
+            'count': statistic.count,
+        }
+        if isinstance(statistic, tracemalloc.StatisticDiff):
+            site.update(size_diff=statistic.size_diff, count_diff=statistic.count_diff)
+        sites.append(site)
+    return sites
+
+
+class Phase:
+    """
+    Measures the allocations of one phase of a request: the memory still allocated when
+    it ends (``net``) and the most allocated at once during it (``peak``), both relative
+    to when it started. Phases nest; the request itself is the outermost one.
+    """
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.reentered = False
+        self.start = self.peak = self.net = 0
+
+    def __enter__(self):
+        stack = self.profiler.get_stack()
+        if stack and stack[-1].name == self.name:
+            # E.g. the serializers nested in a serializer.
+            self.reentered = True
+            return self
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1].peak = max(stack[-1].peak, peak)
+        tracemalloc.reset_peak()
+        self.start = self.peak = current
+        stack.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.reentered:
+            return False
+        current, peak = tracemalloc.get_traced_memory()
+        stack = self.profiler.get_stack()
+        # Phases left open by an exception end with the phase around them.
+        while stack and stack.pop() is not self:
+            pass
+        self.peak = max(self.peak, peak) - self.start
+        self.net = current - self.start
+        if stack:
+            stack[-1].peak = max(stack[-1].peak, self.start + self.peak)
+            stack[0].phases[self.name].append((self.net, self.peak))
+        return False
+
+
+class RequestPhase(Phase):
+    def __init__(self, profiler):
+        super().__init__(profiler, 'request')
+        self.phases = defaultdict(list)
+
+
+class MemoryProfiler:
+    """
+    Attributes the memory allocated by a worker to endpoints and request phases with
+    `tracemalloc`, and samples its largest allocation sites every ``sample_interval``
+    seconds.
+
+    Per endpoint, the net allocations of each request (what it left allocated) and its
+    peak allocations are accumulated, along with those of the queryset evaluation,
+    serialization, rendering and cache (de)serialization phases within it. Tracing is
+    process wide, so the figures are exact when a worker serves one request at a time
+    and blend concurrent requests in threaded workers.
+
+    Tracing slows allocations down severalfold and keeps ``frames`` frames per traced
+    block, so it is only started when enabled.
+    """
+    def __init__(self, frames, sample_interval, max_samples, top_sites, enabled=True):
+        self.frames = frames
+        self.sample_interval = sample_interval
+        self.top_sites = top_sites
+        self.enabled = enabled
+        self.samples = deque(maxlen=max_samples)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.sampler = None
+        self.fork_hooks = False
+        self.reset_statistics()
+
+    @property
+    def active(self):
+        return self.enabled and tracemalloc.is_tracing()
+
+    def reset_statistics(self):
+        self.endpoints = defaultdict(lambda: {'requests': 0, 'net': 0, 'net_max': 0, 'peak_max': 0, 'peak_total': 0,
+                                              'phases': defaultdict(lambda: {'count': 0, 'net': 0, 'peak_max': 0})})
+        self.started_at = datetime.now(timezone.utc)
+        self.baseline = None
+        self.last_snapshot = None
+        self.samples.clear()
+
+    def start(self):
+        """
+        Starts tracing and the sampling thread, once per process.
+        """
+        if not self.enabled or self.sampler is not None:
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        with self.lock:
+            self.baseline = self.last_snapshot = take_snapshot()
+        if not self.fork_hooks:
+            os.register_at_fork(after_in_child=self.after_fork_in_child)
+            self.fork_hooks = True
+        if self.sample_interval:
+            self.sampler = threading.Thread(target=self.run_sampler, name='memory-sampler', daemon=True)
+            self.sampler.start()
+        else:
+            self.sampler = False
+
+    def after_fork_in_child(self):
+        # Forked workers don't inherit the sampling thread, nor the master's statistics.
+        self.sampler = None
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.reset_statistics()
+        self.start()
+
+    def get_stack(self):
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def phase(self, name):
+        """
+        Returns a context manager measuring a phase of the current request, which does
+        nothing outside a profiled request.
+
+        Args:
+            name (str): One of `PHASES`.
+        """
+        if not self.active or not self.get_stack():
+            return NULL_PHASE
+        return Phase(self, name)
+
+    def request(self):
+        """
+        Returns a context manager measuring a request, or doing nothing if tracing is off.
+        """
+        if not self.active:
+            return NULL_PHASE
+        return RequestPhase(self)
+
+    def record(self, endpoint, request_phase):
+        """
+        Adds a measured request to the statistics of its endpoint.
+
+        Args:
+            endpoint (str): The endpoint, e.g. ``GET products-detail``.
+            request_phase (RequestPhase): The request's measurements.
+        """
+        with self.lock:
+            stats = self.endpoints[endpoint]
+            stats['requests'] += 1
+            stats['net'] += request_phase.net
+            stats['net_max'] = max(stats['net_max'], request_phase.net)
+            stats['peak_max'] = max(stats['peak_max'], request_phase.peak)
+            stats['peak_total'] += request_phase.peak
+            for name, measurements in request_phase.phases.items():
+                phase_stats = stats['phases'][name]
+                phase_stats['count'] += len(measurements)
+                phase_stats['net'] += sum(net for net, peak in measurements)
+                phase_stats['peak_max'] = max(phase_stats['peak_max'], *(peak for net, peak in measurements))
+
+    def run_sampler(self):
+        while True:
+            time.sleep(self.sample_interval)
+            try:
+                self.sample()
+            except Exception:
+                logger.exception("Failed to sample the memory allocations")
+
+    def sample(self):
+        """
+        Records the traced memory and RSS of the process, its largest allocation sites and
+        those that grew the most since the previous sample.
+
+        Returns:
+            dict: The sample.
+        """
+        snapshot = take_snapshot()
+        with self.lock:
+            previous, self.last_snapshot = self.last_snapshot, snapshot
+        sample = {
+            'at': datetime.now(timezone.utc).isoformat(),
+            'traced': tracemalloc.get_traced_memory()[0],
+            'rss': get_rss(),
+            'top': format_statistics(snapshot.statistics('lineno'), self.top_sites),
+            'growth': format_statistics(snapshot.compare_to(previous, 'lineno'), self.top_sites) if previous else [],
+        }
+        self.samples.append(sample)
+        return sample
+
+    def diff(self, since='baseline', group_by='lineno', limit=None):
+        """
+        Compares the allocations of the process now with an earlier snapshot.
+
+        Args:
+            since (str): ``baseline`` for the snapshot taken when tracing started or the
+                statistics were reset, ``sample`` for the latest sample.
+            group_by (str): ``lineno`` or ``traceback``.
+            limit (int): The number of sites to list.
+
+        Returns:
+            dict: The traced memory and RSS now, and the sites that grew the most.
+        """
+        snapshot = take_snapshot()
+        earlier = self.baseline if since == 'baseline' else self.last_snapshot
+        return {
+            'since': since,
+            'traced': tracemalloc.get_traced_memory()[0],
+            'rss': get_rss(),
+            'sites': format_statistics(snapshot.compare_to(earlier, group_by), limit or self.top_sites),
+        }
+
+    def report(self):
+        """
+        Returns:
+            dict: The per endpoint and per phase statistics since tracing started or the
+            last reset, and the periodic samples.
+        """
+        with self.lock:
+            endpoints = {}
+            for endpoint, stats in sorted(self.endpoints.items()):
+                endpoints[endpoint] = {
+                    'requests': stats['requests'],
+                    'net': stats['net'],
+                    'net_max': stats['net_max'],
+                    'peak_max': stats['peak_max'],
+                    'peak_mean': stats['peak_total'] // stats['requests'],
+                    'phases': {name: dict(phase_stats) for name, phase_stats in stats['phases'].items()},
+                }
+        return {
+            'pid': os.getpid(),
+            'tracing': self.active,
+            'since': self.started_at.isoformat(),
+            'traced': tracemalloc.get_traced_memory()[0] if self.active else None,
+            'rss': get_rss(),
+            'endpoints': endpoints,
+            'samples': list(self.samples),
+        }
+
+    def reset(self):
+        """
+        Clears the statistics and samples, and takes a new baseline snapshot.
+        """
+        with self.lock:
+            self.reset_statistics()
+            if self.active:
+                self.baseline = self.last_snapshot = take_snapshot()
+
+
+memory_profiler = MemoryProfiler(MEMORY_PROFILING_FRAMES, MEMORY_PROFILING_SAMPLE_INTERVAL, MEMORY_PROFILING_SAMPLES,
+                                 MEMORY_PROFILING_TOP_SITES, enabled=MEMORY_PROFILING_ENABLED)
+
+
+def memory_phase(name):
+    """
+    Returns a context manager measuring a phase of the current request, see `MemoryProfiler`.
+    """
+    return memory_profiler.phase(name)
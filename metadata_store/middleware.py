@@ -0,0 +1,76 @@
+from contextlib import ExitStack
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from metadata_store.memory_profiling import memory_phase, memory_profiler
+from metadata_store.throttling import LOAD_SHEDDING_LATENCY, db_latency
+from metadata_store.utils import str_to_bool
+
+
+class DatabaseLatencyMiddleware:
+    """
+    Middleware timing every database query of a request to feed the load shedding throttle.
+
+    Disabled unless ``LOAD_SHEDDING_LATENCY`` is set.
+    """
+    def __init__(self, get_response):
+        if LOAD_SHEDDING_LATENCY is None:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(db_latency))
+            return self.get_response(request)
+
+
+class MemoryProfilingMiddleware:
+    """
+    Middleware measuring the memory allocated by every request and by the rendering of
+    its response, per endpoint, with `memory_profiler`.
+
+    Disabled unless ``MEMORY_PROFILING_ENABLED`` is set. Goes first in ``MIDDLEWARE``
+    to cover the whole request.
+    """
+    def __init__(self, get_response):
+        if not memory_profiler.enabled:
+            raise MiddlewareNotUsed
+        memory_profiler.start()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with memory_profiler.request() as request_phase:
+            response = self.get_response(request)
+        if request_phase is not None:
+            memory_profiler.record(self.get_endpoint(request), request_phase)
+        return response
+
+    def get_endpoint(self, request):
+        """
+        Names the endpoint of a request by its method and URL name, telling ``detail=true``
+        requests apart as their responses are much larger.
+
+        Args:
+            request (HttpRequest): The request.
+
+        Returns:
+            str: The endpoint, e.g. ``GET products-detail?detail=true``.
+        """
+        match = request.resolver_match
+        endpoint = f"{request.method} {match.view_name if match else 'unresolved'}"
+        if str_to_bool(request.GET.get('detail', 'false')):
+            endpoint += '?detail=true'
+        return endpoint
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered once the view returns; the phase ends after rendering.
+        phase = memory_phase('rendering')
+        phase.__enter__()
+
+        def end_phase(rendered_response):
+            phase.__exit__(None, None, None)
+
+        response.add_post_render_callback(end_phase)
+        return response
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-19 01:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('metadata_store', '0004_tombstone_category_category_updated_at_id_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.UniqueConstraint(fields=('subcategory', 'name'), name='unique_subcategory_product__name'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:00
+
+from django.db import migrations, models
+import metadata_store.ids
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('metadata_store', '0005_product_unique_subcategory_product__name'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='category',
+            name='id',
+            field=models.UUIDField(default=metadata_store.ids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='department',
+            name='id',
+            field=models.UUIDField(default=metadata_store.ids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='location',
+            name='id',
+            field=models.UUIDField(default=metadata_store.ids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='id',
+            field=models.UUIDField(default=metadata_store.ids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='subcategory',
+            name='id',
+            field=models.UUIDField(default=metadata_store.ids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='tombstone',
+            name='id',
+            field=models.UUIDField(default=metadata_store.ids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+    ]
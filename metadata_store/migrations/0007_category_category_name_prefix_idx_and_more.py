@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:05
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.functions.text
+import metadata_store.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('metadata_store', '0006_alter_category_id_alter_department_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='category',
+            index=metadata_store.models.NamePrefixIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='text_pattern_ops'), name='category_name_prefix_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='department',
+            index=metadata_store.models.NamePrefixIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='text_pattern_ops'), name='department_name_prefix_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='location',
+            index=metadata_store.models.NamePrefixIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='text_pattern_ops'), name='location_name_prefix_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=metadata_store.models.NamePrefixIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='text_pattern_ops'), name='product_name_prefix_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subcategory',
+            index=metadata_store.models.NamePrefixIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='text_pattern_ops'), name='subcategory_name_prefix_idx'),
+        ),
+    ]
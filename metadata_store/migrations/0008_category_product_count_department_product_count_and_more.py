@@ -0,0 +1,54 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:07
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_products(apps, schema_editor):
+    """
+    Initializes the product counts of the existing hierarchy.
+    """
+    Product = apps.get_model('metadata_store', 'Product')
+    lookups = {
+        'Location': 'subcategory__category__department__location',
+        'Department': 'subcategory__category__department',
+        'Category': 'subcategory__category',
+        'SubCategory': 'subcategory',
+    }
+    for model_name, lookup in lookups.items():
+        count = Product.objects.filter(**{lookup: OuterRef('pk')}).order_by().values(lookup).annotate(
+            count=Count('pk')).values('count')
+        apps.get_model('metadata_store', model_name).objects.update(
+            product_count=Coalesce(Subquery(count), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('metadata_store', '0007_category_category_name_prefix_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='department',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='subcategory',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_products, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:13
+
+from django.db import migrations, models
+
+
+def register_locations(apps, schema_editor):
+    """
+    Records the existing locations in the shard directory, on the database they are on.
+    """
+    alias = schema_editor.connection.alias
+    Location = apps.get_model('metadata_store', 'Location')
+    LocationShard = apps.get_model('metadata_store', 'LocationShard')
+    LocationShard.objects.using(alias).bulk_create([
+        LocationShard(location_id=pk, location_name=name, shard=alias)
+        for pk, name in Location.objects.using(alias).values_list('pk', 'name')
+    ], batch_size=1000)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('metadata_store', '0008_category_product_count_department_product_count_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LocationShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('location_id', models.UUIDField(unique=True)),
+                ('location_name', models.CharField(max_length=255, unique=True)),
+                ('shard', models.CharField(max_length=100)),
+            ],
+        ),
+        migrations.RunPython(register_locations, migrations.RunPython.noop, hints={'model_name': 'locationshard'}),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:18
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def copy_locations(apps, schema_editor):
+    """
+    Copies the location of each existing product's subcategory into the product.
+    """
+    alias = schema_editor.connection.alias
+    Product = apps.get_model('metadata_store', 'Product')
+    SubCategory = apps.get_model('metadata_store', 'SubCategory')
+    Product.objects.using(alias).update(location=Subquery(
+        SubCategory.objects.using(alias).filter(pk=OuterRef('subcategory')).values('category__department__location')
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('metadata_store', '0009_locationshard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='location',
+            field=models.ForeignKey(db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='metadata_store.location'),
+        ),
+        migrations.RunPython(copy_locations, migrations.RunPython.noop, hints={'model_name': 'product'}),
+        migrations.AlterField(
+            model_name='product',
+            name='location',
+            field=models.ForeignKey(db_index=False, editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='metadata_store.location'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['location', '-created_at'], name='product_location_created_idx'),
+        ),
+    ]
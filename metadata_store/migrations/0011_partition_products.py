@@ -0,0 +1,66 @@
+from django.db import migrations
+
+
+def rebuild_product_table(apps, schema_editor, partitioned):
+    """
+    Rebuilds the product table of a Postgres database, partitioned by location or not,
+    copying its rows over.
+
+    The primary key and unique constraint of a partitioned table have to include the
+    partition key, so they become ``(id, location_id)`` and ``(subcategory_id, name,
+    location_id)``; a subcategory's products all share its location, so the constraints
+    are as strict as before. Each location gets a partition, and a default partition
+    takes the products of locations created without one.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    alias = schema_editor.connection.alias
+    Product = apps.get_model('metadata_store', 'Product')
+    Location = apps.get_model('metadata_store', 'Location')
+    qn = schema_editor.quote_name
+    table = Product._meta.db_table
+    old_table = f'{table}_old'
+
+    schema_editor.execute(f"ALTER TABLE {qn(table)} RENAME TO {qn(old_table)}")
+    if partitioned:
+        schema_editor.execute(
+            f"CREATE TABLE {qn(table)} (LIKE {qn(old_table)} INCLUDING DEFAULTS) PARTITION BY LIST (location_id)")
+        schema_editor.execute(f"CREATE TABLE {qn(f'{table}_default')} PARTITION OF {qn(table)} DEFAULT")
+        for location_id in Location.objects.using(alias).values_list('pk', flat=True).iterator():
+            schema_editor.execute(
+                f"CREATE TABLE {qn(f'{table}_{location_id.hex}')} PARTITION OF {qn(table)} FOR VALUES IN (%s)",
+                [str(location_id)],
+            )
+    else:
+        schema_editor.execute(f"CREATE TABLE {qn(table)} (LIKE {qn(old_table)} INCLUDING DEFAULTS)")
+    schema_editor.execute(f"INSERT INTO {qn(table)} SELECT * FROM {qn(old_table)}")
+    schema_editor.execute(f"DROP TABLE {qn(old_table)}")
+
+    key_columns = ', location_id' if partitioned else ''
+    schema_editor.execute(f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(f'{table}_pkey')} PRIMARY KEY (id{key_columns})")
+    schema_editor.execute(f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn('unique_subcategory_product__name')} "
+                          f"UNIQUE (subcategory_id, name{key_columns})")
+    for field in Product._meta.local_fields:
+        if field.remote_field:
+            schema_editor.execute(schema_editor._create_fk_sql(Product, field, '_fk_%(to_table)s_%(to_column)s'))
+    for sql in schema_editor._model_indexes_sql(Product):
+        schema_editor.execute(sql)
+
+
+def partition_products(apps, schema_editor):
+    rebuild_product_table(apps, schema_editor, partitioned=True)
+
+
+def unpartition_products(apps, schema_editor):
+    rebuild_product_table(apps, schema_editor, partitioned=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('metadata_store', '0010_product_location'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_products, unpartition_products, hints={'model_name': 'product'}),
+    ]
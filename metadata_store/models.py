@@ -1,6 +1,37 @@
 
-import uuid
-from django.db import models
+from django.contrib.postgres.indexes import OpClass
+from django.db import models, router
+from django.db.models.functions import Upper
+from metadata_store.ids import uuid7
+
+
+class NamePrefixIndex(models.Index):
+    """
+    Index whose operator classes only apply on Postgres; other databases, which have no
+    operator classes, get a plain index on the same expressions.
+    """
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if schema_editor.connection.vendor == 'postgresql':
+            return super().create_sql(model, schema_editor, using=using, **kwargs)
+        expressions = [
+            expression.get_source_expressions()[0] if isinstance(expression, OpClass) else expression
+            for expression in self.expressions
+        ]
+        plain_index = models.Index(*expressions, name=self.name, condition=self.condition, include=self.include)
+        return plain_index.create_sql(model, schema_editor, using=using, **kwargs)
+
+
+def name_prefix_index(name):
+    """
+    Returns an index serving case-insensitive prefix searches (``name__istartswith``) on ``name``.
+
+    Args:
+        name (str): The name of the index.
+
+    Returns:
+        Index: The index on ``UPPER(name)``, with the ``text_pattern_ops`` operator class on Postgres.
+    """
+    return NamePrefixIndex(OpClass(Upper('name'), name='text_pattern_ops'), name=name)
 
 
 class BaseModel(models.Model):
@@ -8,32 +39,87 @@ class BaseModel(models.Model):
     Abstract base model providing common fields for other models.
 
     Fields:
-        id (UUIDField): Primary key, generated automatically.
+        id (UUIDField): Primary key, a time-ordered UUIDv7 generated automatically.
         created_at (DateTimeField): The date and time when the object was created.
         updated_at (DateTimeField): The date and time when the object was last updated.
+
+    Meta:
+        indexes (list): Supports the change feed, which pages by ``(updated_at, id)``.
     """
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         abstract = True
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='%(class)s_updated_at_id_idx')
+        ]
+
+
+class HierarchyModel(BaseModel):
+    """
+    Abstract base model for the levels of the hierarchy products are filed under.
+
+    Fields:
+        product_count (PositiveIntegerField): The number of products under the object. It is
+            kept up to date with ``F()`` increments, see `metadata_store.counters`.
+    """
+    product_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta(BaseModel.Meta):
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        """
+        Saves the object without overwriting ``product_count`` with the value it was loaded
+        with, which would lose the increments made since.
+        """
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name != 'product_count']
+        super().save(*args, **kwargs)
 
 
-class Location(BaseModel):
+class Location(HierarchyModel):
     """
     Model representing location information.
 
     Fields:
         name (CharField): The name of the location.
+
+    Meta:
+        indexes (list): Supports autocompleting names.
     """
     name = models.CharField(max_length=255, unique=True)
 
+    class Meta(HierarchyModel.Meta):
+        indexes = BaseModel.Meta.indexes + [name_prefix_index('location_name_prefix_idx')]
+
     def __str__(self):
         return self.name
 
-
-class Department(BaseModel):
+    def delete(self, using=None, keep_parents=False):
+        """
+        Deletes the location and everything under it. A location with a product partition
+        of its own is deleted with `delete_subtree`, which drops the partition instead of
+        collecting its products and deleting them one by one.
+        """
+        # Imported here, as these modules import the models.
+        from metadata_store.deletion import delete_subtree
+        from metadata_store.partitioning import has_partition
+
+        using = using or router.db_for_write(Location, instance=self)
+        if not has_partition(self.pk, using):
+            return super().delete(using=using, keep_parents=keep_parents)
+        self._state.db = using
+        counts = delete_subtree(self)
+        self.pk = None
+        return sum(counts.values()), {self._meta.apps.get_model(self._meta.app_label, name)._meta.label: count
+                                      for name, count in counts.items()}
+
+
+class Department(HierarchyModel):
     """
     Model representing a department within a location.
 
@@ -43,20 +129,22 @@ class Department(BaseModel):
 
     Meta:
         constraints (list): Ensures that each department name is unique within a location.
+        indexes (list): Supports autocompleting names.
     """
     name = models.CharField(max_length=255)
     location = models.ForeignKey(Location, related_name='departments', on_delete=models.CASCADE)
 
-    class Meta:
+    class Meta(HierarchyModel.Meta):
         constraints = [
             models.UniqueConstraint(fields=['location', 'name'], name='unique_location_department_name')
         ]
+        indexes = BaseModel.Meta.indexes + [name_prefix_index('department_name_prefix_idx')]
 
     def __str__(self):
         return f"{self.location.name}>{self.name}"
 
 
-class Category(BaseModel):
+class Category(HierarchyModel):
     """
     Model representing a category within a department.
 
@@ -66,20 +154,22 @@ class Category(BaseModel):
 
     Meta:
         constraints (list): Ensures that each category name is unique within a department.
+        indexes (list): Supports autocompleting names.
     """
     name = models.CharField(max_length=255)
     department = models.ForeignKey(Department, related_name='categories', on_delete=models.CASCADE)
 
-    class Meta:
+    class Meta(HierarchyModel.Meta):
         constraints = [
             models.UniqueConstraint(fields=['department', 'name'], name='unique_department_category__name')
         ]
+        indexes = BaseModel.Meta.indexes + [name_prefix_index('category_name_prefix_idx')]
 
     def __str__(self):
         return f"{self.department.location.name}>{self.department.name}>{self.name}"
 
 
-class SubCategory(BaseModel):
+class SubCategory(HierarchyModel):
     """
     Model representing a subcategory within a category.
 
@@ -89,14 +179,16 @@ class SubCategory(BaseModel):
 
     Meta:
         constraints (list): Ensures that each subcategory name is unique within a category.
+        indexes (list): Supports autocompleting names.
     """
     name = models.CharField(max_length=255)
     category = models.ForeignKey(Category, related_name='subcategories', on_delete=models.CASCADE)
 
-    class Meta:
+    class Meta(HierarchyModel.Meta):
         constraints = [
             models.UniqueConstraint(fields=['category', 'name'], name='unique_category_subcategory__name')
         ]
+        indexes = BaseModel.Meta.indexes + [name_prefix_index('subcategory_name_prefix_idx')]
 
     def __str__(self):
         return f"{self.category.department.location.name}>{self.category.department.name}>{self.category.name}>{self.name}"
@@ -109,13 +201,93 @@ class Product(BaseModel):
     Fields:
         name (CharField): The name of the product.
         subcategory (ForeignKey): The subcategory to which the product belongs.
+        location (ForeignKey): The location of the subcategory, copied on save. On Postgres
+            the product table is partitioned by it, see `metadata_store.partitioning`.
+
+    Meta:
+        constraints (list): Ensures that each product name is unique within a subcategory.
+        indexes (list): Supports autocompleting names and listing a location's newest products.
     """
     name = models.CharField(max_length=255)
     subcategory = models.ForeignKey(SubCategory, related_name='products', on_delete=models.CASCADE)
-
-    # TODO: do (subcategory,name) fields need to be unique together?
+    location = models.ForeignKey(Location, related_name='+', on_delete=models.CASCADE, editable=False,
+                                 db_index=False)
 
     # TODO: can a product be included in multiple subcategories?
 
+    class Meta(BaseModel.Meta):
+        constraints = [
+            models.UniqueConstraint(fields=['subcategory', 'name'], name='unique_subcategory_product__name')
+        ]
+        indexes = BaseModel.Meta.indexes + [
+            name_prefix_index('product_name_prefix_idx'),
+            models.Index(fields=['location', '-created_at'], name='product_location_created_idx'),
+        ]
+
     def __str__(self):
         return self.name
+
+    def save(self, *args, **kwargs):
+        """
+        Saves the product, copying the location of its subcategory when the product is new
+        or moved to another subcategory.
+        """
+        if self.location_id is None or self.subcategory_id != getattr(self, '_loaded_subcategory_id', None):
+            using = kwargs.get('using') or router.db_for_write(Product, instance=self)
+            self.location_id = SubCategory.objects.using(using).filter(pk=self.subcategory_id).values_list(
+                'category__department__location', flat=True).first()
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'location' not in update_fields:
+                kwargs['update_fields'] = [*update_fields, 'location']
+        super().save(*args, **kwargs)
+
+
+class Tombstone(BaseModel):
+    """
+    Model recording the deletion of a catalog object, so the change feed can report deletes.
+
+    Fields:
+        model_name (CharField): The model name of the deleted object, e.g. ``product``.
+        object_id (UUIDField): The primary key of the deleted object.
+
+    Meta:
+        indexes (list): Supports paging a single model's deletes by ``(updated_at, id)``.
+    """
+    model_name = models.CharField(max_length=100)
+    object_id = models.UUIDField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model_name', 'updated_at', 'id'], name='tombstone_model_updated_idx')
+        ]
+
+    def __str__(self):
+        return f"{self.model_name}:{self.object_id}"
+
+
+# Lookup from each model up to the root of the hierarchy.
+HIERARCHY_PATHS = {
+    Product: 'subcategory__category__department__location',
+    SubCategory: 'category__department__location',
+    Category: 'department__location',
+    Department: 'location',
+    Location: '',
+}
+
+
+class LocationShard(models.Model):
+    """
+    Model recording which catalog shard holds each location's subtree. Lives on the
+    default database.
+
+    Fields:
+        location_id (UUIDField): The id of the location.
+        location_name (CharField): The name of the location, unique across all shards.
+        shard (CharField): The database alias of the shard.
+    """
+    location_id = models.UUIDField(unique=True)
+    location_name = models.CharField(max_length=255, unique=True)
+    shard = models.CharField(max_length=100)
+
+    def __str__(self):
+        return f"{self.location_name}:{self.shard}"
@@ -0,0 +1,94 @@
+import os
+import threading
+
+from django.conf import settings
+from django.http import HttpRequest
+from rest_framework.request import Request
+
+OPENAPI_SCHEMA_PATH = getattr(settings, 'OPENAPI_SCHEMA_PATH', os.path.join(settings.BASE_DIR, 'openapi.json'))
+OPENAPI_SCHEMA_URL = getattr(settings, 'OPENAPI_SCHEMA_URL', '')
+
+
+def build_openapi_schema(url=OPENAPI_SCHEMA_URL):
+    """
+    Generates the OpenAPI document of the API with drf-yasg.
+
+    The endpoints are inspected as seen by an anonymous ``GET`` request, so the document
+    doesn't depend on who generates it. Its URL comes from ``url`` rather than from that
+    request, whose host isn't one the deployment necessarily accepts.
+
+    Args:
+        url (str): The scheme, host and port the document points clients to, e.g.
+            ``https://catalog.example.com``; by default none, so clients use the host they
+            fetched it from.
+
+    Returns:
+        bytes: The document, as JSON.
+    """
+    # Imported here so that workers serving the generated file never load drf-yasg.
+    from drf_yasg import openapi
+    from drf_yasg.codecs import OpenAPICodecJson
+    from drf_yasg.generators import OpenAPISchemaGenerator
+
+    generator = OpenAPISchemaGenerator(openapi.Info(
+        title="Products metadata",
+        default_version='v1',
+        description="Product metadata",
+    ), url=url)
+    http_request = HttpRequest()
+    http_request.method = 'GET'
+    schema = generator.get_schema(request=Request(http_request), public=True)
+    return OpenAPICodecJson(validators=[]).encode(schema)
+
+
+def write_openapi_schema(path=OPENAPI_SCHEMA_PATH):
+    """
+    Generates the OpenAPI document and atomically swaps it in at ``path``.
+
+    Args:
+        path (str): The path of the document.
+
+    Returns:
+        int: The size of the document in bytes.
+    """
+    content = build_openapi_schema()
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(temp_path, 'wb') as file:
+            file.write(content)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return len(content)
+
+
+class OpenAPISchemaStore:
+    """
+    Holds the OpenAPI document a worker serves, read once from the file written at deploy
+    time by ``python manage.py generate_openapi_schema``, or generated into it on first use.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.content = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        """
+        Returns the OpenAPI document.
+
+        Returns:
+            bytes: The document, as JSON.
+        """
+        if self.content is None:
+            with self.lock:
+                if self.content is None:
+                    if not os.path.exists(self.path):
+                        write_openapi_schema(self.path)
+                    with open(self.path, 'rb') as file:
+                        self.content = file.read()
+        return self.content
+
+
+openapi_schema = OpenAPISchemaStore(OPENAPI_SCHEMA_PATH)
@@ -1,7 +1,346 @@
+import base64
+import heapq
+import json
+from datetime import timedelta
+from itertools import islice
 
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator as DjangoPaginator
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from rest_framework.exceptions import ValidationError
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from metadata_store.cache_stats import cache_stats
+from metadata_store.tombstones import TOMBSTONE_RETENTION, get_retention_cutoff
+from metadata_store.utils import PRODUCT_FILTER_PARAMS, get_filter_key
+
+
+class EstimatedCountPaginator(DjangoPaginator):
+    """
+    Paginator that reports Postgres planner estimates instead of exact counts for large
+    result sets, and can cache exact counts.
+
+    The estimate comes from ``pg_class.reltuples`` for unfiltered querysets and from the
+    ``EXPLAIN`` row estimate otherwise. When it reaches ``estimate_threshold`` it is used
+    as the count and ``count_is_estimate`` is set; below it the exact count is taken,
+    and cached under ``count_cache_key`` when one is given.
+    """
+    count_is_estimate = False
+
+    def __init__(self, object_list, per_page, estimate_threshold=None, count_cache_key=None,
+                 count_cache_ttl=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.estimate_threshold = estimate_threshold
+        self.count_cache_key = count_cache_key
+        self.count_cache_ttl = count_cache_ttl
+
+    @cached_property
+    def count(self):
+        """
+        Returns the estimated or exact number of objects.
+
+        Returns:
+            int: The count.
+        """
+        if self.estimate_threshold is not None:
+            estimate = self.get_estimate()
+            if estimate is not None and estimate >= self.estimate_threshold:
+                self.count_is_estimate = True
+                return estimate
+        if self.count_cache_key is None:
+            return DjangoPaginator.count.func(self)
+        count = cache.get(self.count_cache_key)
+        if count is not None:
+            cache_stats.record_hits('count', [self.count_cache_key])
+            return count
+        cache_stats.record_misses('count')
+        count = DjangoPaginator.count.func(self)
+        cache.set(self.count_cache_key, count, self.count_cache_ttl)
+        cache_stats.record_sets('count', {self.count_cache_key: count})
+        return count
+
+    def get_estimate(self):
+        """
+        Asks the Postgres planner how many rows the queryset returns.
+
+        Returns:
+            int: The estimated number of rows, or None if no estimate is available.
+        """
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet):
+            return None
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            if not queryset.query.where:
+                cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                               [connection.ops.quote_name(queryset.model._meta.db_table)])
+                row = cursor.fetchone()
+                return row[0] if row and row[0] >= 0 else None
+            sql, params = queryset.order_by().query.sql_with_params()
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]['Plan']['Plan Rows'])
+
+    def validate_number(self, number):
+        """
+        Validates a page number, allowing pages past an estimated count.
+
+        Args:
+            number: The requested page number.
+
+        Returns:
+            int: The page number.
+        """
+        self.count
+        if not self.count_is_estimate:
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger("That page number is not an integer")
+        if number < 1:
+            raise EmptyPage("That page number is less than 1")
+        return number
+
+    def page(self, number):
+        """
+        Returns a page. With an estimated count one extra row is fetched to tell whether
+        a next page exists.
+
+        Args:
+            number: The requested page number.
+
+        Returns:
+            Page: The page.
+        """
+        number = self.validate_number(number)
+        if not self.count_is_estimate:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        object_list = list(self.object_list[bottom:bottom + self.per_page + 1])
+        page = EstimatedCountPage(object_list[:self.per_page], number, self)
+        page.more = len(object_list) > self.per_page
+        return page
+
+
+class EstimatedCountPage(Page):
+    """
+    Page of an `EstimatedCountPaginator` whose next page is known from the extra row fetched.
+    """
+    more = False
+
+    def has_next(self):
+        return self.more
 
 
 class CustomPageNumberPagination(PageNumberPagination):
+    """
+    Page number pagination with optional estimated and cached counts.
+
+    Attributes:
+        estimate_count_threshold (int): Result sets estimated at this many rows or more report
+            the estimate as ``count`` with ``count_is_estimate`` set. None always counts exactly.
+        count_cache_ttl (int): Seconds to cache exact counts per endpoint and filter set. None
+            disables it; only enabled where every write invalidates the ``count:*`` keys.
+    """
     page_size_query_param = 'page_size'
     max_page_size = 100
+    estimate_count_threshold = getattr(settings, 'PAGINATION_ESTIMATE_COUNT_THRESHOLD', None)
+    count_cache_ttl = None
+
+    def django_paginator_class(self, object_list, per_page):
+        """
+        Builds the Django paginator with the count options of this pagination.
+
+        Args:
+            object_list (QuerySet): The objects to paginate.
+            per_page (int): The page size.
+
+        Returns:
+            EstimatedCountPaginator: The paginator.
+        """
+        count_cache_key = None
+        if self.count_cache_ttl is not None:
+            filters = {name: self.request.query_params.get(name) for name in PRODUCT_FILTER_PARAMS}
+            count_cache_key = f"count:{self.request.path}:{get_filter_key(filters)}"
+        return EstimatedCountPaginator(object_list, per_page, estimate_threshold=self.estimate_count_threshold,
+                                       count_cache_key=count_cache_key, count_cache_ttl=self.count_cache_ttl)
+
+    def get_paginated_response(self, data):
+        """
+        Adds the ``count_is_estimate`` flag to the paginated response.
+
+        Args:
+            data (list): The serialized page.
+
+        Returns:
+            Response: The HTTP response.
+        """
+        response = super().get_paginated_response(data)
+        response.data['count_is_estimate'] = self.page.paginator.count_is_estimate
+        return response
+
+
+class ProductPageNumberPagination(CustomPageNumberPagination):
+    """
+    Pagination of the product list, caching exact counts per filter set; product writes,
+    upserts, subtree deletes and reorganizations invalidate them.
+    """
+    count_cache_ttl = getattr(settings, 'PAGINATION_COUNT_CACHE_TTL', None)
+
+
+class ChangeFeedPagination:
+    """
+    Cursor pagination over several querysets merged by ``(updated_at, id)``.
+
+    The cursor is an opaque encoding of the last returned ``(updated_at, id)`` pair. Clients
+    start from ``updated_since`` (or the beginning of time) and keep the returned cursor as
+    their watermark for the next sync.
+
+    ``updated_at`` is set before a write commits, so a row can become visible after rows with
+    later timestamps were returned. Only rows older than ``visibility_lag`` seconds are
+    returned, which keeps the cursor behind every write still in flight; writes committing
+    later than that after their timestamp would be skipped. Deletes older than
+    ``tombstone_retention`` seconds may have been pruned, so an older watermark restarts the
+    feed from the beginning with ``reset`` set, and clients rebuild their copy from it.
+    """
+    page_size = 100
+    max_page_size = 1000
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    updated_since_query_param = 'updated_since'
+    visibility_lag = getattr(settings, 'CHANGE_FEED_VISIBILITY_LAG', 5)
+    tombstone_retention = TOMBSTONE_RETENTION
+
+    def get_page_size(self, request):
+        """
+        Returns the page size requested by the client, capped at ``max_page_size``.
+
+        Args:
+            request (Request): The HTTP request.
+
+        Returns:
+            int: The page size.
+        """
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def get_watermark(self, request):
+        """
+        Decodes the position to resume from out of ``cursor`` or ``updated_since``.
+
+        Args:
+            request (Request): The HTTP request.
+
+        Returns:
+            tuple: The ``(updated_at, id)`` pair to resume after, or None to start from the beginning.
+
+        Raises:
+            ValidationError: If the cursor or the timestamp is malformed.
+        """
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            try:
+                updated_at, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+                updated_at = parse_datetime(updated_at)
+            except (ValueError, TypeError):
+                raise ValidationError("Invalid cursor.")
+            if updated_at is None:
+                raise ValidationError("Invalid cursor.")
+            return updated_at, pk
+        updated_since = request.query_params.get(self.updated_since_query_param)
+        if updated_since:
+            updated_at = parse_datetime(updated_since)
+            if updated_at is None:
+                raise ValidationError("updated_since must be an ISO 8601 datetime.")
+            return updated_at, None
+        return None
+
+    def encode_cursor(self, updated_at, pk):
+        """
+        Encodes a ``(updated_at, id)`` position as an opaque cursor.
+
+        Args:
+            updated_at (datetime): The timestamp of the position.
+            pk: The primary key of the position, or None for "anything at or after updated_at".
+
+        Returns:
+            str: The cursor.
+        """
+        position = json.dumps([updated_at.isoformat(), str(pk) if pk is not None else None])
+        return base64.urlsafe_b64encode(position.encode()).decode()
+
+    def paginate_querysets(self, querysets, request):
+        """
+        Returns the next page of objects across all querysets, ordered by ``(updated_at, id)``.
+
+        Args:
+            querysets (list): The querysets to merge.
+            request (Request): The HTTP request.
+
+        Returns:
+            list: The objects on this page.
+        """
+        self.request = request
+        page_size = self.get_page_size(request)
+        watermark = self.get_watermark(request)
+        cutoff = get_retention_cutoff(self.tombstone_retention)
+        self.reset = watermark is not None and cutoff is not None and watermark[0] < cutoff
+        if self.reset:
+            watermark = None
+        self.watermark = watermark
+        horizon = timezone.now() - timedelta(seconds=self.visibility_lag)
+        querysets = [queryset.filter(updated_at__lt=horizon) for queryset in querysets]
+        if watermark is not None:
+            updated_at, pk = watermark
+            after = Q(updated_at__gt=updated_at)
+            if pk is not None:
+                after |= Q(updated_at=updated_at, id__gt=pk)
+            querysets = [queryset.filter(after) for queryset in querysets]
+        querysets = [queryset.order_by('updated_at', 'id')[:page_size + 1] for queryset in querysets]
+        merged = heapq.merge(*querysets, key=lambda obj: (obj.updated_at, str(obj.pk)))
+        page = list(islice(merged, page_size + 1))
+        self.has_next = len(page) > page_size
+        self.page = page[:page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        """
+        Wraps the page data with the cursor to resume from.
+
+        Args:
+            data (list): The serialized page.
+
+        Returns:
+            Response: The HTTP response.
+        """
+        if self.page:
+            cursor = self.encode_cursor(self.page[-1].updated_at, self.page[-1].pk)
+        elif self.watermark is not None:
+            cursor = self.encode_cursor(*self.watermark)
+        else:
+            cursor = None
+        next_url = None
+        if self.has_next:
+            url = remove_query_param(self.request.build_absolute_uri(), self.updated_since_query_param)
+            next_url = replace_query_param(url, self.cursor_query_param, cursor)
+        return Response({
+            'next': next_url,
+            'cursor': cursor,
+            'reset': self.reset,
+            'results': data,
+        })
@@ -0,0 +1,409 @@
+from collections import Counter, namedtuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Value, When
+from django.utils import timezone
+
+from metadata_store.autocomplete import autocomplete_index, get_parent_field, get_scope_lookup
+from metadata_store.counters import apply_product_count_deltas, get_hierarchy_chains
+from metadata_store.deletion import PER_PRODUCT_INVALIDATION_LIMIT
+from metadata_store.events import make_event, publish_events
+from metadata_store.models import Department, Category, SubCategory, Product, Tombstone, HIERARCHY_PATHS
+from metadata_store.sharding import get_catalog_db
+from metadata_store.signals import get_product_list_key_formats, invalidate_caches
+from metadata_store.utils import PRODUCT_LIST_CACHE_MODE
+
+# The levels of the hierarchy that can be moved, merged and renamed, by model name.
+REORGANIZE_MODELS = {model._meta.model_name: model for model in (Department, Category, SubCategory)}
+
+# The level under each of them, whose objects a merge moves to the target.
+CHILD_MODELS = {Department: Category, Category: SubCategory, SubCategory: Product}
+
+# A locked row: its name, the id of its parent and the number of products it accounts for.
+Node = namedtuple('Node', ['name', 'parent_id', 'weight'])
+
+
+class ReorganizeError(Exception):
+    """
+    Raised when a reorganization addresses objects that don't exist on the shard it runs on.
+    """
+
+
+class HierarchyConflict(ReorganizeError):
+    """
+    Raised when a reorganization would give two objects under the same parent the same name.
+
+    Attributes:
+        conflicts (list): The conflicting objects, as dicts with the ``id`` and ``name`` of
+            the object and the id of the object it ``conflicts_with``.
+    """
+    def __init__(self, conflicts):
+        super().__init__("Objects would have the same name as another object under the same parent.")
+        self.conflicts = conflicts
+
+
+def get_parent_model(model):
+    return model._meta.get_field(get_parent_field(model)).related_model
+
+
+def lock_nodes(model, pks):
+    """
+    Reads and locks rows, checking they all exist.
+
+    Args:
+        model (Model): The model of the rows.
+        pks (iterable): The primary keys.
+
+    Returns:
+        dict: The primary keys mapped to their `Node`.
+
+    Raises:
+        ReorganizeError: If any of the rows doesn't exist.
+    """
+    pks = set(pks)
+    fields = ['pk', 'name', f'{get_parent_field(model)}_id']
+    if model is not Product:
+        fields.append('product_count')
+    nodes = {
+        pk: Node(name, parent_id, weight[0] if weight else 1)
+        for pk, name, parent_id, *weight in model.objects.select_for_update().filter(pk__in=pks).values_list(*fields)
+    }
+    missing = pks - set(nodes)
+    if missing:
+        raise ReorganizeError(f"Unknown {model._meta.model_name} ids: {', '.join(sorted(map(str, missing)))}.")
+    return nodes
+
+
+def get_names(model, pks):
+    """
+    Returns the hierarchy names of nodes with one query, see `events.get_hierarchy_names`.
+
+    Args:
+        model (Model): The model of the nodes.
+        pks (iterable): The primary keys.
+
+    Returns:
+        dict: The primary keys mapped to the names of their levels.
+    """
+    parts = HIERARCHY_PATHS[model].split('__')
+    levels = [model._meta.model_name] + parts
+    lookups = ['name'] + ['__'.join(parts[:depth + 1]) + '__name' for depth in range(len(parts))]
+    return {pk: dict(zip(levels, names)) for pk, *names in
+            model.objects.filter(pk__in=set(pks)).values_list('pk', *lookups)}
+
+
+def get_product_key_formats(model, pks):
+    """
+    Returns the key formats of the cached products under nodes, and of their counts.
+
+    Args:
+        model (Model): The model of the nodes.
+        pks (iterable): The primary keys.
+
+    Returns:
+        list: The cache key formats to invalidate, empty if there are no products under the nodes.
+    """
+    lookup = get_scope_lookup(Product, model._meta.model_name)
+    product_ids = list(Product.objects.filter(**{f'{lookup}__in': set(pks)}).values_list(
+        'pk', flat=True)[:PER_PRODUCT_INVALIDATION_LIMIT + 1])
+    if not product_ids:
+        return []
+    if len(product_ids) > PER_PRODUCT_INVALIDATION_LIMIT:
+        return ['product_retrieve:*', 'count:*']
+    return [f'product_retrieve:{pk}:*' for pk in product_ids] + ['count:*']
+
+
+def get_list_key_formats(model, pks):
+    """
+    Returns the key formats of the cached product lists the products under nodes appear in,
+    which are filtered by the names of their hierarchy.
+
+    Called before and after a change, so the lists of both the old and the new names are cleared.
+
+    Args:
+        model (Model): The model of the nodes.
+        pks (iterable): The primary keys.
+
+    Returns:
+        list: The cache key formats to invalidate.
+    """
+    if PRODUCT_LIST_CACHE_MODE != 'objects':
+        return ['product_list:*']
+    lookup = get_scope_lookup(SubCategory, model._meta.model_name)
+    subcategory_ids = list(SubCategory.objects.filter(**{f'{lookup}__in': set(pks)}, product_count__gt=0).values_list(
+        'pk', flat=True)[:PER_PRODUCT_INVALIDATION_LIMIT + 1])
+    if len(subcategory_ids) > PER_PRODUCT_INVALIDATION_LIMIT:
+        return ['product_list_ids:*']
+    return get_product_list_key_formats(subcategory_ids)
+
+
+def get_not_found_key_formats(pks):
+    """
+    Returns the key formats of the cached failed lookups whose path mentions moved nodes.
+    """
+    if len(pks) > PER_PRODUCT_INVALIDATION_LIMIT:
+        return ['not_found:*']
+    return [f'not_found:*:{pk}:*' for pk in pks]
+
+
+def index_nodes(model, nodes):
+    """
+    Updates the names and parents of nodes in the autocomplete index once the transaction commits.
+
+    Args:
+        model (Model): The model of the nodes.
+        nodes (dict): The primary keys mapped to their current `Node`.
+    """
+    parent_column = f'{get_parent_field(model)}_id'
+    instances = [model(pk=pk, name=node.name, **{parent_column: node.parent_id}) for pk, node in nodes.items()]
+    transaction.on_commit(lambda: [autocomplete_index.upsert(instance) for instance in instances],
+                          using=get_catalog_db())
+
+
+def find_sibling_conflicts(model, keys):
+    """
+    Finds the objects that would share a name with another object under the same parent.
+
+    Args:
+        model (Model): The model of the objects.
+        keys (dict): The primary keys of the changed objects mapped to their new
+            ``(parent_id, name)``; all other objects of the model keep theirs.
+
+    Returns:
+        list: The conflicts, see `HierarchyConflict`.
+    """
+    conflicts = []
+    claimed = {}
+    for pk, key in keys.items():
+        if key in claimed:
+            conflicts.append({'id': pk, 'name': key[1], 'conflicts_with': claimed[key]})
+        else:
+            claimed[key] = pk
+    parent_column = f'{get_parent_field(model)}_id'
+    siblings = model.objects.filter(**{
+        f'{parent_column}__in': {parent_id for parent_id, name in claimed},
+        'name__in': {name for parent_id, name in claimed},
+    }).exclude(pk__in=list(keys)).values_list('pk', parent_column, 'name')
+    for pk, parent_id, name in siblings:
+        if (parent_id, name) in claimed:
+            conflicts.append({'id': claimed[(parent_id, name)], 'name': name, 'conflicts_with': pk})
+    return conflicts
+
+
+def reparent(model, nodes, parent, updated_at):
+    """
+    Moves locked rows under another parent with one UPDATE, moving the product counts they
+    account for from their old ancestors to the new ones and the products under them to the
+    new parent's location.
+
+    Args:
+        model (Model): The model of the rows, a hierarchy model or Product.
+        nodes (dict): The primary keys mapped to their `Node`; none is under ``parent`` yet.
+        parent (Model): The new parent.
+        updated_at (datetime): The new ``updated_at`` of the changed rows.
+
+    Raises:
+        HierarchyConflict: If a row has the name of another row under the new parent.
+    """
+    conflicts = find_sibling_conflicts(model, {pk: (parent.pk, node.name) for pk, node in nodes.items()})
+    if conflicts:
+        raise HierarchyConflict(conflicts)
+
+    new_chain = get_hierarchy_chains(type(parent), [parent.pk])[parent.pk]
+    location_id = new_chain[-1][1]
+    deltas = Counter()
+    relocated = []
+    for pk, chain in get_hierarchy_chains(model, nodes).items():
+        for node in chain[1:]:
+            deltas[node] -= nodes[pk].weight
+        for node in new_chain:
+            deltas[node] += nodes[pk].weight
+        if chain[-1][1] != location_id:
+            relocated.append(pk)
+
+    fields = {f'{get_parent_field(model)}_id': parent.pk, 'updated_at': updated_at}
+    if model is Product:
+        fields['location_id'] = location_id
+    model.objects.filter(pk__in=list(nodes)).update(**fields)
+    if relocated and model is not Product:
+        # On Postgres the products change partitions, which the UPDATE does by moving the rows.
+        Product.objects.filter(**{f'{get_scope_lookup(Product, model._meta.model_name)}__in': relocated}).update(
+            location_id=location_id, updated_at=updated_at)
+    apply_product_count_deltas(deltas)
+
+
+def move_nodes(model, pks, parent_id):
+    """
+    Moves hierarchy nodes and their subtrees under another parent with set-based UPDATEs,
+    in one transaction on the current shard.
+
+    The nodes and their new parent are validated with two queries, whatever their number,
+    and the nodes, their new parent and the product counts of the old and new ancestors are
+    updated with a handful of statements. Products moved to another location get its id.
+    The affected product caches are invalidated once the transaction commits, and one
+    ``update`` event marked ``subtree`` is published per moved node.
+
+    Args:
+        model (Model): Department, Category or SubCategory.
+        pks (iterable): The primary keys of the nodes to move.
+        parent_id: The primary key of the new parent.
+
+    Returns:
+        dict: The number of moved nodes; nodes already under the parent are left as they are.
+
+    Raises:
+        ReorganizeError: If the parent or a node doesn't exist on the current shard.
+        HierarchyConflict: If a node has the name of another node under the new parent.
+    """
+    db = get_catalog_db()
+    model_name = model._meta.model_name
+    parent_model = get_parent_model(model)
+    try:
+        with transaction.atomic(using=db):
+            parent = parent_model.objects.select_for_update().filter(pk=parent_id).first()
+            if parent is None:
+                raise ReorganizeError(f"Unknown {parent_model._meta.model_name} id: {parent_id}.")
+            nodes = {pk: node for pk, node in lock_nodes(model, pks).items() if node.parent_id != parent.pk}
+            if not nodes:
+                return {'moved': 0}
+            key_formats = get_product_key_formats(model, nodes)
+            if key_formats:
+                key_formats += get_list_key_formats(model, nodes)
+            reparent(model, nodes, parent, timezone.now())
+            if key_formats:
+                key_formats += get_list_key_formats(model, nodes)
+            invalidate_caches(list(dict.fromkeys(key_formats + get_not_found_key_formats(list(nodes)))))
+            index_nodes(model, {pk: node._replace(parent_id=parent.pk) for pk, node in nodes.items()})
+            names = get_names(model, nodes)
+            publish_events([make_event('update', model_name, pk, node.name, names[pk], subtree=True)
+                            for pk, node in nodes.items()], using=db)
+    except IntegrityError as exc:
+        # A sibling was created or renamed concurrently after the conflict check.
+        raise HierarchyConflict([]) from exc
+    return {'moved': len(nodes)}
+
+
+def merge_nodes(model, source_ids, target_id):
+    """
+    Merges hierarchy nodes into another node of the same level: the children of the sources
+    are moved under the target with one UPDATE, then the emptied sources are deleted, in one
+    transaction on the current shard.
+
+    Product counts, locations, caches and events are maintained as by `move_nodes`; a
+    tombstone and a ``delete`` event with ``merged_into`` are recorded for each source.
+
+    Args:
+        model (Model): Department, Category or SubCategory.
+        source_ids (iterable): The primary keys of the nodes to merge.
+        target_id: The primary key of the node to merge them into.
+
+    Returns:
+        dict: The number of merged nodes and of children moved to the target.
+
+    Raises:
+        ReorganizeError: If the target or a source doesn't exist on the current shard, or
+            the target is among the sources.
+        HierarchyConflict: If a child of a source has the name of a child of the target or
+            of another source.
+    """
+    db = get_catalog_db()
+    model_name = model._meta.model_name
+    child_model = CHILD_MODELS[model]
+    source_ids = set(source_ids)
+    if target_id in source_ids:
+        raise ReorganizeError(f"The target {model_name} can't be merged into itself.")
+    try:
+        with transaction.atomic(using=db):
+            target = model.objects.select_for_update().filter(pk=target_id).first()
+            if target is None:
+                raise ReorganizeError(f"Unknown {model_name} id: {target_id}.")
+            sources = lock_nodes(model, source_ids)
+            source_names = get_names(model, sources)
+            children = lock_nodes(child_model, child_model.objects.filter(
+                **{f'{get_parent_field(child_model)}__in': list(sources)}).values_list('pk', flat=True))
+            updated_at = timezone.now()
+
+            key_formats = get_product_key_formats(model, sources)
+            if key_formats:
+                key_formats += get_list_key_formats(model, [*sources, target.pk])
+            if children:
+                reparent(child_model, children, target, updated_at)
+            if key_formats:
+                key_formats += get_list_key_formats(model, [target.pk])
+            if child_model is not Product:
+                key_formats += get_not_found_key_formats(list(children))
+                index_nodes(child_model, {pk: node._replace(parent_id=target.pk) for pk, node in children.items()})
+
+            Tombstone.objects.bulk_create([Tombstone(model_name=model_name, object_id=pk) for pk in sources])
+            deleted = model.objects.filter(pk__in=list(sources))
+            deleted._raw_delete(deleted.db)
+            model.objects.filter(pk=target.pk).update(updated_at=updated_at)
+
+            invalidate_caches(list(dict.fromkeys(key_formats)))
+            transaction.on_commit(lambda: [autocomplete_index.remove(pk) for pk in sources], using=db)
+            events = [make_event('delete', model_name, pk, node.name, source_names[pk], merged_into=str(target.pk))
+                      for pk, node in sources.items()]
+            events.append(make_event('update', model_name, target.pk, target.name,
+                                     get_names(model, [target.pk])[target.pk], subtree=True))
+            publish_events(events, using=db)
+    except IntegrityError as exc:
+        raise HierarchyConflict([]) from exc
+    return {'merged': len(sources), 'moved': len(children)}
+
+
+def rename_nodes(model, names):
+    """
+    Renames hierarchy nodes with one UPDATE, in one transaction on the current shard.
+
+    Names may be exchanged between nodes of the same parent: nodes holding a name another
+    node takes are given a temporary name first, as the unique constraints are checked
+    row by row. The caches of the products under the nodes are invalidated
+    once the transaction commits, and one ``update`` event marked ``subtree`` is
+    published per renamed node.
+
+    Args:
+        model (Model): Department, Category or SubCategory.
+        names (dict): The primary keys of the nodes mapped to their new names.
+
+    Returns:
+        dict: The number of renamed nodes; nodes already having their new name are left as they are.
+
+    Raises:
+        ReorganizeError: If a node doesn't exist on the current shard.
+        HierarchyConflict: If a node would have the name of another node under the same parent.
+    """
+    db = get_catalog_db()
+    model_name = model._meta.model_name
+    try:
+        with transaction.atomic(using=db):
+            nodes = {pk: node._replace(name=names[pk]) for pk, node in lock_nodes(model, names).items()
+                     if node.name != names[pk]}
+            if not nodes:
+                return {'renamed': 0}
+            conflicts = find_sibling_conflicts(model, {pk: (node.parent_id, node.name) for pk, node in nodes.items()})
+            if conflicts:
+                raise HierarchyConflict(conflicts)
+
+            key_formats = get_product_key_formats(model, nodes)
+            if key_formats:
+                key_formats += get_list_key_formats(model, nodes)
+            queryset = model.objects.filter(pk__in=list(nodes))
+            new_keys = {(node.parent_id, node.name) for node in nodes.values()}
+            holders = [pk for pk, parent_id, name in queryset.values_list('pk', f'{get_parent_field(model)}_id', 'name')
+                       if (parent_id, name) in new_keys]
+            if holders:
+                model.objects.filter(pk__in=holders).update(
+                    name=Case(*[When(pk=pk, then=Value(str(pk))) for pk in holders]))
+            queryset.update(name=Case(*[When(pk=pk, then=Value(node.name)) for pk, node in nodes.items()]),
+                            updated_at=timezone.now())
+            if key_formats:
+                key_formats += get_list_key_formats(model, nodes)
+            invalidate_caches(list(dict.fromkeys(key_formats)))
+
+            index_nodes(model, nodes)
+            hierarchy_names = get_names(model, nodes)
+            publish_events([make_event('update', model_name, pk, node.name, hierarchy_names[pk], subtree=True)
+                            for pk, node in nodes.items()], using=db)
+    except IntegrityError as exc:
+        raise HierarchyConflict([]) from exc
+    return {'renamed': len(nodes)}
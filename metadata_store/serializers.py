@@ -1,8 +1,138 @@
+from django.core.exceptions import FieldDoesNotExist
 from rest_framework import serializers
+from .memory_profiling import memory_phase
 from .models import Location, Department, Category, SubCategory, Product
+from .utils import build_path_tree
 
 
-class LocationSerializer(serializers.ModelSerializer):
+class ProfiledListSerializer(serializers.ListSerializer):
+    """
+    List serializer measuring the serialization of the whole list as one memory
+    profiling phase.
+    """
+    @property
+    def data(self):
+        with memory_phase('serialization'):
+            return super().data
+
+
+class DynamicFieldsMixin:
+    """
+    Serializer mixin adding sparse fieldsets and selective expansion of relations.
+
+    Accepts two optional keyword arguments, each a list of dotted paths:
+        fields: The fields to render, e.g. ``['name', 'subcategory.name']``. Selecting into a
+            relation expands it implicitly.
+        expand: The relations to render as nested objects instead of primary keys,
+            e.g. ``['subcategory.category']``.
+
+    Relations that can be expanded are declared in ``Meta.expandable_fields``.
+    """
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        expand = kwargs.pop('expand', None)
+        super().__init__(*args, **kwargs)
+        self._fields_tree = build_path_tree(fields) if fields else None
+        self._expand_tree = build_path_tree(expand)
+
+    @property
+    def data(self):
+        with memory_phase('serialization'):
+            return super().data
+
+    def get_fields(self):
+        """
+        Returns the serializer fields, expanded and trimmed according to ``fields`` and ``expand``.
+
+        Returns:
+            dict: The fields to serialize.
+
+        Raises:
+            serializers.ValidationError: If an unknown field or a non-expandable relation is requested.
+        """
+        fields = super().get_fields()
+        expandable_fields = getattr(self.Meta, 'expandable_fields', {})
+
+        expansions = dict(self._expand_tree)
+        for name, subtree in (self._fields_tree or {}).items():
+            if subtree:
+                expansions.setdefault(name, {})
+
+        for name in expansions:
+            if name not in fields:
+                raise serializers.ValidationError(f"Unknown field '{name}'.")
+            child_fields = (self._fields_tree or {}).get(name) or None
+            child_expand = self._expand_tree.get(name, {})
+            field = fields[name]
+            if isinstance(field, DynamicFieldsMixin):
+                if child_fields or child_expand:
+                    fields[name] = type(field)(*field._args, **field._kwargs,
+                                               fields=child_fields, expand=child_expand)
+            elif name in expandable_fields:
+                fields[name] = expandable_fields[name](read_only=True, fields=child_fields, expand=child_expand)
+            else:
+                raise serializers.ValidationError(f"Field '{name}' cannot be expanded.")
+
+        if self._fields_tree is not None:
+            unknown = set(self._fields_tree) - set(fields)
+            if unknown:
+                raise serializers.ValidationError(f"Unknown fields: {', '.join(sorted(unknown))}.")
+            fields = {name: field for name, field in fields.items() if name in self._fields_tree}
+        return fields
+
+    def get_queryset_plan(self, prefix=''):
+        """
+        Works out the joins and columns needed to render the selected fields.
+
+        Args:
+            prefix (str): The lookup prefix of this serializer relative to the root model.
+
+        Returns:
+            tuple: The ``select_related`` paths and the ``only`` paths, the latter being None
+            when a field isn't backed by a concrete model column.
+        """
+        model = self.Meta.model
+        related, only = [], [f"{prefix}id"]
+        for field in self.fields.values():
+            if field.write_only or field.source == '*':
+                continue
+            try:
+                model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                only = None
+                continue
+            path = f"{prefix}{field.source}"
+            if isinstance(field, DynamicFieldsMixin):
+                related.append(path)
+                child_related, child_only = field.get_queryset_plan(f"{path}__")
+                related.extend(child_related)
+                if only is not None and child_only is not None:
+                    only.extend(child_only)
+                else:
+                    only = None
+            elif only is not None:
+                only.append(path)
+        return related, only
+
+    def optimize_queryset(self, queryset):
+        """
+        Restricts the queryset to the joins and columns needed to render the selected fields.
+
+        Args:
+            queryset (QuerySet): The queryset to optimize.
+
+        Returns:
+            QuerySet: The optimized queryset.
+        """
+        related, only = self.get_queryset_plan()
+        if related:
+            queryset = queryset.select_related(*related)
+        if only is not None:
+            queryset = queryset.only(*only)
+        return queryset
+
+
+class LocationSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for the Location model.
 
@@ -13,9 +143,10 @@ class LocationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Location
         fields = "__all__"
+        list_serializer_class = ProfiledListSerializer
 
 
-class DepartmentSerializer(serializers.ModelSerializer):
+class DepartmentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for the Department model. Automatically assigns the location
     based on the context.
@@ -23,10 +154,13 @@ class DepartmentSerializer(serializers.ModelSerializer):
     Meta:
         model (Department): The model to serialize.
         fields (str): All fields of the model are included.
+        expandable_fields (dict): Relations that can be expanded through ``expand``.
     """
     class Meta:
         model = Department
         fields = "__all__"
+        list_serializer_class = ProfiledListSerializer
+        expandable_fields = {'location': LocationSerializer}
 
     def to_internal_value(self, data):
         """
@@ -58,7 +192,7 @@ class DepartmentDetailSerializer(DepartmentSerializer):
         fields = "__all__"
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for the Category model. Automatically assigns the department
     based on the context.
@@ -66,10 +200,13 @@ class CategorySerializer(serializers.ModelSerializer):
     Meta:
         model (Category): The model to serialize.
         fields (str): All fields of the model are included.
+        expandable_fields (dict): Relations that can be expanded through ``expand``.
     """
     class Meta:
         model = Category
         fields = "__all__"
+        list_serializer_class = ProfiledListSerializer
+        expandable_fields = {'department': DepartmentSerializer}
 
     def to_internal_value(self, data):
         """
@@ -124,7 +261,7 @@ class CategoryDetailSerializer(CategorySerializer):
         fields = "__all__"
 
 
-class SubCategorySerializer(serializers.ModelSerializer):
+class SubCategorySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for the SubCategory model. Automatically assigns the category
     based on the context.
@@ -132,10 +269,13 @@ class SubCategorySerializer(serializers.ModelSerializer):
     Meta:
         model (SubCategory): The model to serialize.
         fields (str): All fields of the model are included.
+        expandable_fields (dict): Relations that can be expanded through ``expand``.
     """
     class Meta:
         model = SubCategory
         fields = "__all__"
+        list_serializer_class = ProfiledListSerializer
+        expandable_fields = {'category': CategorySerializer}
 
     def to_internal_value(self, data):
         """
@@ -197,17 +337,21 @@ class SubCategoryDetailSerializer(SubCategorySerializer):
         fields = "__all__"
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for the Product model.
 
     Meta:
         model (Product): The model to serialize.
-        fields (str): All fields of the model are included.
+        exclude (list): All fields of the model but ``location``, a copy of the subcategory's
+            location kept for partitioning.
+        expandable_fields (dict): Relations that can be expanded through ``expand``.
     """
     class Meta:
         model = Product
-        fields = "__all__"
+        exclude = ['location']
+        list_serializer_class = ProfiledListSerializer
+        expandable_fields = {'subcategory': SubCategorySerializer}
 
 
 class ProductDetailSerializer(ProductSerializer):
@@ -216,9 +360,110 @@ class ProductDetailSerializer(ProductSerializer):
 
     Meta:
         model (Product): The model to serialize.
-        fields (str): All fields of the model are included.
+        exclude (list): All fields of the model but ``location``.
     """
     subcategory = SubCategoryDetailSerializer()
 
     class Meta(ProductSerializer.Meta):
-        fields = "__all__"
+        exclude = ['location']
+
+
+class ProductPathUpsertSerializer(serializers.Serializer):
+    """
+    Serializer validating a batch of product name paths to upsert.
+
+    Fields:
+        paths (ListField): Name paths of the form ``[location, department, category, subcategory, product]``.
+    """
+    paths = serializers.ListField(
+        child=serializers.ListField(child=serializers.CharField(max_length=255), min_length=5, max_length=5),
+        allow_empty=False,
+        max_length=1000,
+    )
+
+
+class BatchRequestSerializer(serializers.Serializer):
+    """
+    Serializer validating a batch of GET requests.
+
+    Fields:
+        requests (ListField): URLs relative to the API root (``products/?category_name=Bakery``)
+            or absolute paths under it (``/api/v1/locations/``).
+    """
+    requests = serializers.ListField(
+        child=serializers.CharField(max_length=2048),
+        allow_empty=False,
+        max_length=20,
+    )
+
+
+class HierarchyMoveSerializer(serializers.Serializer):
+    """
+    Serializer validating a move of hierarchy nodes under another parent.
+
+    Fields:
+        type (ChoiceField): The level of the nodes.
+        ids (ListField): The ids of the nodes to move.
+        parent (UUIDField): The id of the new parent, a node of the level above.
+    """
+    type = serializers.ChoiceField(choices=['department', 'category', 'subcategory'])
+    ids = serializers.ListField(child=serializers.UUIDField(), allow_empty=False, max_length=1000)
+    parent = serializers.UUIDField()
+
+
+class HierarchyMergeSerializer(serializers.Serializer):
+    """
+    Serializer validating a merge of hierarchy nodes into another node of the same level.
+
+    Fields:
+        type (ChoiceField): The level of the nodes.
+        sources (ListField): The ids of the nodes to merge.
+        target (UUIDField): The id of the node to merge them into.
+    """
+    type = serializers.ChoiceField(choices=['department', 'category', 'subcategory'])
+    sources = serializers.ListField(child=serializers.UUIDField(), allow_empty=False, max_length=100)
+    target = serializers.UUIDField()
+
+
+class HierarchyRenameItemSerializer(serializers.Serializer):
+    """
+    Serializer validating the new name of a hierarchy node.
+
+    Fields:
+        id (UUIDField): The id of the node.
+        name (CharField): Its new name.
+    """
+    id = serializers.UUIDField()
+    name = serializers.CharField(max_length=255)
+
+
+class HierarchyRenameSerializer(serializers.Serializer):
+    """
+    Serializer validating a rename of hierarchy nodes.
+
+    Fields:
+        type (ChoiceField): The level of the nodes.
+        names (HierarchyRenameItemSerializer): The new name of each node.
+    """
+    type = serializers.ChoiceField(choices=['department', 'category', 'subcategory'])
+    names = HierarchyRenameItemSerializer(many=True, allow_empty=False, max_length=1000)
+
+    def validate_names(self, value):
+        """
+        Maps the node ids to their new names, checking no node is renamed twice.
+
+        Args:
+            value (list): The validated renames.
+
+        Returns:
+            dict: The node ids mapped to their new names.
+
+        Raises:
+            serializers.ValidationError: If a node is renamed more than once.
+        """
+        names = {}
+        for item in value:
+            if item['id'] in names:
+                raise serializers.ValidationError(f"{item['id']} is renamed more than once.")
+            names[item['id']] = item['name']
+        return names
@@ -0,0 +1,188 @@
+import threading
+import uuid
+
+from django.db import IntegrityError, router, transaction
+from django.db.models import Count
+
+from metadata_store.ids import uuid7
+from metadata_store.models import Location, LocationShard
+from metadata_store.sharding import CATALOG_SHARDS
+
+
+class ShardDirectory:
+    """
+    Maps locations to the shard holding their subtree, from the ``LocationShard`` table.
+
+    Entries are cached in the process; a location missing from the cache is looked up in
+    the table, so locations created by other processes are found. With a single shard no
+    lookups are made at all.
+    """
+    def __init__(self, shards):
+        self.shards = shards
+        self.by_id = {}
+        self.by_name = {}
+        self.lock = threading.Lock()
+
+    def remember(self, location_id, location_name, shard):
+        """
+        Caches the shard of a location, dropping the names it had before.
+        """
+        location_id = str(location_id)
+        with self.lock:
+            self.by_name = {name: entry for name, entry in self.by_name.items() if entry[0] != location_id}
+            self.by_id[location_id] = shard
+            self.by_name[location_name] = (location_id, shard)
+
+    def forget(self, location_id):
+        """
+        Drops a location from the cache.
+        """
+        location_id = str(location_id)
+        with self.lock:
+            self.by_name = {name: entry for name, entry in self.by_name.items() if entry[0] != location_id}
+            self.by_id.pop(location_id, None)
+
+    def get_shard(self, location_id):
+        """
+        Returns the shard of a location.
+
+        Args:
+            location_id: The id of the location.
+
+        Returns:
+            str: The database alias of the shard, or None for unknown locations.
+        """
+        if len(self.shards) == 1:
+            return self.shards[0]
+        shard = self.by_id.get(str(location_id))
+        if shard is None:
+            try:
+                entry = LocationShard.objects.get(location_id=uuid.UUID(str(location_id)))
+            except (ValueError, LocationShard.DoesNotExist):
+                return None
+            self.remember(entry.location_id, entry.location_name, entry.shard)
+            shard = entry.shard
+        return shard
+
+    def get_shard_by_name(self, location_name):
+        """
+        Returns the shard of a location by name.
+
+        Args:
+            location_name (str): The name of the location.
+
+        Returns:
+            str: The database alias of the shard, or None for unknown locations.
+        """
+        if len(self.shards) == 1:
+            return self.shards[0]
+        entry = self.by_name.get(location_name)
+        if entry is None:
+            location = LocationShard.objects.filter(location_name=location_name).first()
+            if location is None:
+                return None
+            self.remember(location.location_id, location.location_name, location.shard)
+            return location.shard
+        return entry[1]
+
+    def load(self):
+        """
+        Caches the shard of every known location, with one query.
+        """
+        if len(self.shards) == 1:
+            return
+        entries = LocationShard.objects.values_list('location_id', 'location_name', 'shard')
+        with self.lock:
+            for location_id, location_name, shard in entries:
+                self.by_id[str(location_id)] = shard
+                self.by_name[location_name] = (str(location_id), shard)
+
+    def choose_shard(self):
+        """
+        Picks the shard for a new location: the one holding the fewest locations.
+
+        Returns:
+            str: The database alias of the shard.
+        """
+        if len(self.shards) == 1:
+            return self.shards[0]
+        counts = dict(LocationShard.objects.values_list('shard').annotate(count=Count('pk')))
+        return min(self.shards, key=lambda alias: counts.get(alias, 0))
+
+    def assign_shard(self, location_name):
+        """
+        Returns the shard of a location by name, assigning the least loaded shard to a new
+        location.
+
+        The assignment is reserved in the ``LocationShard`` table under a placeholder id
+        before the location is created, so concurrent requests creating the same location
+        agree on its shard: the unique name lets only one reservation in, and the others
+        read it back. `register` replaces the placeholder once the location is saved, and
+        `release` drops it if the location is never created.
+
+        Args:
+            location_name (str): The name of the location.
+
+        Returns:
+            str: The database alias of the shard.
+        """
+        shard = self.get_shard_by_name(location_name)
+        if shard is not None:
+            return shard
+        try:
+            with transaction.atomic(using=router.db_for_write(LocationShard)):
+                LocationShard.objects.create(location_id=uuid7(), location_name=location_name,
+                                             shard=self.choose_shard())
+        except IntegrityError:
+            pass
+        entry = LocationShard.objects.get(location_name=location_name)
+        self.remember(entry.location_id, entry.location_name, entry.shard)
+        return entry.shard
+
+    def release(self, location_name):
+        """
+        Drops the reservation of a location that was not created, so its name can be used again.
+
+        Reservations are made outside the transaction creating the location, see `assign_shard`,
+        and outlive it when it rolls back. The entry is kept when its shard holds the location.
+
+        Args:
+            location_name (str): The name of the location.
+        """
+        if len(self.shards) == 1:
+            return
+        entry = LocationShard.objects.filter(location_name=location_name).first()
+        if entry is None or Location.objects.using(entry.shard).filter(name=location_name).exists():
+            return
+        LocationShard.objects.filter(location_id=entry.location_id).delete()
+        self.forget(entry.location_id)
+
+    def register(self, location):
+        """
+        Records the shard a location was saved to, keeping its name up to date.
+
+        Location names are unique, so an entry holding the same name under another id is
+        left over from a location deleted without its signals and is replaced.
+
+        Args:
+            location (Location): The saved location.
+        """
+        shard = location._state.db or self.shards[0]
+        LocationShard.objects.filter(location_name=location.name).exclude(location_id=location.pk).delete()
+        LocationShard.objects.update_or_create(
+            location_id=location.pk, defaults={'location_name': location.name, 'shard': shard}
+        )
+        self.remember(location.pk, location.name, shard)
+
+    def unregister(self, location_id):
+        """
+        Forgets a deleted location.
+
+        Args:
+            location_id: The id of the location.
+        """
+        LocationShard.objects.filter(location_id=location_id).delete()
+        self.forget(location_id)
+
+
+shard_directory = ShardDirectory(CATALOG_SHARDS)
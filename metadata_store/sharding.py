@@ -0,0 +1,166 @@
+import heapq
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from itertools import islice
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+CATALOG_SHARDS = getattr(settings, 'CATALOG_SHARDS', [DEFAULT_DB_ALIAS])
+
+# Catalog models stored on the shard of the location they hang off; every other model,
+# the shard directory included, lives on the default database.
+SHARDED_MODELS = {'location', 'department', 'category', 'subcategory', 'product', 'tombstone'}
+
+current_shard = ContextVar('current_shard', default=None)
+
+
+def is_sharded(model):
+    """
+    Checks whether a model's rows are spread across the catalog shards.
+
+    Args:
+        model (Model): The model class.
+
+    Returns:
+        bool: Whether the model is sharded.
+    """
+    return model._meta.app_label == 'metadata_store' and model._meta.model_name in SHARDED_MODELS
+
+
+def get_catalog_db():
+    """
+    Returns the database alias catalog queries go to in the current context.
+
+    Returns:
+        str: The shard selected with `use_shard`, or the first shard.
+    """
+    return current_shard.get() or CATALOG_SHARDS[0]
+
+
+@contextmanager
+def use_shard(alias):
+    """
+    Routes the catalog queries run inside the block to a shard.
+
+    Args:
+        alias (str): The database alias of the shard, or None to leave queries unrouted.
+    """
+    token = current_shard.set(alias)
+    try:
+        yield alias
+    finally:
+        current_shard.reset(token)
+
+
+def locate(model, pk):
+    """
+    Finds the shard holding a catalog object, querying the shards in turn.
+
+    Args:
+        model (Model): The model of the object.
+        pk: The primary key of the object.
+
+    Returns:
+        str: The database alias of the shard, or None if no shard holds the object.
+    """
+    if len(CATALOG_SHARDS) == 1:
+        return CATALOG_SHARDS[0]
+    try:
+        pk = uuid.UUID(str(pk))
+    except ValueError:
+        return None
+    for alias in CATALOG_SHARDS:
+        if model.objects.using(alias).filter(pk=pk).exists():
+            return alias
+    return None
+
+
+class ShardedQuerySet:
+    """
+    Read-only view of one queryset run on several shards and merged by its ordering.
+
+    Supports what pagination needs, ``count()`` and slicing: a slice ``[start:stop]``
+    fetches the first ``stop`` rows of every shard and merges them, so deep pages get
+    more expensive. The ordering fields must all sort in the same direction; the primary
+    key is added as a tie-breaker.
+    """
+    ordered = True
+
+    def __init__(self, queryset, shards):
+        ordering = list(queryset.query.order_by) or ['pk']
+        descending = {field.startswith('-') for field in ordering}
+        if len(descending) > 1:
+            raise ValueError("ShardedQuerySet needs every ordering field to sort in the same direction.")
+        self.reverse = descending.pop()
+        self.fields = [field.lstrip('-') for field in ordering] + ['pk']
+        queryset = queryset.order_by(*ordering, '-pk' if self.reverse else 'pk')
+        field_names, defer = queryset.query.deferred_loading
+        if field_names and not defer:
+            queryset = queryset.only(*field_names, *self.fields[:-1])
+        self.model = queryset.model
+        self.querysets = [queryset.using(alias) for alias in shards]
+
+    def key(self, obj):
+        """
+        Returns the merge key of a row: its ordering fields and primary key.
+        """
+        return tuple(getattr(obj, field) for field in self.fields)
+
+    def count(self):
+        """
+        Returns the total number of rows across the shards.
+
+        Returns:
+            int: The count.
+        """
+        return sum(queryset.count() for queryset in self.querysets)
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return heapq.merge(*self.querysets, key=self.key, reverse=self.reverse)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        querysets = self.querysets if stop is None else [queryset[:stop] for queryset in self.querysets]
+        merged = heapq.merge(*querysets, key=self.key, reverse=self.reverse)
+        return list(islice(merged, start, stop))
+
+
+class ShardRouter:
+    """
+    Database router placing each location's subtree on one of ``CATALOG_SHARDS``.
+
+    Catalog queries go to the shard of the instance they concern, else to the shard
+    selected with `use_shard`, else to the first shard. Other models use the default
+    database. Catalog tables are created on every shard, the rest only on the default
+    database.
+    """
+    def db_for_read(self, model, **hints):
+        if not is_sharded(model):
+            return None
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return get_catalog_db()
+
+    db_for_write = db_for_read
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if is_sharded(type(obj1)) and is_sharded(type(obj2)):
+            return obj1._state.db == obj2._state.db
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == DEFAULT_DB_ALIAS:
+            if DEFAULT_DB_ALIAS not in CATALOG_SHARDS and app_label == 'metadata_store':
+                return model_name is not None and model_name not in SHARDED_MODELS
+            return None
+        if db in CATALOG_SHARDS:
+            return app_label == 'metadata_store' and model_name in SHARDED_MODELS
+        return None
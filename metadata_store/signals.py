@@ -1,20 +1,108 @@
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_init, post_save, post_delete
 from django.dispatch import receiver
-from django.core.cache import cache
+from django.db import transaction
 
-from metadata_store.models import Product
+from metadata_store.autocomplete import autocomplete_index, get_parent_field
+from metadata_store.bloom import product_id_filter
+from metadata_store.counters import adjust_product_counts, get_hierarchy_chains, get_product_lookup
+from metadata_store.events import get_hierarchy_names, make_event, publish_events
+from metadata_store.models import Location, Department, Category, SubCategory, Product, Tombstone
+from metadata_store.invalidation import invalidation_queue
+from metadata_store.partitioning import create_partition, drop_partition_or_defer
+from metadata_store.shard_directory import shard_directory
+from metadata_store.sharding import get_catalog_db, use_shard
+from metadata_store.utils import PRODUCT_LIST_CACHE_MODE, get_product_filter_keys
+from metadata_store.write_through import PRODUCT_CACHE_WRITE_THROUGH, product_cache_refresher
 
 
 def invalidate_caches(keys_format_list):
     """
-    Invalidates cache entries matching the provided key formats.
+    Invalidates cache entries matching the provided key formats once the current
+    transaction commits; nothing is invalidated if it rolls back. The deletes are
+    applied by the background invalidation queue.
 
     Args:
         keys_format_list (list): List of cache key formats to invalidate.
     """
-    for key_format in keys_format_list:
-        for key in cache.keys(key_format):
-            cache.delete(key)
+    transaction.on_commit(lambda: invalidation_queue.enqueue(keys_format_list), using=get_catalog_db())
+
+
+def get_product_list_key_formats(subcategory_ids):
+    """
+    Returns the key formats of the cached product id lists products of the given
+    subcategories can appear in.
+
+    Args:
+        subcategory_ids (iterable): The products' subcategory ids.
+
+    Returns:
+        list: The cache key formats to invalidate.
+    """
+    subcategory_ids = set(subcategory_ids)
+    if not subcategory_ids:
+        return []
+    hierarchy_names = SubCategory.objects.filter(id__in=subcategory_ids).values_list(
+        'category__department__location__name', 'category__department__name', 'category__name', 'name'
+    )
+    if len(hierarchy_names) < len(subcategory_ids):
+        return ["product_list_ids:*"]
+    return list(dict.fromkeys(
+        f"product_list_ids:{filter_key}:*"
+        for names in hierarchy_names
+        for filter_key in get_product_filter_keys(*names)
+    ))
+
+
+def clear_product_list_caches(subcategory_ids):
+    """
+    Clears the cached product lists affected by products added to or removed from the
+    given subcategories, for writes that bypass the model signals.
+
+    Args:
+        subcategory_ids (iterable): The subcategory ids whose products changed.
+    """
+    if PRODUCT_LIST_CACHE_MODE == 'objects':
+        invalidate_caches(get_product_list_key_formats(subcategory_ids) + ["count:*"])
+    else:
+        invalidate_caches(["product_list:*", "count:*"])
+
+
+@receiver(post_init, sender=Product)
+def remember_subcategory(sender, instance, **kwargs):
+    """
+    Remembers the subcategory a product was loaded with, so a move can be detected on save.
+
+    Args:
+        sender (Model): The model class that sent the signal.
+        instance (Product): The instance of the Product model.
+        **kwargs: Additional keyword arguments.
+    """
+    instance._loaded_subcategory_id = instance.__dict__.get('subcategory_id')
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def update_product_counts(sender, instance, **kwargs):
+    """
+    Updates the product counts of the hierarchy above a created, deleted or moved product.
+
+    Registered before `clear_cache`, which resets the subcategory the product was loaded with.
+
+    Args:
+        sender (Model): The model class that sent the signal.
+        instance (Product): The instance of the Product model.
+        **kwargs: Additional keyword arguments.
+    """
+    if kwargs['signal'] is post_delete:
+        deltas = {instance.subcategory_id: -1}
+    elif kwargs.get('created'):
+        deltas = {instance.subcategory_id: 1}
+    elif instance._loaded_subcategory_id != instance.subcategory_id:
+        deltas = {instance._loaded_subcategory_id: -1, instance.subcategory_id: 1}
+    else:
+        return
+    with use_shard(instance._state.db):
+        adjust_product_counts(deltas)
 
 
 @receiver(post_save, sender=Product)
@@ -23,10 +111,256 @@ def clear_cache(sender, instance, **kwargs):
     """
     Clears cache entries related to the Product model after save or delete operations.
 
+    In ``objects`` list cache mode only the id lists whose membership changed are
+    cleared: those of the product's subcategory on create and delete, and those of
+    the old and new subcategory when a product moves. With ``PRODUCT_CACHE_WRITE_THROUGH``
+    the product's own entries are rewritten rather than deleted, see `write_through`.
+
     Args:
         sender (Model): The model class that sent the signal.
         instance (Product): The instance of the Product model.
         **kwargs: Additional keyword arguments.
     """
-    key_formats = [f"product_list:*", f'product_retrieve:{instance.pk}:*']
-    invalidate_caches(key_formats)
+    subcategory_ids = set()
+    if kwargs['signal'] is post_delete or kwargs.get('created'):
+        subcategory_ids.add(instance.subcategory_id)
+    elif instance._loaded_subcategory_id != instance.subcategory_id:
+        subcategory_ids.update([instance._loaded_subcategory_id, instance.subcategory_id])
+    instance._loaded_subcategory_id = instance.subcategory_id
+    key_formats = [] if PRODUCT_CACHE_WRITE_THROUGH else [f'product_retrieve:{instance.pk}:*']
+    if subcategory_ids:
+        key_formats.append("count:*")
+    with use_shard(instance._state.db):
+        if PRODUCT_CACHE_WRITE_THROUGH:
+            products = [(instance._state.db, instance.pk)]
+            transaction.on_commit(lambda: product_cache_refresher.enqueue(products), using=get_catalog_db())
+        if PRODUCT_LIST_CACHE_MODE == 'objects':
+            key_formats.extend(get_product_list_key_formats(subcategory_ids))
+        else:
+            key_formats.append("product_list:*")
+        invalidate_caches(key_formats)
+
+
+@receiver(post_save, sender=Location)
+@receiver(post_save, sender=Department)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=SubCategory)
+@receiver(post_delete, sender=Location)
+@receiver(post_delete, sender=Department)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=SubCategory)
+def clear_filtered_product_caches(sender, instance, **kwargs):
+    """
+    Clears the cached product lists and counts after a hierarchy object is renamed, moved
+    or deleted, as the products matching the name filters change. New objects hold no
+    products.
+
+    Args:
+        sender (Model): The model class that sent the signal.
+        instance (Model): The saved or deleted instance.
+        **kwargs: Additional keyword arguments.
+    """
+    if kwargs.get('created'):
+        return
+    list_key_format = "product_list_ids:*" if PRODUCT_LIST_CACHE_MODE == 'objects' else "product_list:*"
+    with use_shard(instance._state.db):
+        invalidate_caches([list_key_format, "count:*"])
+
+
+@receiver(post_delete, sender=Location)
+@receiver(post_delete, sender=Department)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=SubCategory)
+@receiver(post_delete, sender=Product)
+def record_tombstone(sender, instance, **kwargs):
+    """
+    Records a tombstone for a deleted catalog object so the change feed can report it.
+
+    Args:
+        sender (Model): The model class that sent the signal.
+        instance (Model): The deleted instance.
+        **kwargs: Additional keyword arguments.
+    """
+    Tombstone.objects.using(instance._state.db).create(model_name=sender._meta.model_name, object_id=instance.pk)
+
+
+@receiver(post_save, sender=Location)
+@receiver(post_save, sender=Department)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=SubCategory)
+@receiver(post_save, sender=Product)
+def clear_not_found_cache(sender, instance, created, **kwargs):
+    """
+    Clears the cached failed lookups mentioning a saved catalog object, and adds new
+    products to the product id Bloom filter.
+
+    Args:
+        sender (Model): The model class that sent the signal.
+        instance (Model): The saved instance.
+        created (bool): Whether the instance was created.
+        **kwargs: Additional keyword arguments.
+    """
+    with use_shard(instance._state.db):
+        if created and sender is Product:
+            product_id_filter.add(instance.pk)
+        invalidate_caches([f"not_found:*:{instance.pk}:*"])
+
+
+@receiver(post_save, sender=Location)
+@receiver(post_save, sender=Department)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=SubCategory)
+@receiver(post_save, sender=Product)
+def index_name(sender, instance, **kwargs):
+    """
+    Adds a saved catalog object to the autocomplete index once the transaction commits.
+
+    Args:
+        sender (Model): The model class that sent the signal.
+        instance (Model): The saved instance.
+        **kwargs: Additional keyword arguments.
+    """
+    transaction.on_commit(lambda: autocomplete_index.upsert(instance), using=instance._state.db)
+
+
+@receiver(post_delete, sender=Location)
+@receiver(post_delete, sender=Department)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=SubCategory)
+@receiver(post_delete, sender=Product)
+def unindex_name(sender, instance, **kwargs):
+    """
+    Removes a deleted catalog object from the autocomplete index once the transaction commits.
+
+    Args:
+        sender (Model): The model class that sent the signal.
+        instance (Model): The deleted instance.
+        **kwargs: Additional keyword arguments.
+    """
+    pk = instance.pk
+    transaction.on_commit(lambda: autocomplete_index.remove(pk), using=instance._state.db)
+
+
+@receiver(post_save, sender=Location)
+@receiver(post_save, sender=Department)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=SubCategory)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Location)
+@receiver(post_delete, sender=Department)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=SubCategory)
+@receiver(post_delete, sender=Product)
+def publish_change(sender, instance, **kwargs):
+    """
+    Publishes the change of a catalog object to the event stream once the transaction commits.
+
+    Args:
+        sender (Model): The model class that sent the signal.
+        instance (Model): The saved or deleted instance.
+        **kwargs: Additional keyword arguments.
+    """
+    if kwargs['signal'] is post_delete:
+        op = 'delete'
+    else:
+        op = 'create' if kwargs['created'] else 'update'
+    event = make_event(op, sender._meta.model_name, instance.pk, instance.name, get_hierarchy_names(instance))
+    publish_events([event], using=instance._state.db)
+
+
+@receiver(post_init, sender=Department)
+@receiver(post_init, sender=Category)
+@receiver(post_init, sender=SubCategory)
+def remember_parent(sender, instance, **kwargs):
+    """
+    Remembers the parent a hierarchy node was loaded with, so a move can be detected on save.
+
+    Args:
+        sender (Model): The model class that sent the signal.
+        instance (Model): The instance of the Department, Category or SubCategory model.
+        **kwargs: Additional keyword arguments.
+    """
+    instance._loaded_parent_id = instance.__dict__.get(f'{get_parent_field(sender)}_id')
+
+
+@receiver(post_save, sender=Department)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=SubCategory)
+def update_product_locations(sender, instance, created, **kwargs):
+    """
+    Copies the location of a hierarchy node moved under another parent into the products
+    under it.
+
+    Args:
+        sender (Model): The model class that sent the signal.
+        instance (Model): The instance of the Department, Category or SubCategory model.
+        created (bool): Whether the instance was created.
+        **kwargs: Additional keyword arguments.
+    """
+    parent_id = getattr(instance, f'{get_parent_field(sender)}_id')
+    moved = not created and instance._loaded_parent_id != parent_id
+    instance._loaded_parent_id = parent_id
+    if not moved:
+        return
+    with use_shard(instance._state.db):
+        location_id = get_hierarchy_chains(sender, [instance.pk])[instance.pk][-1][1]
+        Product.objects.filter(**{get_product_lookup(sender): instance.pk}).exclude(
+            location=location_id).update(location=location_id)
+
+
+@receiver(post_save, sender=Location)
+def create_product_partition(sender, instance, created, **kwargs):
+    """
+    Creates the product partition of a new location when the product table is partitioned.
+
+    Args:
+        sender (Model): The model class that sent the signal.
+        instance (Location): The saved location.
+        created (bool): Whether the instance was created.
+        **kwargs: Additional keyword arguments.
+    """
+    if created:
+        create_partition(instance.pk, using=instance._state.db)
+
+
+@receiver(post_delete, sender=Location)
+def drop_product_partition(sender, instance, **kwargs):
+    """
+    Drops the product partition of a location deleted by a queryset delete, emptied by the
+    cascade, in a transaction of its own once the delete commits, so the lock it takes on
+    the product table is only held briefly. ``Location.delete()`` drops it up front instead.
+
+    Args:
+        sender (Model): The model class that sent the signal.
+        instance (Location): The deleted location.
+        **kwargs: Additional keyword arguments.
+    """
+    location_id, using = instance.pk, instance._state.db
+    transaction.on_commit(lambda: drop_partition_or_defer(location_id, using), using=using)
+
+
+@receiver(post_save, sender=Location)
+def register_location_shard(sender, instance, **kwargs):
+    """
+    Records the shard a location was saved to, and its current name, in the shard directory.
+
+    Args:
+        sender (Model): The model class that sent the signal.
+        instance (Location): The saved location.
+        **kwargs: Additional keyword arguments.
+    """
+    transaction.on_commit(lambda: shard_directory.register(instance), using=instance._state.db)
+
+
+@receiver(post_delete, sender=Location)
+def unregister_location_shard(sender, instance, **kwargs):
+    """
+    Removes a deleted location from the shard directory.
+
+    Args:
+        sender (Model): The model class that sent the signal.
+        instance (Location): The deleted location.
+        **kwargs: Additional keyword arguments.
+    """
+    pk = instance.pk
+    transaction.on_commit(lambda: shard_directory.unregister(pk), using=instance._state.db)
@@ -0,0 +1,299 @@
+import bisect
+import heapq
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+import uuid
+from array import array
+from contextlib import ExitStack
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import connections, transaction
+from rest_framework.renderers import JSONRenderer
+
+from metadata_store.ids import uuid7
+from metadata_store.models import Location, Department, Category, SubCategory, Product
+from metadata_store.serializers import (LocationSerializer, DepartmentSerializer, CategorySerializer,
+                                        SubCategorySerializer, ProductSerializer)
+from metadata_store.sharding import CATALOG_SHARDS
+
+SNAPSHOT_PATH = getattr(settings, 'CATALOG_SNAPSHOT_PATH', os.path.join(settings.BASE_DIR, 'snapshots', 'catalog.snap'))
+SNAPSHOT_CHECK_INTERVAL = getattr(settings, 'CATALOG_SNAPSHOT_CHECK_INTERVAL', 5)
+
+# The models in a snapshot, one section each, in file order.
+SNAPSHOT_MODELS = {
+    'location': (Location, LocationSerializer),
+    'department': (Department, DepartmentSerializer),
+    'category': (Category, CategorySerializer),
+    'subcategory': (SubCategory, SubCategorySerializer),
+    'product': (Product, ProductSerializer),
+}
+
+# File layout, little-endian:
+#   header     magic, format version, section count, snapshot version (a uuid7), created_at (µs)
+#   sections   per model: name, record count, offset of its id column, offset of its offset column
+#   records    per record: u32 length, then the record's JSON as rendered by the API
+#   columns    per model: the sorted 16-byte ids, then the u64 offsets of their records
+MAGIC = b'PSSNAP\x00\x00'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<8sII16sq')
+SECTION = struct.Struct('<16sQQQ')
+LENGTH = struct.Struct('<I')
+OFFSET = struct.Struct('<Q')
+ID_SIZE = 16
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotError(Exception):
+    """
+    Raised when a snapshot file is missing, truncated or of an unknown format.
+    """
+
+
+def iter_records(model, serializer_class, chunk_size):
+    """
+    Yields the id and rendered JSON of every object of a model across the shards, by id.
+
+    Args:
+        model (Model): The model class.
+        serializer_class (Serializer): The serializer rendering the records.
+        chunk_size (int): The number of rows fetched per round trip.
+
+    Yields:
+        tuple: The id bytes and the JSON bytes of an object.
+    """
+    renderer = JSONRenderer()
+    querysets = [model.objects.using(alias).order_by('pk').iterator(chunk_size=chunk_size) for alias in CATALOG_SHARDS]
+    for obj in heapq.merge(*querysets, key=lambda obj: obj.pk):
+        yield obj.pk.bytes, renderer.render(serializer_class(obj).data)
+
+
+def write_snapshot(path=SNAPSHOT_PATH, chunk_size=10000):
+    """
+    Writes a snapshot of the whole catalog and atomically swaps it in at ``path``.
+
+    The file is written next to ``path`` and renamed over it, so readers see either the
+    old or the new snapshot; workers holding the old one keep reading it until they
+    notice the swap. On Postgres each shard is read in one repeatable read transaction,
+    so the records of a location's subtree are from a single point in time.
+
+    Args:
+        path (str): The path of the snapshot file.
+        chunk_size (int): The number of rows fetched per round trip.
+
+    Returns:
+        dict: The version, creation time and record counts of the snapshot.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    version, created_at = uuid7(), datetime.now(timezone.utc)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    sections = []
+    try:
+        with ExitStack() as stack, open(temp_path, 'wb') as file:
+            for alias in CATALOG_SHARDS:
+                # Inside a caller's transaction the snapshot is read at its isolation level.
+                outermost = not connections[alias].in_atomic_block
+                stack.enter_context(transaction.atomic(using=alias))
+                if connections[alias].vendor == 'postgresql' and outermost:
+                    with connections[alias].cursor() as cursor:
+                        cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+            file.write(bytes(HEADER.size + SECTION.size * len(SNAPSHOT_MODELS)))
+            columns = []
+            for model, serializer_class in SNAPSHOT_MODELS.values():
+                ids, offsets = bytearray(), array('Q')
+                for object_id, record in iter_records(model, serializer_class, chunk_size):
+                    ids += object_id
+                    offsets.append(file.tell())
+                    file.write(LENGTH.pack(len(record)))
+                    file.write(record)
+                columns.append((ids, offsets))
+
+            for name, (ids, offsets) in zip(SNAPSHOT_MODELS, columns):
+                ids_offset = file.tell()
+                file.write(ids)
+                offsets_offset = file.tell()
+                if sys.byteorder != 'little':
+                    offsets.byteswap()
+                file.write(offsets.tobytes())
+                sections.append((name, len(offsets), ids_offset, offsets_offset))
+
+            file.seek(0)
+            file.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(sections), version.bytes,
+                                   int(created_at.timestamp() * 1000000)))
+            for name, count, ids_offset, offsets_offset in sections:
+                file.write(SECTION.pack(name.encode(), count, ids_offset, offsets_offset))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return {'version': str(version), 'created_at': created_at.isoformat(),
+            'counts': {name: count for name, count, _, _ in sections}}
+
+
+class IdColumn:
+    """
+    Sequence view of a sorted id column inside a snapshot, for `bisect`.
+    """
+    def __init__(self, buffer, offset, count):
+        self.buffer = buffer
+        self.offset = offset
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        start = self.offset + index * ID_SIZE
+        return self.buffer[start:start + ID_SIZE]
+
+
+class CatalogSnapshot:
+    """
+    Read-only catalog snapshot file mapped into memory.
+
+    Lookups binary search the sorted id column of a model and return the record as a
+    ``memoryview`` into the mapping, so neither the file nor the record is copied or
+    parsed; the pages are shared by every worker mapping the same file.
+
+    Attributes:
+        path (str): The path the snapshot was opened from.
+        version (str): The snapshot version, a uuid7 ordered by creation time.
+        created_at (datetime): When the snapshot was taken.
+        counts (dict): The number of records per model.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as file:
+            self.stat = os.fstat(file.fileno())
+            self.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.buffer = memoryview(self.mmap)
+        if len(self.mmap) < HEADER.size:
+            raise SnapshotError(f"{path} is not a catalog snapshot.")
+        magic, format_version, section_count, version, created_at = HEADER.unpack_from(self.mmap, 0)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise SnapshotError(f"{path} is not a version {FORMAT_VERSION} catalog snapshot.")
+        self.version = str(uuid.UUID(bytes=version))
+        self.created_at = datetime.fromtimestamp(created_at / 1000000, timezone.utc)
+        self.sections = {}
+        for index in range(section_count):
+            name, count, ids_offset, offsets_offset = SECTION.unpack_from(self.mmap, HEADER.size + index * SECTION.size)
+            if offsets_offset + count * OFFSET.size > len(self.mmap):
+                raise SnapshotError(f"{path} is truncated.")
+            self.sections[name.rstrip(b'\x00').decode()] = (IdColumn(self.mmap, ids_offset, count), offsets_offset)
+        self.counts = {name: len(ids) for name, (ids, _) in self.sections.items()}
+
+    def read_record(self, model_name, index):
+        """
+        Returns the record at a position of a model's id column.
+
+        Args:
+            model_name (str): The model name.
+            index (int): The position.
+
+        Returns:
+            memoryview: The record's JSON.
+        """
+        _, offsets_offset = self.sections[model_name]
+        offset, = OFFSET.unpack_from(self.mmap, offsets_offset + index * OFFSET.size)
+        length, = LENGTH.unpack_from(self.mmap, offset)
+        return self.buffer[offset + LENGTH.size:offset + LENGTH.size + length]
+
+    def get(self, model_name, object_id):
+        """
+        Looks up an object by id.
+
+        Args:
+            model_name (str): The model name.
+            object_id (UUID): The id.
+
+        Returns:
+            memoryview: The object's JSON, or None if the snapshot doesn't hold it.
+        """
+        ids, _ = self.sections[model_name]
+        key = object_id.bytes
+        index = bisect.bisect_left(ids, key)
+        if index < len(ids) and ids[index] == key:
+            return self.read_record(model_name, index)
+        return None
+
+    def range(self, model_name, after=None, limit=100):
+        """
+        Reads the objects of a model in id order.
+
+        Args:
+            model_name (str): The model name.
+            after (UUID): Start after this id; from the first object if None.
+            limit (int): The maximum number of objects.
+
+        Returns:
+            tuple: The list of records, and the id to pass as ``after`` for the next
+            objects, None if there are no more.
+        """
+        ids, _ = self.sections[model_name]
+        start = 0 if after is None else bisect.bisect_right(ids, after.bytes)
+        stop = min(start + limit, len(ids))
+        records = [self.read_record(model_name, index) for index in range(start, stop)]
+        return records, uuid.UUID(bytes=ids[stop - 1]) if start < stop < len(ids) else None
+
+
+class SnapshotStore:
+    """
+    Holds the snapshot a worker serves, reopening it when a new one is swapped in.
+
+    The file is checked at most every ``check_interval`` seconds. A replaced mapping
+    isn't closed explicitly; it is unmapped once the last record read from it is released.
+    """
+    def __init__(self, path, check_interval):
+        self.path = path
+        self.check_interval = check_interval
+        self.snapshot = None
+        self.checked_at = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        """
+        Returns the current snapshot.
+
+        Returns:
+            CatalogSnapshot: The snapshot.
+
+        Raises:
+            SnapshotError: If no snapshot has been written yet, or the file is invalid.
+        """
+        now = time.monotonic()
+        if self.checked_at is None or now - self.checked_at >= self.check_interval:
+            with self.lock:
+                if self.checked_at is None or now - self.checked_at >= self.check_interval:
+                    self.refresh()
+                    self.checked_at = now
+        if self.snapshot is None:
+            raise SnapshotError(f"No catalog snapshot at {self.path}.")
+        return self.snapshot
+
+    def refresh(self):
+        """
+        Opens the snapshot file if it changed since it was last opened, keeping the
+        previous snapshot if the new file can't be read.
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self.snapshot = None
+            return
+        current = self.snapshot
+        if current is None or (stat.st_ino, stat.st_mtime_ns) != (current.stat.st_ino, current.stat.st_mtime_ns):
+            try:
+                self.snapshot = CatalogSnapshot(self.path)
+            except (OSError, ValueError, SnapshotError):
+                logger.exception("Could not open the catalog snapshot at %s", self.path)
+
+
+catalog_snapshot = SnapshotStore(SNAPSHOT_PATH, SNAPSHOT_CHECK_INTERVAL)
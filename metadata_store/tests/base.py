@@ -0,0 +1,66 @@
+from contextlib import ExitStack, contextmanager
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connections
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from metadata_store.invalidation import invalidation_queue
+from metadata_store.models import Location, Department, Category, SubCategory, Product
+from metadata_store.warming import cache_warmer
+from metadata_store.write_through import product_cache_refresher
+
+
+class CatalogTestCase(TestCase):
+    """
+    Base test case with a staff API client, an empty cache and cache invalidations and
+    refreshes applied synchronously. Writes whose on-commit work a test depends on are
+    wrapped in `committed`, as test transactions never commit.
+    """
+    databases = '__all__'
+
+    def setUp(self):
+        cache.clear()
+        for patcher in (mock.patch.object(invalidation_queue, 'asynchronous', False),
+                        mock.patch.object(product_cache_refresher, 'asynchronous', False),
+                        mock.patch.object(cache_warmer, 'enabled', False)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.user = User.objects.create(username='staff', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @contextmanager
+    def committed(self):
+        """
+        Runs the on-commit callbacks of the writes within the block after it, on every
+        database, with the deferred constraints checked first as a commit would.
+        """
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(self.captureOnCommitCallbacks(using=alias, execute=True))
+            self.check_constraints()
+            yield
+            self.check_constraints()
+
+    def check_constraints(self):
+        for alias in connections:
+            connections[alias].check_constraints()
+
+    def create_hierarchy(self, location='L1', department='D1', category='C1', subcategory='S1'):
+        """
+        Creates a location, department, category and subcategory chain.
+
+        Returns:
+            tuple: The ``(location, department, category, subcategory)``.
+        """
+        location = Location.objects.create(name=location)
+        department = Department.objects.create(name=department, location=location)
+        category = Category.objects.create(name=category, department=department)
+        subcategory = SubCategory.objects.create(name=subcategory, category=category)
+        return location, department, category, subcategory
+
+    def create_products(self, subcategory, count, prefix='P'):
+        return [Product.objects.create(name=f'{prefix}{i}', subcategory=subcategory) for i in range(count)]
@@ -0,0 +1,42 @@
+from django.core.cache import cache
+from rest_framework.test import APIClient
+
+from metadata_store.tests.base import CatalogTestCase
+
+
+class BatchTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.location, self.department, self.category, self.subcategory = self.create_hierarchy()
+        self.products = self.create_products(self.subcategory, 3)
+
+    def post_batch(self, urls, client=None):
+        return (client or self.client).post('/api/v1/batch/', {'requests': urls}, format='json')
+
+    def test_runs_requests_in_order(self):
+        product = self.products[0]
+        response = self.post_batch([
+            'locations/',
+            f'products/{product.pk}/',
+            f'/api/v1/products/?category_name={self.category.name}&page_size=2',
+        ])
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([result['status'] for result in results], [200, 200, 200])
+        self.assertEqual([location['name'] for location in results[0]['body']['results']], ['L1'])
+        self.assertEqual(results[1]['body']['name'], product.name)
+        self.assertEqual(results[2]['body']['count'], 3)
+        self.assertEqual(len(results[2]['body']['results']), 2)
+
+    def test_sub_requests_share_the_response_cache(self):
+        self.post_batch([f'products/{self.products[0].pk}/', 'products/'])
+        self.assertTrue(cache.keys(f'product_retrieve:{self.products[0].pk}:*'))
+        self.assertTrue(cache.keys('product_list:*'))
+
+    def test_rejects_urls_outside_the_api(self):
+        results = self.post_batch(['nope/', '/admin/', 'https://example.com/api/v1/locations/', 'batch/']).json()
+        self.assertEqual([result['status'] for result in results['results']], [404, 400, 400, 400])
+
+    def test_requires_requests_and_authentication(self):
+        self.assertEqual(self.post_batch([]).status_code, 400)
+        self.assertIn(self.post_batch(['locations/'], client=APIClient()).status_code, (401, 403))
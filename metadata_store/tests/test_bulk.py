@@ -0,0 +1,47 @@
+import uuid
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from metadata_store.models import Product
+from metadata_store.tests.base import CatalogTestCase
+
+
+class BulkRetrieveTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.location, self.department, self.category, self.subcategory = self.create_hierarchy()
+        self.products = self.create_products(self.subcategory, 3)
+
+    def get_bulk(self, ids, **params):
+        response = self.client.get('/api/v1/products/bulk/', {'ids': ','.join(map(str, ids)), **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_results_in_requested_order_with_not_found(self):
+        missing = uuid.uuid4()
+        ids = [self.products[2].pk, missing, self.products[0].pk]
+        data = self.get_bulk(ids)
+        self.assertEqual([product['name'] for product in data['results']], ['P2', 'P0'])
+        self.assertEqual(data['not_found'], [str(missing)])
+
+    def test_cached_products_skip_the_database(self):
+        ids = [product.pk for product in self.products]
+        self.get_bulk(ids, detail='true')
+        with CaptureQueriesContext(connection) as queries:
+            data = self.get_bulk(ids, detail='true')
+        self.assertFalse([query for query in queries.captured_queries if 'metadata_store_product' in query['sql']])
+        self.assertEqual(data['results'][0]['subcategory']['name'], 'S1')
+
+    def test_saved_product_refreshed(self):
+        ids = [product.pk for product in self.products]
+        self.get_bulk(ids)
+        with self.committed():
+            product = Product.objects.get(pk=self.products[1].pk)
+            product.name = 'Renamed'
+            product.save()
+        self.assertEqual([product['name'] for product in self.get_bulk(ids)['results']], ['P0', 'Renamed', 'P2'])
+
+    def test_invalid_ids_rejected(self):
+        self.assertEqual(self.client.get('/api/v1/products/bulk/?ids=x').status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/products/bulk/').status_code, 400)
@@ -0,0 +1,79 @@
+import unittest
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+from metadata_store.cache_stats import cache_stats
+from metadata_store.tests.base import CatalogTestCase
+from metadata_store.utils import canonicalize_query
+
+USES_REDIS = settings.CACHES['default']['BACKEND'].startswith('django_redis.')
+
+
+class CanonicalQueryTests(SimpleTestCase):
+    def test_equivalent_queries_share_a_key(self):
+        self.assertEqual(canonicalize_query('page=1&detail=true'), 'detail=true')
+        self.assertEqual(canonicalize_query('detail=True&page=1'), 'detail=true')
+        self.assertEqual(canonicalize_query('detail=false&page_size=10&_=123'), '')
+        self.assertEqual(canonicalize_query('fields=name, id,name&page=02'), 'fields=id%2Cname&page=2')
+
+    def test_last_repeated_value_wins(self):
+        self.assertEqual(canonicalize_query('fields=a&fields=b'), 'fields=b')
+
+    def test_long_queries_are_hashed(self):
+        query = canonicalize_query('fields=' + ','.join(f'f{i}' for i in range(60)))
+        self.assertTrue(query.startswith('h='))
+        self.assertEqual(query, canonicalize_query('fields=' + ','.join(f'f{i}' for i in reversed(range(60)))))
+
+
+class CanonicalCacheKeyTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        subcategory = self.create_hierarchy()[3]
+        self.product = self.create_products(subcategory, 1)[0]
+
+    @unittest.skipUnless(USES_REDIS, 'lists cache keys')
+    def test_equivalent_requests_share_an_entry(self):
+        for query in ('?page=1&detail=true', '?detail=true&page=1', '?detail=True', '?detail=1&utm=x'):
+            self.assertEqual(self.client.get(f'/api/v1/products/{query}').status_code, 200)
+        self.assertEqual(cache.keys('product_list:*'), ['product_list::detail=true'])
+        for query in ('?fields=name,id', '?fields=id,name'):
+            self.client.get(f'/api/v1/products/{self.product.pk}/{query}')
+        self.assertEqual(cache.keys(f'product_retrieve:{self.product.pk}:*'),
+                         [f'product_retrieve:{self.product.pk}:fields=id%2Cname'])
+
+
+@unittest.skipUnless(USES_REDIS, 'Cache statistics are kept in Redis')
+class CacheStatsTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(cache_stats, 'enabled', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache_stats.reset()
+        self.addCleanup(cache_stats.reset)
+        subcategory = self.create_hierarchy()[3]
+        self.product = self.create_products(subcategory, 1)[0]
+
+    def test_counts_hits_and_misses_per_prefix(self):
+        for _ in range(3):
+            self.client.get(f'/api/v1/products/{self.product.pk}/')
+        counts = cache_stats.report()['prefixes']['product_retrieve']
+        self.assertEqual((counts['hits'], counts['misses'], counts['sets']), (2, 1, 1))
+        self.assertAlmostEqual(counts['hit_ratio'], 2 / 3)
+        self.assertEqual(cache_stats.hottest_keys(1), [f'product_retrieve:{self.product.pk}:'])
+
+    def test_report_drops_expired_keys(self):
+        self.client.get(f'/api/v1/products/{self.product.pk}/')
+        self.assertEqual([entry[0] for entry in cache_stats.report()['biggest']],
+                         [f'product_retrieve:{self.product.pk}:'])
+        cache.delete(f'product_retrieve:{self.product.pk}:')
+        self.assertEqual(cache_stats.report()['biggest'], [])
+        out = StringIO()
+        call_command('cache_report', '--reset', stdout=out)
+        self.assertIn('product_retrieve', out.getvalue())
+        self.assertEqual(cache_stats.report()['prefixes'], {})
@@ -0,0 +1,57 @@
+import os
+import tempfile
+from unittest import skipIf, skipUnless
+
+from django.core.management import call_command
+from django.db import connection
+
+from metadata_store.catalog_dump import CatalogDumpError, dump_catalog, load_catalog
+from metadata_store.models import Location, Department, Category, SubCategory, Product
+from metadata_store.tests.base import CatalogTestCase
+
+DUMPED_MODELS = (Location, Department, Category, SubCategory, Product)
+
+
+class CatalogDumpTestCase(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.create_hierarchy()
+        self.create_hierarchy(location='L2')
+        self.create_products(SubCategory.objects.get(category__department__location__name='L1'), 3)
+
+    def get_rows(self):
+        return {model.__name__: sorted(model.objects.values_list(*(field.attname
+                                                                   for field in model._meta.concrete_fields)))
+                for model in DUMPED_MODELS}
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Catalog dumps use COPY')
+class CatalogDumpTests(CatalogDumpTestCase):
+    def test_round_trip(self):
+        rows = self.get_rows()
+        for dump_format in ('binary', 'csv'):
+            with self.subTest(dump_format=dump_format):
+                path = os.path.join(self.directory, dump_format)
+                call_command('dump_catalog', path, format=dump_format)
+                self.check_constraints()
+                counts = load_catalog(path, truncate=True)
+                self.assertEqual(counts, {'location': 2, 'department': 2, 'category': 2, 'subcategory': 2,
+                                          'product': 3})
+                self.assertEqual(self.get_rows(), rows)
+        response = self.client.get('/api/v1/products/', {'location_name': 'L1'})
+        self.assertEqual(response.json()['count'], 3)
+
+    def test_load_needs_empty_tables(self):
+        dump_catalog(self.directory)
+        with self.assertRaisesMessage(CatalogDumpError, "aren't empty"):
+            load_catalog(self.directory)
+
+
+@skipIf(connection.vendor == 'postgresql', 'Catalog dumps are supported on Postgres')
+class UnsupportedCatalogDumpTests(CatalogDumpTestCase):
+    def test_needs_postgres(self):
+        with self.assertRaisesMessage(CatalogDumpError, "isn't PostgreSQL"):
+            dump_catalog(self.directory)
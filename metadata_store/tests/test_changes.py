@@ -0,0 +1,62 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.utils import timezone
+
+from metadata_store.models import Product, Tombstone
+from metadata_store.tests.base import CatalogTestCase
+
+
+class ChangeFeedTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.location, self.department, self.category, self.subcategory = self.create_hierarchy()
+        self.products = self.create_products(self.subcategory, 3)
+
+    def age(self, model, seconds, **filters):
+        model.objects.filter(**filters).update(updated_at=timezone.now() - timedelta(seconds=seconds))
+
+    def get_feed(self, **params):
+        response = self.client.get('/api/v1/changes/', {'model': 'product', **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_recent_changes_held_back(self):
+        self.assertEqual(self.get_feed()['results'], [])
+        self.age(Product, 60)
+        feed = self.get_feed()
+        self.assertEqual(len(feed['results']), 3)
+        self.assertFalse(feed['reset'])
+
+    def test_cursor_resumes_after_late_commit(self):
+        self.age(Product, 60)
+        cursor = self.get_feed()['cursor']
+        late = self.create_products(self.subcategory, 1, prefix='Late')[0]
+        self.assertEqual(self.get_feed(cursor=cursor)['results'], [])
+        self.age(Product, 30, pk=late.pk)
+        self.assertEqual([change['id'] for change in self.get_feed(cursor=cursor)['results']], [str(late.pk)])
+
+    def test_deletes_reported_as_tombstones(self):
+        self.age(Product, 60)
+        cursor = self.get_feed()['cursor']
+        pk = self.products[0].pk
+        self.products[0].delete()
+        self.age(Tombstone, 30)
+        changes = self.get_feed(cursor=cursor)['results']
+        self.assertEqual([(change['op'], change['id']) for change in changes], [('delete', str(pk))])
+
+    def test_cursor_older_than_retention_resets(self):
+        self.age(Product, 60 * 60 * 24 * 60)
+        updated_since = (timezone.now() - timedelta(days=45)).isoformat()
+        feed = self.get_feed(updated_since=updated_since)
+        self.assertTrue(feed['reset'])
+        self.assertEqual(len(feed['results']), 3)
+
+    def test_prune_tombstones(self):
+        expired, kept = self.products[0].pk, self.products[1].pk
+        self.products[0].delete()
+        self.products[1].delete()
+        self.age(Tombstone, 60 * 60 * 24 * 60, object_id=expired)
+        call_command('prune_tombstones', retention=60 * 60 * 24, stdout=StringIO())
+        self.assertEqual(list(Tombstone.objects.values_list('object_id', flat=True)), [kept])
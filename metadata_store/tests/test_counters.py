@@ -0,0 +1,58 @@
+from io import StringIO
+
+from django.core.management import call_command
+
+from metadata_store.counters import reconcile_product_counts
+from metadata_store.models import Location, Department, Category, SubCategory, Product
+from metadata_store.tests.base import CatalogTestCase
+
+
+class ProductCountTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.location, self.department, self.category, self.subcategory = self.create_hierarchy()
+        self.products = self.create_products(self.subcategory, 3)
+
+    def get_counts(self):
+        return [model.objects.get(pk=obj.pk).product_count
+                for model, obj in ((Location, self.location), (Department, self.department),
+                                   (Category, self.category), (SubCategory, self.subcategory))]
+
+    def test_create_and_delete_update_the_chain(self):
+        self.assertEqual(self.get_counts(), [3, 3, 3, 3])
+        Product.objects.get(pk=self.products[0].pk).delete()
+        self.assertEqual(self.get_counts(), [2, 2, 2, 2])
+
+    def test_move_across_categories(self):
+        other_category = Category.objects.create(name='C2', department=self.department)
+        other_subcategory = SubCategory.objects.create(name='S2', category=other_category)
+        product = Product.objects.get(pk=self.products[0].pk)
+        product.subcategory = other_subcategory
+        product.save()
+        self.assertEqual(self.get_counts(), [3, 3, 2, 2])
+        self.assertEqual(Category.objects.get(pk=other_category.pk).product_count, 1)
+        self.assertEqual(SubCategory.objects.get(pk=other_subcategory.pk).product_count, 1)
+
+    def test_stale_save_keeps_the_count(self):
+        stale = Location.objects.get(pk=self.location.pk)
+        Product.objects.create(name='New', subcategory=self.subcategory)
+        stale.name = 'Renamed'
+        stale.save()
+        self.assertEqual(Location.objects.get(pk=self.location.pk).product_count, 4)
+
+    def test_count_is_read_only_in_the_api(self):
+        url = f'/api/v1/locations/{self.location.pk}/'
+        response = self.client.patch(url, {'name': 'L1', 'product_count': 99}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['product_count'], 3)
+
+    def test_reconcile_corrects_drift(self):
+        Location.objects.filter(pk=self.location.pk).update(product_count=0)
+        SubCategory.objects.filter(pk=self.subcategory.pk).update(product_count=42)
+        self.assertEqual(reconcile_product_counts(dry_run=True),
+                         {'location': 1, 'department': 0, 'category': 0, 'subcategory': 1})
+        self.assertEqual(self.get_counts(), [0, 3, 3, 42])
+        out = StringIO()
+        call_command('reconcile_product_counts', stdout=out)
+        self.assertIn('Corrected 2 drifted product counts', out.getvalue())
+        self.assertEqual(self.get_counts(), [3, 3, 3, 3])
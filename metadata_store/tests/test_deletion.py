@@ -0,0 +1,55 @@
+from unittest import mock
+
+from django.core.cache import cache
+
+from metadata_store.deletion import delete_subtree
+from metadata_store.models import Category, Department, Location, Product, SubCategory, Tombstone
+from metadata_store.tests.base import CatalogTestCase
+
+
+class SubtreeDeleteTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.location, self.department, self.category, self.subcategory = self.create_hierarchy()
+        self.other_category = Category.objects.create(name='C2', department=self.department)
+        self.other_subcategory = SubCategory.objects.create(name='S2', category=self.other_category)
+        self.products = self.create_products(self.subcategory, 3)
+        self.kept = self.create_products(self.other_subcategory, 1, prefix='K')[0]
+
+    def test_delete_category_subtree(self):
+        self.client.get(f'/api/v1/products/{self.products[0].pk}/')
+        self.client.get('/api/v1/products/')
+        url = (f'/api/v1/locations/{self.location.pk}/departments/{self.department.pk}/categories/'
+               f'{self.category.pk}/')
+        with self.committed():
+            self.assertEqual(self.client.delete(url).status_code, 204)
+
+        self.assertEqual(list(Product.objects.values_list('pk', flat=True)), [self.kept.pk])
+        self.assertFalse(SubCategory.objects.filter(pk=self.subcategory.pk).exists())
+        self.assertEqual(Tombstone.objects.filter(model_name='product').count(), 3)
+        self.assertEqual(Tombstone.objects.filter(model_name='category').count(), 1)
+        self.assertEqual(Location.objects.get(pk=self.location.pk).product_count, 1)
+        self.assertEqual(Department.objects.get(pk=self.department.pk).product_count, 1)
+        self.assertFalse(cache.keys('product_retrieve:*'))
+        self.assertFalse(cache.keys('product_list:*'))
+
+    def test_chunked_delete_reports_progress(self):
+        progress = []
+        counts = delete_subtree(Location.objects.get(pk=self.location.pk), chunk_size=2,
+                                on_progress=lambda counts: progress.append(dict(counts)))
+        self.assertEqual(counts['product'], 4)
+        self.assertEqual(counts['location'], 1)
+        self.assertEqual(progress[-1], counts)
+        self.assertFalse(Product.objects.exists())
+
+    def test_async_delete_job(self):
+        url = f'/api/v1/locations/{self.location.pk}/departments/{self.department.pk}/?async=true'
+        with mock.patch('metadata_store.deletion.threading.Thread') as thread:
+            thread.side_effect = lambda target, daemon: mock.Mock(start=target)
+            with mock.patch('metadata_store.deletion.connections.close_all'), self.committed():
+                response = self.client.delete(url)
+        self.assertEqual(response.status_code, 202)
+        job = self.client.get(f"/api/v1/delete-jobs/{response.json()['id']}/").json()
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual(job['deleted']['product'], 4)
+        self.assertFalse(Department.objects.filter(pk=self.department.pk).exists())
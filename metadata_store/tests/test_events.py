@@ -0,0 +1,56 @@
+import json
+import unittest
+
+from django.conf import settings
+from django.db import transaction
+from django.test import SimpleTestCase
+from django_redis import get_redis_connection
+
+from metadata_store.events import EVENT_STREAM_KEY, format_event, make_event, matches
+from metadata_store.models import Product
+from metadata_store.tests.base import CatalogTestCase
+
+
+class EventFormatTests(SimpleTestCase):
+    def test_matches_model_and_hierarchy(self):
+        event = make_event('update', 'product', 1, 'P1', {'location': 'L1', 'department': 'D1'})
+        self.assertTrue(matches(event, {'product'}, {'location': 'L1'}))
+        self.assertFalse(matches(event, {'product'}, {'location': 'L2'}))
+        self.assertFalse(matches(event, {'location'}, {}))
+
+    def test_format_event(self):
+        event = make_event('create', 'location', 1, 'L1', {'location': 'L1'})
+        self.assertEqual(format_event('1-0', event), f"id: 1-0\nevent: create\ndata: {json.dumps(event)}\n\n")
+
+
+@unittest.skipUnless(settings.CACHES['default']['BACKEND'].startswith('django_redis.'), 'needs Redis')
+class EventPublishingTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.redis = get_redis_connection('default')
+        self.redis.delete(EVENT_STREAM_KEY)
+        self.addCleanup(self.redis.delete, EVENT_STREAM_KEY)
+        self.location, self.department, self.category, self.subcategory = self.create_hierarchy()
+
+    def get_events(self):
+        return [json.loads(fields[b'event']) for event_id, fields in self.redis.xrange(EVENT_STREAM_KEY)]
+
+    def test_committed_changes_are_published(self):
+        with self.committed():
+            product = Product.objects.create(name='P1', subcategory=self.subcategory)
+        with self.committed():
+            product.name = 'P2'
+            product.save()
+        with self.committed():
+            Product.objects.get(pk=product.pk).delete()
+        events = [event for event in self.get_events() if event['model'] == 'product']
+        self.assertEqual([(event['op'], event['name']) for event in events],
+                         [('create', 'P1'), ('update', 'P2'), ('delete', 'P2')])
+        self.assertEqual({(event['location'], event['subcategory']) for event in events}, {('L1', 'S1')})
+
+    def test_rolled_back_changes_are_not_published(self):
+        with self.committed():
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                Product.objects.create(name='P1', subcategory=self.subcategory)
+                raise RuntimeError
+        self.assertEqual(self.get_events(), [])
@@ -0,0 +1,44 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from metadata_store.tests.base import CatalogTestCase
+
+
+class SparseFieldsetTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.location, self.department, self.category, self.subcategory = self.create_hierarchy()
+        self.product = self.create_products(self.subcategory, 1)[0]
+
+    def test_fields_select_into_relations(self):
+        response = self.client.get(f'/api/v1/products/{self.product.pk}/?fields=name,subcategory.category.name')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'name': 'P0', 'subcategory': {'category': {'name': 'C1'}}})
+
+    def test_expand_renders_relation(self):
+        response = self.client.get(f'/api/v1/products/{self.product.pk}/?expand=subcategory&fields=name,subcategory')
+        self.assertEqual(response.json()['subcategory']['name'], 'S1')
+        self.assertEqual(response.json()['subcategory']['category'], str(self.category.pk))
+
+    def test_unknown_fields_rejected(self):
+        self.assertEqual(self.client.get('/api/v1/products/?fields=bogus').status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/products/?expand=name').status_code, 400)
+
+    def test_shapes_cached_apart_and_invalidated(self):
+        for query in ('?fields=name', '?fields=id'):
+            self.client.get(f'/api/v1/products/{self.product.pk}/{query}')
+        with self.committed():
+            self.product.name = 'Renamed'
+            self.product.save()
+        response = self.client.get(f'/api/v1/products/{self.product.pk}/?fields=name')
+        self.assertEqual(response.json(), {'name': 'Renamed'})
+        self.assertEqual(self.client.get(f'/api/v1/products/{self.product.pk}/?fields=id').json(),
+                         {'id': str(self.product.pk)})
+
+    def test_list_selects_only_requested_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/v1/products/?fields=name,subcategory.name')
+        product_query = [query['sql'] for query in queries.captured_queries if 'ORDER BY' in query['sql']][-1]
+        self.assertIn('JOIN', product_query)
+        self.assertNotIn('"metadata_store_product"."updated_at"', product_query)
+        self.assertNotIn('"metadata_store_product"."location_id"', product_query)
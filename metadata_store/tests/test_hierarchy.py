@@ -0,0 +1,71 @@
+from metadata_store.models import Location, Department, Category, SubCategory, Product, Tombstone
+from metadata_store.tests.base import CatalogTestCase
+
+
+class HierarchyTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.location, self.department, self.category, self.subcategory = self.create_hierarchy()
+        self.products = self.create_products(self.subcategory, 2)
+        self.other_location = Location.objects.create(name='L2')
+        self.other_department = Department.objects.create(name='D1', location=self.other_location)
+        self.other_category = Category.objects.create(name='C1', department=self.other_department)
+
+    def post(self, operation, data):
+        with self.committed():
+            return self.client.post(f'/api/v1/hierarchy/{operation}/', data, format='json')
+
+    def get_names(self, **params):
+        return [product['name'] for product in self.client.get('/api/v1/products/', params).json()['results']]
+
+    def test_move_updates_counts_locations_and_caches(self):
+        self.assertEqual(self.get_names(location_name='L2'), [])
+        response = self.post('move', {'type': 'subcategory', 'ids': [str(self.subcategory.pk)],
+                                      'parent': str(self.other_category.pk)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'moved': 1})
+        self.assertEqual(set(Product.objects.values_list('location__name', flat=True)), {'L2'})
+        self.assertEqual(Location.objects.get(pk=self.location.pk).product_count, 0)
+        self.assertEqual(Category.objects.get(pk=self.other_category.pk).product_count, 2)
+        self.assertEqual(self.get_names(location_name='L2'), ['P1', 'P0'])
+
+    def test_move_conflict(self):
+        SubCategory.objects.create(name='S1', category=self.other_category)
+        response = self.post('move', {'type': 'subcategory', 'ids': [str(self.subcategory.pk)],
+                                      'parent': str(self.other_category.pk)})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(len(response.json()['conflicts']), 1)
+        self.assertEqual(SubCategory.objects.get(pk=self.subcategory.pk).category_id, self.category.pk)
+
+    def test_merge_moves_children_and_tombstones_sources(self):
+        target = SubCategory.objects.create(name='S2', category=self.category)
+        response = self.post('merge', {'type': 'subcategory', 'sources': [str(self.subcategory.pk)],
+                                       'target': str(target.pk)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'merged': 1, 'moved': 2})
+        self.assertFalse(SubCategory.objects.filter(pk=self.subcategory.pk).exists())
+        self.assertTrue(Tombstone.objects.filter(object_id=self.subcategory.pk).exists())
+        self.assertEqual(SubCategory.objects.get(pk=target.pk).product_count, 2)
+        self.assertEqual(self.get_names(subcategory_name='S2'), ['P1', 'P0'])
+
+    def test_merge_into_itself_is_rejected(self):
+        response = self.post('merge', {'type': 'subcategory', 'sources': [str(self.subcategory.pk)],
+                                       'target': str(self.subcategory.pk)})
+        self.assertEqual(response.status_code, 400)
+
+    def test_rename_swaps_names_and_invalidates(self):
+        other = SubCategory.objects.create(name='S2', category=self.category)
+        self.assertEqual(self.get_names(subcategory_name='S1'), ['P1', 'P0'])
+        response = self.post('rename', {'type': 'subcategory', 'names': [
+            {'id': str(self.subcategory.pk), 'name': 'S2'}, {'id': str(other.pk), 'name': 'S1'}]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'renamed': 2})
+        self.assertEqual(self.get_names(subcategory_name='S1'), [])
+        self.assertEqual(self.get_names(subcategory_name='S2'), ['P1', 'P0'])
+
+    def test_rename_conflict(self):
+        SubCategory.objects.create(name='S2', category=self.category)
+        response = self.post('rename', {'type': 'subcategory', 'names': [{'id': str(self.subcategory.pk),
+                                                                          'name': 'S2'}]})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(SubCategory.objects.get(pk=self.subcategory.pk).name, 'S1')
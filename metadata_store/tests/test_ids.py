@@ -0,0 +1,24 @@
+from django.test import SimpleTestCase
+
+from metadata_store.ids import uuid7
+from metadata_store.tests.base import CatalogTestCase
+
+
+class UUID7Tests(SimpleTestCase):
+    def test_version_and_variant(self):
+        value = uuid7()
+        self.assertEqual(value.version, 7)
+        self.assertEqual(value.variant, 'specified in RFC 4122')
+
+    def test_ids_are_ordered(self):
+        ids = [uuid7() for _ in range(5000)]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(set(ids)), len(ids))
+
+
+class ProductIdTests(CatalogTestCase):
+    def test_products_get_time_ordered_ids(self):
+        location, department, category, subcategory = self.create_hierarchy()
+        products = self.create_products(subcategory, 3)
+        self.assertEqual([product.pk.version for product in products], [7, 7, 7])
+        self.assertEqual(products, sorted(products, key=lambda product: product.pk))
@@ -0,0 +1,64 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.test import SimpleTestCase
+
+from metadata_store.invalidation import InvalidationQueue
+from metadata_store.models import Product
+from metadata_store.tests.base import CatalogTestCase
+
+
+class RecordingQueue(InvalidationQueue):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.applied = []
+
+    def apply(self, keys_format_list):
+        self.applied.append(keys_format_list)
+
+
+class InvalidationQueueTests(SimpleTestCase):
+    def test_collect_merges_queued_key_formats(self):
+        invalidations = RecordingQueue(window=0.05)
+        invalidations.queue.put(['count:*', 'product_list:*'])
+        invalidations.queue.put(['product_list:*', 'product_retrieve:1:*'])
+        self.assertEqual(invalidations.collect(), ['count:*', 'product_list:*', 'product_retrieve:1:*'])
+
+    def test_flush_applies_queued_key_formats_once(self):
+        invalidations = RecordingQueue(window=0.05)
+        invalidations.queue.put(['count:*'])
+        invalidations.queue.put(['count:*', 'product_list:*'])
+        invalidations.flush()
+        invalidations.flush()
+        self.assertEqual(invalidations.applied, [['count:*', 'product_list:*']])
+
+    def test_synchronous_queue_applies_right_away(self):
+        invalidations = RecordingQueue(window=0.05, asynchronous=False)
+        invalidations.enqueue(['count:*'])
+        self.assertEqual(invalidations.applied, [['count:*']])
+        self.assertTrue(invalidations.queue.empty())
+
+
+class CommitInvalidationTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.location, self.department, self.category, self.subcategory = self.create_hierarchy()
+        self.products = self.create_products(self.subcategory, 3)
+
+    def test_burst_of_writes_invalidates_on_commit(self):
+        cache.set('product_list::page=1', 'stale')
+        with self.committed():
+            for product in Product.objects.filter(subcategory=self.subcategory):
+                product.name = f'{product.name}!'
+                product.save()
+            self.assertEqual(cache.get('product_list::page=1'), 'stale')
+        self.assertIsNone(cache.get('product_list::page=1'))
+
+    def test_rolled_back_write_keeps_cache(self):
+        cache.set('product_list::page=1', 'cached')
+        with self.committed():
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                product = Product.objects.get(pk=self.products[0].pk)
+                product.name = 'Rolled back'
+                product.save()
+                raise RuntimeError
+        self.assertEqual(cache.get('product_list::page=1'), 'cached')
@@ -0,0 +1,46 @@
+from unittest import mock
+
+from django.core.cache import cache
+
+from metadata_store.models import Product, SubCategory
+from metadata_store.tests.base import CatalogTestCase
+from metadata_store.views import ProductViewSet
+
+
+class ObjectListCacheTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        for patcher in (mock.patch.object(ProductViewSet, 'list_cache_mode', 'objects'),
+                        mock.patch('metadata_store.signals.PRODUCT_LIST_CACHE_MODE', 'objects')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.location, self.department, self.category, self.subcategory = self.create_hierarchy()
+        self.other_subcategory = SubCategory.objects.create(name='S2', category=self.category)
+        self.products = self.create_products(self.subcategory, 2)
+        self.create_products(self.other_subcategory, 1, prefix='Q')
+
+    def get_names(self, **params):
+        response = self.client.get('/api/v1/products/', params)
+        self.assertEqual(response.status_code, 200)
+        return [product['name'] for product in response.json()['results']]
+
+    def test_edit_keeps_id_lists(self):
+        self.assertEqual(self.get_names(subcategory_name='S1'), ['P1', 'P0'])
+        id_lists = cache.keys('product_list_ids:*')
+        with self.committed():
+            product = Product.objects.get(pk=self.products[0].pk)
+            product.name = 'Renamed'
+            product.save()
+        self.assertEqual(cache.keys('product_list_ids:*'), id_lists)
+        self.assertEqual(self.get_names(subcategory_name='S1'), ['P1', 'Renamed'])
+
+    def test_create_invalidates_only_affected_id_lists(self):
+        self.assertEqual(self.get_names(subcategory_name='S1'), ['P1', 'P0'])
+        self.assertEqual(self.get_names(subcategory_name='S2'), ['Q0'])
+        with self.committed():
+            Product.objects.create(name='New', subcategory=self.other_subcategory)
+        keys = cache.keys('product_list_ids:*')
+        self.assertTrue([key for key in keys if 'subcategory_name=S1' in key])
+        self.assertFalse([key for key in keys if 'subcategory_name=S2' in key])
+        self.assertEqual(self.get_names(subcategory_name='S2'), ['New', 'Q0'])
+        self.assertEqual(self.get_names(subcategory_name='S1'), ['P1', 'P0'])
@@ -0,0 +1,55 @@
+import tracemalloc
+from unittest import mock
+
+from django.contrib.auth.models import User
+from rest_framework.test import APIClient
+
+from metadata_store.memory_profiling import MemoryProfiler
+from metadata_store.tests.base import CatalogTestCase
+
+
+class MemoryProfileTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.profiler = MemoryProfiler(frames=1, sample_interval=0, max_samples=5, top_sites=5, enabled=False)
+        for target in ('metadata_store.memory_profiling.memory_profiler', 'metadata_store.middleware.memory_profiler',
+                       'metadata_store.views.memory_profiler'):
+            patcher = mock.patch(target, self.profiler)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.create_products(self.create_hierarchy()[3], 3)
+
+    def start_tracing(self):
+        if not tracemalloc.is_tracing():
+            self.addCleanup(tracemalloc.stop)
+        self.profiler.enabled = True
+        self.profiler.start()
+
+    def test_staff_only(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username='user'))
+        self.assertEqual(client.get('/api/v1/memory/').status_code, 403)
+
+    def test_disabled_profiler(self):
+        response = self.client.get('/api/v1/memory/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()['tracing'])
+        self.assertEqual(self.client.get('/api/v1/memory/diff/').status_code, 503)
+
+    def test_requests_are_attributed_to_endpoints_and_phases(self):
+        self.start_tracing()
+        for _ in range(2):
+            self.assertEqual(self.client.get('/api/v1/products/', {'detail': 'true'}).status_code, 200)
+        report = self.client.get('/api/v1/memory/').json()
+        self.assertTrue(report['tracing'])
+        (endpoint, stats), = [(name, stats) for name, stats in report['endpoints'].items() if 'products-list' in name]
+        self.assertEqual(stats['requests'], 2)
+        self.assertGreater(stats['peak_max'], 0)
+        self.assertIn('serialization', stats['phases'])
+        self.assertEqual(self.client.post('/api/v1/memory/sample/').status_code, 200)
+        response = self.client.get('/api/v1/memory/diff/', {'since': 'sample', 'limit': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(response.json()['sites']), 3)
+        self.assertEqual(self.client.get('/api/v1/memory/diff/', {'group_by': 'file'}).status_code, 400)
+        self.assertEqual(self.client.post('/api/v1/memory/reset/').status_code, 204)
+        self.assertEqual(list(self.profiler.report()['endpoints']), ['POST memory-reset'])
@@ -0,0 +1,19 @@
+from django.db import connection
+from django.test import SimpleTestCase
+
+from metadata_store.models import Product
+
+
+class NamePrefixIndexTests(SimpleTestCase):
+    def get_index_sql(self):
+        index = next(index for index in Product._meta.indexes if index.name == 'product_name_prefix_idx')
+        schema_editor = connection.SchemaEditorClass(connection, collect_sql=True)
+        return str(index.create_sql(Product, schema_editor))
+
+    def test_operator_class_only_on_postgres(self):
+        sql = self.get_index_sql()
+        self.assertIn('UPPER(', sql)
+        if connection.vendor == 'postgresql':
+            self.assertIn('text_pattern_ops', sql)
+        else:
+            self.assertNotIn('text_pattern_ops', sql)
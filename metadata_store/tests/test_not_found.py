@@ -0,0 +1,83 @@
+import uuid
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django_redis import get_redis_connection
+
+from metadata_store.bloom import product_id_filter
+from metadata_store.models import Location, Product
+from metadata_store.tests.base import CatalogTestCase
+
+
+class NegativeCacheTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.location, self.department, self.category, self.subcategory = self.create_hierarchy()
+
+    def test_missing_lookup_replayed_from_cache(self):
+        url = f'/api/v1/products/{uuid.uuid4()}/'
+        self.assertEqual(self.client.get(url).status_code, 404)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(len(queries.captured_queries), 0)
+
+    def test_saved_object_clears_its_failed_lookups(self):
+        location_id = uuid.uuid4()
+        url = f'/api/v1/locations/{location_id}/'
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertTrue(cache.keys(f'not_found:*:{location_id}:*'))
+        with self.committed():
+            Location.objects.create(id=location_id, name='L2')
+        self.assertFalse(cache.keys(f'not_found:*:{location_id}:*'))
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class ProductIdFilterTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(product_id_filter, 'enabled', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        client = get_redis_connection('default')
+        self.addCleanup(client.delete, product_id_filter.key, product_id_filter.ready_key)
+        self.location, self.department, self.category, self.subcategory = self.create_hierarchy()
+        self.products = self.create_products(self.subcategory, 3)
+
+    def test_filter_rejects_unknown_ids(self):
+        self.assertTrue(product_id_filter.might_contain(uuid.uuid4()))
+        product_id_filter.rebuild([Product.objects.all()])
+        self.assertTrue(all(product_id_filter.might_contain(product.pk) for product in self.products))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(f'/api/v1/products/{uuid.uuid4()}/').status_code, 404)
+        self.assertEqual(len(queries.captured_queries), 0)
+
+    def test_new_products_added(self):
+        product_id_filter.rebuild([Product.objects.all()])
+        with self.committed():
+            product = Product.objects.create(name='New', subcategory=self.subcategory)
+        self.assertTrue(product_id_filter.might_contain(product.pk))
+        self.assertEqual(self.client.get(f'/api/v1/products/{product.pk}/').status_code, 200)
+
+    def test_bulk_retrieve_checks_misses_in_one_round_trip(self):
+        product_id_filter.rebuild([Product.objects.all()])
+        client = get_redis_connection('default')
+        executions = []
+
+        def pipeline(*args, **kwargs):
+            redis_pipeline = client.pipeline(*args, **kwargs)
+            execute = redis_pipeline.execute
+            redis_pipeline.execute = lambda: executions.append(len(redis_pipeline.command_stack)) or execute()
+            return redis_pipeline
+
+        unknown_ids = [str(uuid.uuid4()) for _ in range(5)]
+        ids = [str(product.pk) for product in self.products] + unknown_ids
+        with mock.patch('metadata_store.bloom.get_redis_connection', return_value=mock.Mock(pipeline=pipeline)):
+            response = self.client.get('/api/v1/products/bulk/', {'ids': ','.join(ids)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(executions), 1)
+        self.assertEqual(executions[0], 1 + len(ids) * product_id_filter.hash_count)
+        self.assertEqual(len(response.json()['results']), 3)
+        self.assertEqual(response.json()['not_found'], unknown_ids)
+        self.assertEqual(product_id_filter.might_contain_many(ids[:3]), [True] * 3)
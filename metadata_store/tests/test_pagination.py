@@ -0,0 +1,55 @@
+from metadata_store.models import Location, Department
+from metadata_store.tests.base import CatalogTestCase
+
+
+class CountCacheTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.location, self.department, self.category, self.subcategory = self.create_hierarchy()
+
+    def test_new_product_reaches_the_new_last_page(self):
+        self.create_products(self.subcategory, 20)
+        self.assertEqual(self.client.get('/api/v1/products/?page=2').json()['count'], 20)
+        with self.committed():
+            response = self.client.post('/api/v1/products/', {'name': 'New', 'subcategory': self.subcategory.pk},
+                                        format='json')
+        self.assertEqual(response.status_code, 201)
+
+        response = self.client.get('/api/v1/products/?page=3')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 21)
+        self.assertEqual(len(response.json()['results']), 1)
+
+    def test_new_department_reaches_the_new_last_page(self):
+        for i in range(1, 20):
+            Department.objects.create(name=f'D{i + 1:02}', location=self.location)
+        url = f'/api/v1/locations/{self.location.pk}/departments/'
+        self.assertEqual(self.client.get(f'{url}?page=2').json()['count'], 20)
+        with self.committed():
+            response = self.client.post(url, {'name': 'New'}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        response = self.client.get(f'{url}?page=3')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 21)
+
+    def test_deleted_location_leaves_the_last_page(self):
+        for i in range(20):
+            Location.objects.create(name=f'L{i + 2:02}')
+        self.assertEqual(self.client.get('/api/v1/locations/?page=3').json()['count'], 21)
+        with self.committed():
+            response = self.client.delete(f'/api/v1/locations/{Location.objects.get(name="L21").pk}/')
+        self.assertEqual(response.status_code, 204)
+
+        self.assertEqual(self.client.get('/api/v1/locations/?page=3').status_code, 404)
+        self.assertEqual(self.client.get('/api/v1/locations/?page=2').json()['count'], 20)
+
+    def test_renamed_subcategory_updates_filtered_counts(self):
+        self.create_products(self.subcategory, 3)
+        self.assertEqual(self.client.get('/api/v1/products/?subcategory_name=S1').json()['count'], 3)
+        with self.committed():
+            self.subcategory.name = 'S2'
+            self.subcategory.save()
+
+        self.assertEqual(self.client.get('/api/v1/products/?subcategory_name=S2').json()['count'], 3)
+        self.assertEqual(self.client.get('/api/v1/products/?subcategory_name=S1').json()['count'], 0)
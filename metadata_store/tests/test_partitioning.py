@@ -0,0 +1,51 @@
+from unittest import mock, skipUnless
+
+from django.db import OperationalError, connection
+
+from metadata_store import deletion
+from metadata_store.models import Location, Product, Tombstone
+from metadata_store.partitioning import drop_orphaned_partitions, has_partition, is_partitioned
+from metadata_store.tests.base import CatalogTestCase
+
+
+@skipUnless(connection.vendor == 'postgresql', 'The product table is only partitioned on Postgres')
+class PartitionDropTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.assertTrue(is_partitioned('default'))
+        self.location, self.department, self.category, self.subcategory = self.create_hierarchy()
+        self.product_ids = [product.pk for product in self.create_products(self.subcategory, 3)]
+
+    def assert_deleted(self):
+        self.assertFalse(Location.objects.filter(pk=self.location.pk).exists())
+        self.assertFalse(Product.objects.filter(pk__in=self.product_ids).exists())
+        self.assertEqual(set(Tombstone.objects.filter(model_name='product').values_list('object_id', flat=True)),
+                         set(self.product_ids))
+
+    def test_orm_delete_drops_the_partition(self):
+        with self.committed():
+            deleted, per_model = Location.objects.get(pk=self.location.pk).delete()
+        self.assertEqual(per_model['metadata_store.Product'], 3)
+        self.assertEqual(deleted, 7)
+        self.assertFalse(has_partition(self.location.pk, 'default'))
+        self.assert_deleted()
+
+    def test_queryset_delete_drops_the_partition_after_commit(self):
+        with self.committed():
+            Location.objects.filter(pk=self.location.pk).delete()
+            self.assertTrue(has_partition(self.location.pk, 'default'))
+        self.assertFalse(has_partition(self.location.pk, 'default'))
+        self.assert_deleted()
+
+    def test_busy_product_table_falls_back_to_row_deletes(self):
+        with mock.patch.object(deletion, 'drop_partition', side_effect=OperationalError('lock timeout')), \
+                mock.patch('metadata_store.deletion.drop_partition_or_defer') as drop_later:
+            with self.committed():
+                counts = deletion.delete_subtree(Location.objects.get(pk=self.location.pk))
+        self.assertEqual(counts['product'], 3)
+        drop_later.assert_called_once_with(self.location.pk, 'default')
+        self.assert_deleted()
+        self.assertTrue(has_partition(self.location.pk, 'default'))
+
+        self.assertEqual(drop_orphaned_partitions('default'), 1)
+        self.assertFalse(has_partition(self.location.pk, 'default'))
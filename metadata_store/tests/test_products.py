@@ -0,0 +1,30 @@
+from metadata_store.models import Category, Product
+from metadata_store.tests.base import CatalogTestCase
+
+
+class ProductLocationTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.location, self.department, self.category, self.subcategory = self.create_hierarchy()
+        self.product = self.create_products(self.subcategory, 1)[0]
+
+    def test_location_copied_from_subcategory(self):
+        self.assertEqual(self.product.location_id, self.location.pk)
+
+    def test_location_not_exposed(self):
+        for url in (f'/api/v1/products/{self.product.pk}/', f'/api/v1/products/{self.product.pk}/?detail=true',
+                    '/api/v1/products/', f'/api/v1/products/bulk/?ids={self.product.pk}'):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                data = response.json()
+                records = data.get('results', [data]) if isinstance(data, dict) else data
+                self.assertTrue(records)
+                self.assertNotIn('location', records[0])
+
+    def test_moved_subcategory_moves_products(self):
+        other_location, other_department, _, _ = self.create_hierarchy('L2', 'D2', 'C2', 'S2')
+        category = Category.objects.get(pk=self.category.pk)
+        category.department = other_department
+        category.save()
+        self.assertEqual(Product.objects.get(pk=self.product.pk).location_id, other_location.pk)
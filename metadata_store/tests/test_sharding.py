@@ -0,0 +1,97 @@
+import unittest
+from unittest import mock
+
+from django.db import DatabaseError
+
+from metadata_store.models import Location, LocationShard, Product
+from metadata_store.shard_directory import shard_directory
+from metadata_store.sharding import CATALOG_SHARDS, ShardedQuerySet, get_catalog_db, use_shard
+from metadata_store.tests.base import CatalogTestCase
+
+
+class ShardingTests(CatalogTestCase):
+    def test_use_shard_routes_catalog_queries(self):
+        self.assertEqual(get_catalog_db(), CATALOG_SHARDS[0])
+        with use_shard(CATALOG_SHARDS[-1]):
+            self.assertEqual(get_catalog_db(), CATALOG_SHARDS[-1])
+            self.assertEqual(Location.objects.all().db, CATALOG_SHARDS[-1])
+        self.assertEqual(get_catalog_db(), CATALOG_SHARDS[0])
+
+    def test_sharded_queryset_pages_by_ordering(self):
+        subcategory = self.create_hierarchy()[3]
+        products = self.create_products(subcategory, 5)
+        merged = ShardedQuerySet(Product.objects.order_by('-created_at'), CATALOG_SHARDS[:1])
+        self.assertEqual(merged.count(), 5)
+        self.assertEqual(merged[1:3], products[::-1][1:3])
+        with self.assertRaises(ValueError):
+            ShardedQuerySet(Product.objects.order_by('name', '-created_at'), CATALOG_SHARDS[:1])
+
+
+@unittest.skipUnless(len(CATALOG_SHARDS) > 1, 'needs more than one catalog shard')
+class MultiShardTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        for patcher in (mock.patch.object(shard_directory, 'by_id', {}),
+                        mock.patch.object(shard_directory, 'by_name', {})):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.locations = {}
+        for name in ('L0', 'L1'):
+            with self.committed():
+                response = self.client.post('/api/v1/locations/', {'name': name}, format='json')
+            self.assertEqual(response.status_code, 201)
+            self.locations[name] = response.json()['id']
+
+    def create_products(self, location_name, count):
+        """
+        Creates a department, category and subcategory under a location and products in it
+        through the API, which routes them to the location's shard.
+
+        Returns:
+            list: The ids of the products.
+        """
+        url = f'/api/v1/locations/{self.locations[location_name]}/'
+        for model, name in (('departments', 'D'), ('categories', 'C'), ('subcategories', 'S')):
+            response = self.client.post(f'{url}{model}/', {'name': f'{name}{location_name}'}, format='json')
+            self.assertEqual(response.status_code, 201)
+            url = f"{url}{model}/{response.json()['id']}/"
+        subcategory_id = response.json()['id']
+        return [self.client.post('/api/v1/products/', {'name': f'P{location_name}{i}', 'subcategory': subcategory_id},
+                                 format='json').json()['id'] for i in range(count)]
+
+    def test_locations_are_spread_across_shards(self):
+        shards = dict(LocationShard.objects.values_list('location_name', 'shard'))
+        self.assertEqual(len(set(shards.values())), 2)
+        for name, location_id in self.locations.items():
+            self.assertTrue(Location.objects.using(shards[name]).filter(pk=location_id).exists())
+        self.assertEqual(self.client.post('/api/v1/locations/', {'name': 'L1'}, format='json').status_code, 400)
+
+    def test_product_list_merges_shards(self):
+        ids = self.create_products('L0', 2) + self.create_products('L1', 2)
+        response = self.client.get('/api/v1/products/', {'page_size': 3})
+        self.assertEqual(response.json()['count'], 4)
+        self.assertEqual([product['id'] for product in response.json()['results']], ids[::-1][:3])
+        response = self.client.get('/api/v1/products/', {'page_size': 3, 'page': 2})
+        self.assertEqual([product['id'] for product in response.json()['results']], ids[:1])
+        response = self.client.get('/api/v1/products/', {'location_name': 'L1'})
+        self.assertEqual([product['id'] for product in response.json()['results']], ids[:1:-1])
+
+    def test_product_writes_reach_their_shard(self):
+        product_id = self.create_products('L1', 1)[0]
+        shard = shard_directory.get_shard(self.locations['L1'])
+        response = self.client.patch(f'/api/v1/products/{product_id}/', {'name': 'Renamed'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Product.objects.using(shard).get(pk=product_id).name, 'Renamed')
+        self.assertEqual(self.client.delete(f'/api/v1/products/{product_id}/').status_code, 204)
+        self.assertFalse(Product.objects.using(shard).filter(pk=product_id).exists())
+        self.assertEqual(Location.objects.using(shard).get(pk=self.locations['L1']).product_count, 0)
+
+    def test_failed_upsert_releases_the_location_name(self):
+        paths = [['L2', 'D1', 'C1', 'S1', 'P1']]
+        with mock.patch('metadata_store.upsert.publish_events', side_effect=DatabaseError), \
+                self.assertRaises(DatabaseError):
+            self.client.post('/api/v1/products/upsert/', {'paths': paths}, format='json')
+        self.assertFalse(LocationShard.objects.filter(location_name='L2').exists())
+        with self.committed():
+            response = self.client.post('/api/v1/locations/', {'name': 'L2'}, format='json')
+        self.assertEqual(response.status_code, 201)
@@ -0,0 +1,69 @@
+import os
+import tempfile
+import uuid
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+
+from metadata_store.models import Product
+from metadata_store.snapshots import catalog_snapshot, write_snapshot
+from metadata_store.tests.base import CatalogTestCase
+
+
+class SnapshotTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'catalog.snap')
+        for patcher in (mock.patch.object(catalog_snapshot, 'path', self.path),
+                        mock.patch.object(catalog_snapshot, 'check_interval', 0),
+                        mock.patch.object(catalog_snapshot, 'snapshot', None),
+                        mock.patch.object(catalog_snapshot, 'checked_at', None)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.location, self.department, self.category, self.subcategory = self.create_hierarchy()
+        self.products = self.create_products(self.subcategory, 3)
+
+    def test_unavailable_until_built(self):
+        self.assertEqual(self.client.get('/api/v1/snapshot/').status_code, 503)
+        out = StringIO()
+        call_command('build_catalog_snapshot', output=self.path, stdout=out)
+        self.assertIn('3 product', out.getvalue())
+        response = self.client.get('/api/v1/snapshot/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['counts']['product'], 3)
+        self.assertEqual(response['X-Snapshot-Version'], str(response.json()['version']))
+
+    def test_objects_match_the_api(self):
+        write_snapshot(self.path)
+        product = self.products[1]
+        response = self.client.get(f'/api/v1/snapshot/product/{product.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), self.client.get(f'/api/v1/products/{product.pk}/').json())
+        self.assertEqual(self.client.get(f'/api/v1/snapshot/product/{uuid.uuid4()}/').status_code, 404)
+        self.assertEqual(self.client.get('/api/v1/snapshot/product/xx/').status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/snapshot/unknown/').status_code, 404)
+
+    def test_pages_in_id_order(self):
+        write_snapshot(self.path)
+        ids, after = [], None
+        while True:
+            params = {'limit': 2, **({'after': after} if after else {})}
+            page = self.client.get('/api/v1/snapshot/product/', params).json()
+            ids += [product['id'] for product in page['results']]
+            if not (after := page['next']):
+                break
+        self.assertEqual(ids, sorted(str(product.pk) for product in self.products))
+        self.assertEqual(self.client.get('/api/v1/snapshot/product/', {'limit': 0}).status_code, 400)
+
+    def test_new_snapshot_is_swapped_in(self):
+        write_snapshot(self.path)
+        old = catalog_snapshot.get()
+        Product.objects.create(name='New', subcategory=self.subcategory)
+        write_snapshot(self.path)
+        new = catalog_snapshot.get()
+        self.assertIsNot(new, old)
+        self.assertEqual(new.counts['product'], 4)
+        self.assertIsNotNone(old.get('product', self.products[0].pk))
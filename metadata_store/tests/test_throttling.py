@@ -0,0 +1,33 @@
+from unittest import mock
+
+from django.conf import settings
+from django.test import override_settings
+from django_redis import get_redis_connection
+
+from metadata_store.tests.base import CatalogTestCase
+from metadata_store.throttling import TokenBucketThrottle
+from metadata_store.views import LocationViewSet
+
+
+class TokenBucketThrottleTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(LocationViewSet, 'throttle_classes', [TokenBucketThrottle])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(get_redis_connection('default').delete, f'throttle:catalog:{self.user.pk}')
+
+    def test_fractional_wait_rounds_up(self):
+        throttle = TokenBucketThrottle()
+        for wait_seconds, retry_after in ((0.0001, 1), (0.5, 1), (1.2, 2), (3.0, 3)):
+            throttle.wait_seconds = wait_seconds
+            self.assertEqual(throttle.wait(), retry_after)
+
+    def test_throttled_response_retry_after(self):
+        rates = {**settings.REST_FRAMEWORK.get('DEFAULT_THROTTLE_RATES', {}), 'catalog': '2/s'}
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates}):
+            statuses = [self.client.get('/api/v1/locations/').status_code for _ in range(2)]
+            response = self.client.get('/api/v1/locations/')
+        self.assertEqual(statuses, [200, 200])
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
@@ -0,0 +1,39 @@
+from unittest import mock
+
+from metadata_store.models import LocationShard, Product
+from metadata_store.shard_directory import ShardDirectory
+from metadata_store.tests.base import CatalogTestCase
+
+
+class ShardAssignmentTests(CatalogTestCase):
+    def test_concurrent_new_location_gets_one_shard(self):
+        first, second = ShardDirectory(['default', 'shard1']), ShardDirectory(['default', 'shard1'])
+        with mock.patch.object(first, 'choose_shard', return_value='shard1'):
+            self.assertEqual(first.assign_shard('New'), 'shard1')
+        # The second request looked the name up before the first reserved it, and would pick another shard.
+        with mock.patch.object(second, 'get_shard_by_name', return_value=None), \
+                mock.patch.object(second, 'choose_shard', return_value='default'):
+            self.assertEqual(second.assign_shard('New'), 'shard1')
+        self.assertEqual(list(LocationShard.objects.values_list('location_name', 'shard')), [('New', 'shard1')])
+
+    def test_register_replaces_the_reservation(self):
+        directory = ShardDirectory(['default', 'shard1'])
+        with mock.patch.object(directory, 'choose_shard', return_value='default'):
+            directory.assign_shard('L1')
+        location = self.create_hierarchy()[0]
+        directory.register(location)
+        self.assertEqual(list(LocationShard.objects.values_list('location_id', 'shard')), [(location.pk, 'default')])
+
+
+class UpsertTests(CatalogTestCase):
+    def test_upsert_is_idempotent(self):
+        paths = [['L1', 'D1', 'C1', 'S1', 'P1'], ['L1', 'D1', 'C1', 'S1', 'P2']]
+        with self.committed():
+            first = self.client.post('/api/v1/products/upsert/', {'paths': paths}, format='json').json()
+        self.assertEqual(first['created'], {'location': 1, 'department': 1, 'category': 1, 'subcategory': 1,
+                                            'product': 2})
+        with self.committed():
+            second = self.client.post('/api/v1/products/upsert/', {'paths': paths}, format='json').json()
+        self.assertEqual(second['results'], first['results'])
+        self.assertEqual(sum(second['created'].values()), 0)
+        self.assertEqual(Product.objects.get(name='P1').location.name, 'L1')
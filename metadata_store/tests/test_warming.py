@@ -0,0 +1,66 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from metadata_store.models import Product
+from metadata_store.tests.base import CatalogTestCase
+from metadata_store.warming import CacheWarmer, TopKSketch, cache_warmer
+
+
+class TopKSketchTests(SimpleTestCase):
+    def test_keeps_most_frequent_items(self):
+        sketch = TopKSketch(2)
+        for item in ['a', 'a', 'a', 'b', 'b', 'c']:
+            sketch.record(item, item.upper())
+        self.assertEqual([item for item, value in sketch.top(2)][0], 'a')
+        self.assertEqual(len(sketch.counts), 2)
+        self.assertEqual(dict(sketch.top(2))['a'], 'A')
+
+
+class CacheWarmerTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.warmer = CacheWarmer(capacity=10, top_k=5, delay=0, rate=100)
+        for patcher in (mock.patch('metadata_store.utils.cache_warmer', self.warmer),
+                        mock.patch('metadata_store.invalidation.cache_warmer', self.warmer),
+                        mock.patch('metadata_store.warming.threading.Thread')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.location, self.department, self.category, self.subcategory = self.create_hierarchy()
+        self.products = self.create_products(self.subcategory, 2)
+
+    def drain(self):
+        warmed = []
+        while not self.warmer.queue.empty():
+            due, cache_key, replay = self.warmer.queue.get()
+            self.warmer.pending.discard(cache_key)
+            self.warmer.warm(cache_key, replay)
+            warmed.append(cache_key)
+        return warmed
+
+    def test_rewarms_invalidated_hot_keys(self):
+        for _ in range(3):
+            self.assertEqual(self.client.get('/api/v1/products/', {'page_size': 1}).status_code, 200)
+        self.client.get(f'/api/v1/products/{self.products[0].pk}/')
+        (list_key, _), = [(key, value) for key, value in self.warmer.sketch.top(5) if key.startswith('product_list:')]
+        with self.committed():
+            product = Product.objects.get(pk=self.products[1].pk)
+            product.name = 'Renamed'
+            product.save()
+        self.assertIsNone(cache.get(list_key))
+        self.assertIn(list_key, self.drain())
+        self.assertEqual([product['name'] for product in cache.get(list_key)['results']], ['Renamed'])
+
+    def test_burst_of_writes_warms_each_key_once(self):
+        self.client.get('/api/v1/products/')
+        with self.committed():
+            for product in Product.objects.filter(pk__in=[product.pk for product in self.products]):
+                product.name = f'{product.name}!'
+                product.save()
+        self.assertEqual(len(self.drain()), 1)
+
+    def test_disabled_warmer_records_nothing(self):
+        self.assertFalse(cache_warmer.enabled)
+        self.client.get('/api/v1/products/')
+        self.assertEqual(cache_warmer.sketch.top(5), [])
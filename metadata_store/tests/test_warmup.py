@@ -0,0 +1,85 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from rest_framework.test import APIClient
+
+from metadata_store import views
+from metadata_store.cache_stats import cache_stats
+from metadata_store.openapi import build_openapi_schema, openapi_schema
+from metadata_store.tests.base import CatalogTestCase
+from metadata_store.warmup import StartupWarmup, warm_hot_keys
+
+
+class StartupWarmupTests(SimpleTestCase):
+    def test_retries_required_steps_until_they_succeed(self):
+        connect = mock.Mock(side_effect=[OSError('refused'), 'connected'])
+        optional = mock.Mock(side_effect=ValueError('no index'))
+        warmup = StartupWarmup([('connections', connect, True), ('index', optional, False)], retry_interval=0,
+                               fork_timeout=1)
+        with self.assertLogs('metadata_store.warmup', 'ERROR'):
+            warmup.run()
+        status = warmup.status()
+        self.assertEqual((status['ready'], status['attempts']), (True, 2))
+        self.assertEqual(status['steps']['connections']['result'], 'connected')
+        self.assertEqual((status['steps']['index']['ok'], status['steps']['index']['error']), (False, 'no index'))
+        self.assertEqual(optional.call_count, 1)
+
+    def test_readiness_follows_the_warmup(self):
+        warmup = StartupWarmup([('step', lambda: None, True)], retry_interval=0, fork_timeout=1)
+        client = APIClient()
+        with mock.patch.object(views, 'startup_warmup', warmup):
+            self.assertEqual(client.get('/ready/').status_code, 503)
+            warmup.run()
+            response = client.get('/ready/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['ready'])
+
+    def test_disabled_warmup_is_ready(self):
+        self.assertTrue(StartupWarmup([], retry_interval=0, fork_timeout=1, enabled=False).status()['ready'])
+
+
+# The generation request's host isn't an allowed one, as in production.
+@override_settings(DEBUG=False, ALLOWED_HOSTS=['testserver'])
+class OpenAPISchemaTests(SimpleTestCase):
+    def test_schema_is_generated_once(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'openapi.json')
+        with mock.patch.object(openapi_schema, 'path', path), mock.patch.object(openapi_schema, 'content', None):
+            response = APIClient().get('/api/v1/schema/')
+            self.assertTrue(os.path.exists(path))
+            with mock.patch('metadata_store.openapi.write_openapi_schema') as write:
+                self.assertEqual(APIClient().get('/api/v1/schema/').content, response.content)
+            write.assert_not_called()
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('/products/', json.loads(response.content)['paths'])
+        self.assertNotIn('host', json.loads(response.content))
+
+    def test_schema_points_to_the_configured_url(self):
+        schema = json.loads(build_openapi_schema('https://catalog.example.com'))
+        self.assertEqual((schema['host'], schema['schemes'], schema['basePath']),
+                         ('catalog.example.com', ['https'], '/api/v1'))
+
+
+@unittest.skipUnless(settings.CACHES['default']['BACKEND'].startswith('django_redis.'), 'needs Redis')
+class HotKeyWarmupTests(CatalogTestCase):
+    def test_restores_evicted_hot_products(self):
+        patcher = mock.patch.object(cache_stats, 'enabled', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(cache_stats.reset)
+        products = self.create_products(self.create_hierarchy()[3], 2)
+        for product in products:
+            for query in ('', '?fields=name'):
+                self.client.get(f'/api/v1/products/{product.pk}/{query}')
+                self.client.get(f'/api/v1/products/{product.pk}/{query}')
+        cache_stats.flush()
+        cache.delete(f'product_retrieve:{products[0].pk}:')
+        self.assertEqual(warm_hot_keys(), 1)
+        self.assertEqual(cache.get(f'product_retrieve:{products[0].pk}:')['name'], products[0].name)
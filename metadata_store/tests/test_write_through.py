@@ -0,0 +1,52 @@
+import unittest
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from metadata_store.models import Product
+from metadata_store.tests.base import CatalogTestCase
+from metadata_store.write_through import (DELETED_VERSION, PRODUCT_CACHE_WRITE_THROUGH, get_version,
+                                          get_version_key, refresh_products)
+
+
+@unittest.skipUnless(settings.CACHES['default']['BACKEND'].startswith('django_redis.'), 'needs Redis')
+@unittest.skipUnless(PRODUCT_CACHE_WRITE_THROUGH, 'PRODUCT_CACHE_WRITE_THROUGH is off')
+class WriteThroughTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.subcategory = self.create_hierarchy()[3]
+        self.product = self.create_products(self.subcategory, 1)[0]
+        self.url = f'/api/v1/products/{self.product.pk}/'
+
+    def get_cached_shapes(self):
+        return sorted(key.split(':')[2] for key in cache.keys(f'product_retrieve:{self.product.pk}:*'))
+
+    def test_save_rewrites_cached_shapes(self):
+        for query in ('', '?detail=true', '?fields=name'):
+            self.client.get(f'{self.url}{query}')
+        with self.committed():
+            response = self.client.put(self.url, {'name': 'Renamed', 'subcategory': str(self.subcategory.pk)},
+                                       format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_cached_shapes(), ['', 'detail=true'])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'{self.url}?detail=true')
+        self.assertEqual(response.json()['name'], 'Renamed')
+        self.assertFalse([query for query in queries.captured_queries if 'metadata_store_product' in query['sql']])
+
+    def test_older_refresh_does_not_overwrite(self):
+        refresh_products([(self.product._state.db, self.product.pk)])
+        Product.objects.filter(pk=self.product.pk).update(name='Direct')
+        cache.set(get_version_key(self.product.pk), get_version(self.product) + 1)
+        refresh_products([(self.product._state.db, self.product.pk)])
+        self.assertEqual(cache.get(f'product_retrieve:{self.product.pk}:')['name'], 'P0')
+
+    def test_delete_drops_cached_shapes(self):
+        self.client.get(self.url)
+        with self.committed():
+            Product.objects.get(pk=self.product.pk).delete()
+        self.assertEqual(self.get_cached_shapes(), [])
+        self.assertEqual(cache.get(get_version_key(self.product.pk)), DELETED_VERSION)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
@@ -0,0 +1,206 @@
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from metadata_store.utils import str_to_bool
+
+logger = logging.getLogger(__name__)
+
+THROTTLE_COSTS = getattr(settings, 'THROTTLE_COSTS', {})
+LOAD_SHEDDING_LATENCY = getattr(settings, 'LOAD_SHEDDING_LATENCY', None)
+LOAD_SHEDDING_MIN_COST = getattr(settings, 'LOAD_SHEDDING_MIN_COST', 2)
+LOAD_SHEDDING_RETRY_AFTER = getattr(settings, 'LOAD_SHEDDING_RETRY_AFTER', 5)
+
+# Refills the bucket by elapsed time, then takes the cost if enough tokens are left.
+# Uses the Redis clock so every worker agrees on time. Returns {allowed, seconds to wait}.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local refill_rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'timestamp')
+local tokens = tonumber(bucket[1]) or capacity
+local timestamp = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - timestamp) * refill_rate)
+local allowed = 0
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    wait = (cost - tokens) / refill_rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'timestamp', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / refill_rate) + 1)
+return {allowed, tostring(wait)}
+"""
+
+
+def get_request_cost(request, view):
+    """
+    Returns how many tokens a request costs, from the ``THROTTLE_COSTS`` weights.
+
+    The cost of the view action (1 by default) is multiplied by the ``detail`` weight
+    for ``detail=true`` requests and by the number of default sized pages requested.
+
+    Args:
+        request (Request): The HTTP request.
+        view (APIView): The view handling the request.
+
+    Returns:
+        int: The cost of the request.
+    """
+    cost = THROTTLE_COSTS.get(getattr(view, 'action', None), 1)
+    if str_to_bool(request.query_params.get('detail', 'false')):
+        cost *= THROTTLE_COSTS.get('detail', 1)
+    page_size = request.query_params.get('page_size')
+    if page_size and page_size.isdigit() and api_settings.PAGE_SIZE:
+        cost *= max(1, math.ceil(int(page_size) / api_settings.PAGE_SIZE))
+    return cost
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Token bucket rate limiting per user (or client IP) and per view ``throttle_scope``,
+    kept in Redis and updated atomically by a Lua script so limits hold across workers.
+
+    A rate of ``600/min`` for a scope in ``DEFAULT_THROTTLE_RATES`` allows bursts of 600
+    tokens refilled at 10 per second. Requests cost tokens as computed by
+    `get_request_cost`. Throttled responses carry a ``Retry-After`` header.
+    """
+    default_scope = 'default'
+
+    def __init__(self):
+        self.wait_seconds = None
+
+    def get_rate(self, scope):
+        """
+        Parses the rate of a scope into a bucket capacity and a refill rate per second.
+
+        Args:
+            scope (str): The throttle scope.
+
+        Returns:
+            tuple: ``(capacity, refill_rate)``, or None if the scope isn't rate limited.
+        """
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+        if rate is None:
+            return None
+        num, period = rate.split('/')
+        duration = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+        return int(num), int(num) / duration
+
+    def allow_request(self, request, view):
+        """
+        Takes the cost of the request from the caller's bucket.
+
+        Args:
+            request (Request): The HTTP request.
+            view (APIView): The view handling the request.
+
+        Returns:
+            bool: Whether the request is allowed.
+        """
+        scope = getattr(view, 'throttle_scope', None) or self.default_scope
+        rate = self.get_rate(scope)
+        if rate is None:
+            return True
+        capacity, refill_rate = rate
+        ident = request.user.pk if request.user and request.user.is_authenticated else self.get_ident(request)
+        cost = min(get_request_cost(request, view), capacity)
+        try:
+            client = get_redis_connection('default')
+            allowed, wait = client.eval(TOKEN_BUCKET_SCRIPT, 1, f"throttle:{scope}:{ident}",
+                                        capacity, refill_rate, cost)
+        except RedisError:
+            logger.exception("Rate limiting is unavailable, allowing the request")
+            return True
+        self.wait_seconds = float(wait)
+        return bool(allowed)
+
+    def wait(self):
+        """
+        Returns the number of seconds until the request would be allowed, rounded up to
+        whole seconds as ``Retry-After`` requires, and at least 1.
+
+        Returns:
+            int: The seconds to wait, used for the ``Retry-After`` header.
+        """
+        if self.wait_seconds is None:
+            return None
+        return max(1, math.ceil(self.wait_seconds))
+
+
+class DatabaseLatencyTracker:
+    """
+    Exponentially weighted moving average of the database query latency in this process.
+    """
+    def __init__(self, alpha=0.05):
+        self.alpha = alpha
+        self.average = 0.0
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        """
+        Database execute wrapper timing each query.
+        """
+        started_at = time.monotonic()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.record(time.monotonic() - started_at)
+
+    def record(self, seconds):
+        """
+        Adds a query duration to the average.
+
+        Args:
+            seconds (float): The query duration.
+        """
+        with self.lock:
+            self.average += self.alpha * (seconds - self.average)
+
+
+db_latency = DatabaseLatencyTracker()
+
+
+class LoadSheddingThrottle(BaseThrottle):
+    """
+    Rejects expensive reads while the average database query latency is above
+    ``LOAD_SHEDDING_LATENCY`` seconds, so cheap and write traffic keeps being served.
+
+    Reads are shed when their `get_request_cost` is at least ``LOAD_SHEDDING_MIN_COST``.
+    """
+    def allow_request(self, request, view):
+        """
+        Checks whether the request may be served under the current database latency.
+
+        Args:
+            request (Request): The HTTP request.
+            view (APIView): The view handling the request.
+
+        Returns:
+            bool: Whether the request is allowed.
+        """
+        if LOAD_SHEDDING_LATENCY is None or db_latency.average <= LOAD_SHEDDING_LATENCY:
+            return True
+        if request.method != 'GET':
+            return True
+        return get_request_cost(request, view) < LOAD_SHEDDING_MIN_COST
+
+    def wait(self):
+        """
+        Returns the number of seconds clients should back off while load is shed.
+
+        Returns:
+            int: The seconds to wait.
+        """
+        return LOAD_SHEDDING_RETRY_AFTER
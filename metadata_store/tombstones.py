@@ -0,0 +1,56 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from metadata_store.models import Tombstone
+from metadata_store.sharding import CATALOG_SHARDS
+
+TOMBSTONE_RETENTION = getattr(settings, 'TOMBSTONE_RETENTION', None)
+TOMBSTONE_PRUNE_CHUNK_SIZE = getattr(settings, 'TOMBSTONE_PRUNE_CHUNK_SIZE', 5000)
+
+
+def get_retention_cutoff(retention=TOMBSTONE_RETENTION):
+    """
+    Returns the time before which tombstones may have been pruned.
+
+    Args:
+        retention (int): The retention of tombstones in seconds, or None to keep them forever.
+
+    Returns:
+        datetime: The cutoff, or None if tombstones are kept forever.
+    """
+    if retention is None:
+        return None
+    return timezone.now() - timedelta(seconds=retention)
+
+
+def prune_tombstones(retention=TOMBSTONE_RETENTION, chunk_size=TOMBSTONE_PRUNE_CHUNK_SIZE, dry_run=False):
+    """
+    Deletes the tombstones older than the retention from every shard, in chunks so no
+    transaction holds many rows at once. Change feed cursors older than the retention
+    are answered with a reset.
+
+    Args:
+        retention (int): The retention of tombstones in seconds.
+        chunk_size (int): The number of tombstones deleted per statement.
+        dry_run (bool): Whether to only count the tombstones that would be deleted.
+
+    Returns:
+        dict: The number of tombstones deleted, or to delete, per shard.
+    """
+    cutoff = get_retention_cutoff(retention)
+    pruned = {}
+    for alias in CATALOG_SHARDS:
+        expired = Tombstone.objects.using(alias).filter(updated_at__lt=cutoff)
+        if dry_run:
+            pruned[alias] = expired.count()
+            continue
+        pruned[alias] = 0
+        while True:
+            pks = list(expired.order_by('updated_at').values_list('pk', flat=True)[:chunk_size])
+            if not pks:
+                break
+            Tombstone.objects.using(alias).filter(pk__in=pks).delete()
+            pruned[alias] += len(pks)
+    return pruned
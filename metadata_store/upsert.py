@@ -0,0 +1,92 @@
+from collections import Counter
+
+from django.db import transaction
+
+from metadata_store.bloom import product_id_filter
+from metadata_store.counters import adjust_product_counts
+from metadata_store.events import HIERARCHY_LEVELS, make_event, publish_events
+from metadata_store.models import Location, Department, Category, SubCategory, Product
+from metadata_store.partitioning import create_partition
+from metadata_store.shard_directory import shard_directory
+from metadata_store.sharding import get_catalog_db
+from metadata_store.signals import clear_product_list_caches
+
+# Each level of a product path with the foreign key to the previous level.
+PATH_LEVELS = [
+    (Location, None),
+    (Department, 'location'),
+    (Category, 'department'),
+    (SubCategory, 'category'),
+    (Product, 'subcategory'),
+]
+
+
+def upsert_paths(paths, batch_size=1000):
+    """
+    Resolves or creates products addressed by their name path, creating missing ancestors.
+
+    Every level is written with a single ``INSERT ... ON CONFLICT DO NOTHING`` against the
+    level's unique constraint and read back with a single query, so a batch costs two
+    queries per level however many paths it holds. Natural keys resolved for one level are
+    reused for all paths sharing them.
+
+    Args:
+        paths (list): Name paths of the form ``[location, department, category, subcategory, product]``.
+        batch_size (int): The number of rows per INSERT statement.
+
+    Returns:
+        tuple: The product id of each path, in order, and the number of created objects per model name.
+    """
+    resolved = {}
+    created = {}
+    created_products = []
+    created_locations = []
+    events = []
+    with transaction.atomic(using=get_catalog_db()):
+        for depth, (model, parent_field) in enumerate(PATH_LEVELS):
+            keys = list(dict.fromkeys(tuple(path[:depth + 1]) for path in paths))
+            pending = {}
+            for key in keys:
+                fields = {'name': key[-1]}
+                if parent_field:
+                    fields[f'{parent_field}_id'] = resolved[key[:-1]]
+                if model is Product:
+                    fields['location_id'] = resolved[key[:1]]
+                pending[key] = model(**fields)
+            model.objects.bulk_create(pending.values(), batch_size=batch_size, ignore_conflicts=True)
+
+            queryset = model.objects.filter(name__in={key[-1] for key in keys})
+            if parent_field:
+                parent_column = f'{parent_field}_id'
+                queryset = queryset.filter(**{f'{parent_column}__in': {resolved[key[:-1]] for key in keys}})
+                existing = {(parent_id, name): pk for pk, parent_id, name in
+                            queryset.values_list('pk', parent_column, 'name')}
+            else:
+                existing = {(None, name): pk for pk, name in queryset.values_list('pk', 'name')}
+
+            created[model._meta.model_name] = 0
+            for key in keys:
+                parent_id = resolved[key[:-1]] if parent_field else None
+                resolved[key] = existing[(parent_id, key[-1])]
+                if resolved[key] == pending[key].pk:
+                    created[model._meta.model_name] += 1
+                    events.append(make_event('create', model._meta.model_name, resolved[key], key[-1],
+                                             dict(zip(HIERARCHY_LEVELS, key))))
+                    if model is Product:
+                        created_products.append(pending[key])
+                    elif model is Location:
+                        created_locations.append(pending[key])
+                        create_partition(pending[key].pk, using=get_catalog_db())
+
+        if created_locations:
+            transaction.on_commit(lambda: [shard_directory.register(location) for location in created_locations],
+                                  using=get_catalog_db())
+        for product in created_products:
+            product_id_filter.add(product.pk)
+        if created_products:
+            subcategory_ids = {product.subcategory_id for product in created_products}
+            adjust_product_counts(Counter(product.subcategory_id for product in created_products))
+            transaction.on_commit(lambda: clear_product_list_caches(subcategory_ids), using=get_catalog_db())
+        publish_events(events, using=get_catalog_db())
+
+    return [resolved[tuple(path)] for path in paths], created
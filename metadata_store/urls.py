@@ -1,12 +1,21 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework_nested.routers import NestedSimpleRouter
-from metadata_store.views import LocationViewSet, DepartmentViewSet, CategoryViewSet, SubCategoryViewSet, ProductViewSet
+from metadata_store.views import (LocationViewSet, DepartmentViewSet, CategoryViewSet, SubCategoryViewSet, ProductViewSet,
+                                  ChangeFeedViewSet, DeleteJobViewSet, BatchViewSet,
+                                  AutocompleteViewSet, SnapshotViewSet, HierarchyViewSet, MemoryProfileViewSet)
 
 
 router = DefaultRouter()
 router.register(r'locations', LocationViewSet)
 router.register(r'products', ProductViewSet, basename="products")
+router.register(r'changes', ChangeFeedViewSet, basename="changes")
+router.register(r'delete-jobs', DeleteJobViewSet, basename="delete-jobs")
+router.register(r'batch', BatchViewSet, basename="batch")
+router.register(r'autocomplete', AutocompleteViewSet, basename="autocomplete")
+router.register(r'snapshot', SnapshotViewSet, basename="snapshot")
+router.register(r'hierarchy', HierarchyViewSet, basename="hierarchy")
+router.register(r'memory', MemoryProfileViewSet, basename="memory")
 
 
 locations_router = NestedSimpleRouter(router, r'locations', lookup='location')
@@ -1,9 +1,121 @@
+import hashlib
 from functools import wraps
+from itertools import combinations
+from urllib.parse import urlencode
 from django.core.cache import cache
 from django.conf import settings
+from django.http import Http404, QueryDict
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from metadata_store.cache_stats import cache_stats
+from metadata_store.memory_profiling import memory_phase
+from metadata_store.warming import cache_warmer
 
 CACHE_TTL = getattr(settings, 'CACHE_TTL', 15 * 60)
+NEGATIVE_CACHE_TTL = getattr(settings, 'NEGATIVE_CACHE_TTL', 30)
+PRODUCT_LIST_CACHE_MODE = getattr(settings, 'PRODUCT_LIST_CACHE_MODE', 'pages')
+PRODUCT_FILTER_PARAMS = ('location_name', 'department_name', 'category_name', 'subcategory_name')
+
+# The query parameters cached responses depend on; any other parameter is left out of
+# cache keys. Canonical queries longer than CACHE_KEY_MAX_QUERY_LENGTH are hashed.
+CACHE_KEY_BOOLEAN_PARAMS = {'detail': False}
+CACHE_KEY_LIST_PARAMS = ('fields', 'expand')
+CACHE_KEY_PARAMS = ('page', 'page_size', *CACHE_KEY_BOOLEAN_PARAMS, *CACHE_KEY_LIST_PARAMS, *PRODUCT_FILTER_PARAMS)
+CACHE_KEY_MAX_QUERY_LENGTH = getattr(settings, 'CACHE_KEY_MAX_QUERY_LENGTH', 200)
+
+
+def canonicalize_query(query_params):
+    """
+    Reduces query parameters to a canonical string, so requests the views answer the same
+    way share a cache key.
+
+    Parameters outside ``CACHE_KEY_PARAMS`` and empty ones are dropped, as are values equal
+    to the default (``page=1``, ``detail=false``, ``page_size`` of the API's page size).
+    The last value of a repeated parameter is kept, like the views read it. Booleans are
+    spelled ``true``, numbers lose their leading zeros, ``fields`` and ``expand`` are sorted
+    and deduplicated, and the parameters are sorted by name.
+
+    Args:
+        query_params (QueryDict): The query parameters, or an urlencoded query string.
+
+    Returns:
+        str: The canonical query, e.g. ``detail=true&page=2``, or ``h=<digest>`` when it
+        is longer than ``CACHE_KEY_MAX_QUERY_LENGTH``.
+    """
+    if isinstance(query_params, str):
+        query_params = QueryDict(query_params)
+    params = []
+    for name in CACHE_KEY_PARAMS:
+        value = query_params.get(name, '').strip()
+        if name in CACHE_KEY_BOOLEAN_PARAMS:
+            value = str(str_to_bool(value)).lower() if value else ''
+            if value == str(CACHE_KEY_BOOLEAN_PARAMS[name]).lower():
+                continue
+        elif name in CACHE_KEY_LIST_PARAMS:
+            value = ','.join(sorted(set(str_to_list(value))))
+        elif name in ('page', 'page_size') and value.isdigit():
+            value = str(int(value))
+            if value == str(1 if name == 'page' else api_settings.PAGE_SIZE):
+                continue
+        if value:
+            params.append((name, value))
+    query = urlencode(sorted(params))
+    if len(query) > CACHE_KEY_MAX_QUERY_LENGTH:
+        query = f"h={hashlib.blake2b(query.encode(), digest_size=16).hexdigest()}"
+    return query
+
+
+def get_cache_key(prefix, path_params, query_params):
+    """
+    Builds the cache key used by `cache_response`.
+
+    Args:
+        prefix (str): The prefix for the cache key.
+        path_params (iterable): The URL path parameters, e.g. the object's pk.
+        query_params (QueryDict): The query parameters, or an urlencoded query string;
+            reduced with `canonicalize_query`.
+
+    Returns:
+        str: The cache key, ``{prefix}:{path_params}:{canonical query}``.
+    """
+    path_params = ":".join([str(param) for param in path_params])
+    return f"{prefix}:{path_params}:{canonicalize_query(query_params)}"
+
+
+def get_filter_key(filters):
+    """
+    Builds a canonical, glob-safe string out of product list filters.
+
+    Args:
+        filters (dict): Filter parameter names mapped to their values; empty values are ignored.
+
+    Returns:
+        str: The urlencoded filters sorted by name, e.g. ``category_name=Bakery&location_name=Perth``.
+    """
+    return urlencode(sorted((name, value) for name, value in filters.items() if value))
+
+
+def get_product_filter_keys(location_name, department_name, category_name, subcategory_name):
+    """
+    Returns the filter keys of every product list a product with the given hierarchy appears in,
+    i.e. one per combination of the product filters, including the unfiltered list.
+
+    Args:
+        location_name (str): The name of the product's location.
+        department_name (str): The name of the product's department.
+        category_name (str): The name of the product's category.
+        subcategory_name (str): The name of the product's subcategory.
+
+    Returns:
+        list: The filter keys.
+    """
+    names = dict(zip(PRODUCT_FILTER_PARAMS, (location_name, department_name, category_name, subcategory_name)))
+    return [
+        get_filter_key({param: names[param] for param in params})
+        for size in range(len(PRODUCT_FILTER_PARAMS) + 1)
+        for params in combinations(PRODUCT_FILTER_PARAMS, size)
+    ]
 
 
 def cache_response(prefix):
@@ -19,19 +131,98 @@ def cache_response(prefix):
     def decorator(viewset_method):
         @wraps(viewset_method)
         def wrapped_viewset_method(self, request, *args, **kwargs):
-            query_params = request.GET.urlencode()
-            path_params = ":".join([str(kwargs.get(k)) for k in kwargs.keys()])
-            # TODO: key can still be improved by sorting the query params
-            cache_key = f"{prefix}:{path_params}:{query_params}"
-            cached_data = cache.get(cache_key)
+            cache_key = get_cache_key(prefix, kwargs.values(), request.GET)
+            cache_warmer.record(cache_key, self, viewset_method.__name__, request, kwargs)
+            with memory_phase('cache'):
+                cached_data = cache.get(cache_key)
             if cached_data:
+                cache_stats.record_hits(prefix, [cache_key])
                 return Response(cached_data)
+            cache_stats.record_misses(prefix)
             response = viewset_method(self, request, *args, **kwargs)
-            cache.set(cache_key, response.data, CACHE_TTL)
+            with memory_phase('cache'):
+                cache.set(cache_key, response.data, CACHE_TTL)
+            cache_stats.record_sets(prefix, {cache_key: response.data})
             return response
         return wrapped_viewset_method
     return decorator
 
 
+def cache_not_found(prefix):
+    """
+    Decorator that caches failed lookups of a retrieve/list viewset method for a short time.
+
+    Not found errors and the validation errors raised when a parent in the URL doesn't own
+    the next one are cached under ``not_found:{prefix}:{path_params}:{query_params}`` for
+    ``NEGATIVE_CACHE_TTL`` seconds and replayed without touching the database. Entries are
+    cleared when an object whose id appears in the key is saved.
+
+    Args:
+        prefix (str): The prefix for the cache key.
+
+    Returns:
+        function: The wrapped viewset method that caches its failed lookups.
+    """
+    def decorator(viewset_method):
+        @wraps(viewset_method)
+        def wrapped_viewset_method(self, request, *args, **kwargs):
+            path_params = [str(value).lower() for value in kwargs.values()]
+            cache_key = get_cache_key(f"not_found:{prefix}", path_params, request.GET)
+            with memory_phase('cache'):
+                cached_error = cache.get(cache_key)
+            if cached_error is not None:
+                cache_stats.record_hits(f"not_found:{prefix}", [cache_key])
+                status_code, data = cached_error
+                return Response(data, status=status_code)
+            cache_stats.record_misses(f"not_found:{prefix}")
+            try:
+                return viewset_method(self, request, *args, **kwargs)
+            except (Http404, NotFound, ValidationError) as exc:
+                if isinstance(exc, Http404):
+                    exc = NotFound()
+                data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+                cache.set(cache_key, (exc.status_code, data), NEGATIVE_CACHE_TTL)
+                cache_stats.record_sets(f"not_found:{prefix}", {cache_key: (exc.status_code, data)})
+                raise exc
+        return wrapped_viewset_method
+    return decorator
+
+
 def str_to_bool(value):
     return value.lower() in ('true', '1', 'yes')
+
+
+def str_to_list(value):
+    """
+    Splits a comma separated query parameter into a list of non-empty, stripped items.
+
+    Args:
+        value (str): The raw parameter value, may be None.
+
+    Returns:
+        list: The parsed items.
+    """
+    if not value:
+        return []
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def build_path_tree(paths):
+    """
+    Builds a nested dict out of dotted paths, e.g. ``['a.b', 'a.c', 'd']`` becomes
+    ``{'a': {'b': {}, 'c': {}}, 'd': {}}``.
+
+    Args:
+        paths (iterable): Dotted paths, or an already built tree.
+
+    Returns:
+        dict: The path tree.
+    """
+    if isinstance(paths, dict):
+        return paths
+    tree = {}
+    for path in paths or []:
+        node = tree
+        for part in path.split('.'):
+            node = node.setdefault(part, {})
+    return tree
@@ -1,15 +1,212 @@
-from rest_framework import viewsets
-from rest_framework.exceptions import ValidationError
-from rest_framework.permissions import IsAuthenticated
-from metadata_store.utils import str_to_bool, cache_response
-from metadata_store.models import Location, Department, Category, SubCategory, Product
+import uuid
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Subquery
+from django.http import Http404, HttpResponse
+from django.urls import reverse
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import APIException, NotFound, ValidationError
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from metadata_store.utils import (str_to_bool, str_to_list, cache_response, cache_not_found, canonicalize_query,
+                                  get_cache_key, get_filter_key, CACHE_TTL,
+                                  PRODUCT_LIST_CACHE_MODE, PRODUCT_FILTER_PARAMS)
+from metadata_store.autocomplete import autocomplete, AUTOCOMPLETE_MODELS
+from metadata_store.batch import dispatch_batch
+from metadata_store.bloom import product_id_filter
+from metadata_store.cache_stats import cache_stats
+from metadata_store.deletion import delete_subtree, get_delete_job, start_delete_job
+from metadata_store.reorganize import (REORGANIZE_MODELS, HierarchyConflict, ReorganizeError, get_parent_model,
+                                       merge_nodes, move_nodes, rename_nodes)
+from metadata_store.upsert import upsert_paths
+from metadata_store.memory_profiling import memory_phase, memory_profiler
+from metadata_store.openapi import openapi_schema
+from metadata_store.models import Location, Department, Category, SubCategory, Product, Tombstone
+from metadata_store.pagination import ChangeFeedPagination, ProductPageNumberPagination
+from metadata_store.throttling import LoadSheddingThrottle
+from metadata_store.shard_directory import shard_directory
+from metadata_store.snapshots import SNAPSHOT_MODELS, SnapshotError, catalog_snapshot
+from metadata_store.sharding import CATALOG_SHARDS, ShardedQuerySet, current_shard, locate, use_shard
+from metadata_store.warmup import startup_warmup
 from metadata_store.serializers import (LocationSerializer, DepartmentSerializer, DepartmentDetailSerializer,
                                         CategorySerializer, CategoryDetailSerializer,
                                         SubCategorySerializer, SubCategoryDetailSerializer,
-                                        ProductSerializer, ProductDetailSerializer)
+                                        ProductSerializer, ProductDetailSerializer, ProductPathUpsertSerializer,
+                                        BatchRequestSerializer, HierarchyMoveSerializer, HierarchyMergeSerializer,
+                                        HierarchyRenameSerializer)
 
 
-class LocationViewSet(viewsets.ModelViewSet):
+class ShardedViewSetMixin:
+    """
+    ViewSet mixin routing each request to the catalog shard holding the data it addresses.
+
+    The shard is chosen by `get_shard` once the request is authenticated, from the
+    ``location_pk`` of nested routes by default. Requests without a shard scatter-gather:
+    lists are merged across shards by their ordering, and detail lookups query the shards
+    in turn and then stick to the one holding the object.
+    """
+    def dispatch(self, request, *args, **kwargs):
+        with use_shard(None):
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        """
+        Selects the shard of the request after the authentication and permission checks.
+
+        Args:
+            request (Request): The HTTP request.
+            *args: Additional positional arguments.
+            **kwargs: Additional keyword arguments.
+        """
+        super().initial(request, *args, **kwargs)
+        current_shard.set(self.get_shard(request, kwargs))
+
+    def get_shard(self, request, kwargs):
+        """
+        Returns the shard a request goes to.
+
+        Args:
+            request (Request): The HTTP request.
+            kwargs (dict): The URL keyword arguments.
+
+        Returns:
+            str: The database alias of the shard, or None to scatter-gather.
+        """
+        if 'location_pk' in kwargs:
+            return shard_directory.get_shard(kwargs['location_pk'])
+        return None
+
+    def is_scattered(self):
+        """
+        Checks whether the request runs on every shard.
+
+        Returns:
+            bool: True when no shard was selected and the catalog has several shards.
+        """
+        return current_shard.get() is None and len(CATALOG_SHARDS) > 1
+
+    def get_shard_querysets(self, queryset):
+        """
+        Returns the queryset to run on each shard the request covers.
+
+        Args:
+            queryset (QuerySet): The queryset.
+
+        Returns:
+            list: The queryset bound to each shard, or the queryset itself when a shard is selected.
+        """
+        if self.is_scattered():
+            return [queryset.using(alias) for alias in CATALOG_SHARDS]
+        return [queryset]
+
+    def paginate_queryset(self, queryset):
+        """
+        Paginates the queryset, merged across the shards when no shard is selected.
+
+        Args:
+            queryset (QuerySet): The queryset to paginate.
+
+        Returns:
+            list: The objects of the page.
+        """
+        if self.is_scattered():
+            queryset = ShardedQuerySet(queryset, CATALOG_SHARDS)
+        with memory_phase('queryset'):
+            return super().paginate_queryset(queryset)
+
+    def get_object(self):
+        """
+        Returns the object of a detail route, looking it up on every shard when none is
+        selected and selecting the one holding it for the rest of the request.
+
+        Returns:
+            Model: The object.
+
+        Raises:
+            Http404: If no shard holds the object.
+        """
+        with memory_phase('queryset'):
+            if not self.is_scattered():
+                return super().get_object()
+            for alias in CATALOG_SHARDS:
+                current_shard.set(alias)
+                try:
+                    return super().get_object()
+                except Http404:
+                    continue
+            current_shard.set(None)
+            raise Http404
+
+
+class SparseFieldsetMixin:
+    """
+    ViewSet mixin wiring the ``fields`` and ``expand`` query parameters into the serializer.
+
+    On GET requests the queryset is also restricted to the joins and columns the
+    serializer needs to render the requested fields.
+    """
+    def get_serializer(self, *args, **kwargs):
+        """
+        Passes the requested fields and expansions to the serializer on GET requests.
+
+        Returns:
+            Serializer: The serializer instance.
+        """
+        if self.request.method == 'GET':
+            kwargs.setdefault('fields', str_to_list(self.request.query_params.get('fields')))
+            kwargs.setdefault('expand', str_to_list(self.request.query_params.get('expand')))
+        return super().get_serializer(*args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        """
+        Applies the serializer's select_related/only plan to the queryset on GET requests.
+
+        Args:
+            queryset (QuerySet): The queryset to filter.
+
+        Returns:
+            QuerySet: The filtered queryset.
+        """
+        queryset = super().filter_queryset(queryset)
+        if self.request.method == 'GET':
+            queryset = self.get_serializer().optimize_queryset(queryset)
+        return queryset
+
+
+class SubtreeDeleteMixin:
+    """
+    ViewSet mixin deleting hierarchy nodes with set-based, chunked deletes of their subtree.
+
+    With ``?async=true`` the delete runs in the background and the response carries a job
+    whose status can be polled at ``delete-jobs/{id}/``.
+    """
+    def destroy(self, request, *args, **kwargs):
+        """
+        Deletes the node and everything under it.
+
+        Args:
+            request (Request): The HTTP request.
+            *args: Additional positional arguments.
+            **kwargs: Additional keyword arguments.
+
+        Returns:
+            Response: The HTTP response.
+        """
+        instance = self.get_object()
+        if str_to_bool(request.query_params.get('async', 'false')):
+            return Response(start_delete_job(instance), status=status.HTTP_202_ACCEPTED)
+        delete_subtree(instance)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class LocationViewSet(ShardedViewSetMixin, SparseFieldsetMixin, SubtreeDeleteMixin, viewsets.ModelViewSet):
     """
     ViewSet for the Location model.
 
@@ -19,13 +216,62 @@ class LocationViewSet(viewsets.ModelViewSet):
         queryset (QuerySet): The queryset to retrieve all locations, ordered by creation date.
         serializer_class (Serializer): The serializer class used for this ViewSet.
         permission_classes (list): The list of permissions required for this ViewSet.
+        throttle_scope (str): The rate limit bucket of this ViewSet.
     """
     queryset = Location.objects.all().order_by('-created_at')
     serializer_class = LocationSerializer
     permission_classes = [IsAuthenticated]
+    throttle_scope = 'catalog'
+
+    def get_shard(self, request, kwargs):
+        """
+        Routes location detail routes to the location's shard and new locations to the
+        least loaded shard; lists are gathered from every shard.
+
+        Args:
+            request (Request): The HTTP request.
+            kwargs (dict): The URL keyword arguments.
+
+        Returns:
+            str: The database alias of the shard, or None to scatter-gather.
+        """
+        if 'pk' in kwargs:
+            return shard_directory.get_shard(kwargs['pk'])
+        if self.action == 'create':
+            return shard_directory.choose_shard()
+        return None
+
+    def perform_create(self, serializer):
+        """
+        Creates the location, checking that its name is unique across all shards.
+
+        Args:
+            serializer (Serializer): The validated serializer.
+
+        Raises:
+            ValidationError: If another shard holds a location with the same name.
+        """
+        if len(CATALOG_SHARDS) > 1 and shard_directory.get_shard_by_name(serializer.validated_data['name']):
+            raise ValidationError({'name': ["location with this name already exists."]})
+        serializer.save()
+
+    @cache_not_found('location_retrieve')
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Overrides the retrieve method to cache failed lookups.
+
+        Args:
+            request (Request): The HTTP request.
+            *args: Additional positional arguments.
+            **kwargs: Additional keyword arguments.
+
+        Returns:
+            Response: The HTTP response.
+        """
+        return super().retrieve(request, *args, **kwargs)
 
 
-class DepartmentViewSet(viewsets.ModelViewSet):
+class DepartmentViewSet(ShardedViewSetMixin, SparseFieldsetMixin, SubtreeDeleteMixin, viewsets.ModelViewSet):
     """
     ViewSet for the Department model.
 
@@ -34,9 +280,11 @@ class DepartmentViewSet(viewsets.ModelViewSet):
     Attributes:
         serializer_class (Serializer): The serializer class used for this ViewSet.
         permission_classes (list): The list of permissions required for this ViewSet.
+        throttle_scope (str): The rate limit bucket of this ViewSet.
     """
     serializer_class = DepartmentSerializer
     permission_classes = [IsAuthenticated]
+    throttle_scope = 'catalog'
 
     def get_queryset(self):
         """
@@ -45,6 +293,9 @@ class DepartmentViewSet(viewsets.ModelViewSet):
         Returns:
             QuerySet: The filtered queryset of departments.
         """
+        if getattr(self, 'swagger_fake_view', False):
+            # Inspected for the OpenAPI document, without URL kwargs.
+            return Department.objects.none()
         location_id = self.kwargs['location_pk']
         return Department.objects.filter(location_id=location_id).order_by('-created_at')
 
@@ -67,11 +318,26 @@ class DepartmentViewSet(viewsets.ModelViewSet):
             dict: The context dictionary.
         """
         context = super().get_serializer_context()
-        context['location_pk'] = self.kwargs['location_pk']
+        context['location_pk'] = self.kwargs.get('location_pk')
         return context
 
+    @cache_not_found('department_retrieve')
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Overrides the retrieve method to cache failed lookups.
+
+        Args:
+            request (Request): The HTTP request.
+            *args: Additional positional arguments.
+            **kwargs: Additional keyword arguments.
+
+        Returns:
+            Response: The HTTP response.
+        """
+        return super().retrieve(request, *args, **kwargs)
+
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(ShardedViewSetMixin, SparseFieldsetMixin, SubtreeDeleteMixin, viewsets.ModelViewSet):
     """
     ViewSet for the Category model.
 
@@ -80,9 +346,11 @@ class CategoryViewSet(viewsets.ModelViewSet):
     Attributes:
         serializer_class (Serializer): The serializer class used for this ViewSet.
         permission_classes (list): The list of permissions required for this ViewSet.
+        throttle_scope (str): The rate limit bucket of this ViewSet.
     """
     serializer_class = CategorySerializer
     permission_classes = [IsAuthenticated]
+    throttle_scope = 'catalog'
 
     def get_queryset(self):
         """
@@ -91,6 +359,9 @@ class CategoryViewSet(viewsets.ModelViewSet):
         Returns:
             QuerySet: The filtered queryset of categories.
         """
+        if getattr(self, 'swagger_fake_view', False):
+            # Inspected for the OpenAPI document, without URL kwargs.
+            return Category.objects.none()
         department_id = self.kwargs['department_pk']
         location_id = self.kwargs['location_pk']
         try:
@@ -118,12 +389,42 @@ class CategoryViewSet(viewsets.ModelViewSet):
             dict: The context dictionary.
         """
         context = super().get_serializer_context()
-        context['location_pk'] = self.kwargs['location_pk']
-        context['department_pk'] = self.kwargs['department_pk']
+        context['location_pk'] = self.kwargs.get('location_pk')
+        context['department_pk'] = self.kwargs.get('department_pk')
         return context
 
+    @cache_not_found('category_list')
+    def list(self, request, *args, **kwargs):
+        """
+        Overrides the list method to cache failed lookups, including an unknown parent department.
+
+        Args:
+            request (Request): The HTTP request.
+            *args: Additional positional arguments.
+            **kwargs: Additional keyword arguments.
 
-class SubCategoryViewSet(viewsets.ModelViewSet):
+        Returns:
+            Response: The HTTP response.
+        """
+        return super().list(request, *args, **kwargs)
+
+    @cache_not_found('category_retrieve')
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Overrides the retrieve method to cache failed lookups, including an unknown parent department.
+
+        Args:
+            request (Request): The HTTP request.
+            *args: Additional positional arguments.
+            **kwargs: Additional keyword arguments.
+
+        Returns:
+            Response: The HTTP response.
+        """
+        return super().retrieve(request, *args, **kwargs)
+
+
+class SubCategoryViewSet(ShardedViewSetMixin, SparseFieldsetMixin, SubtreeDeleteMixin, viewsets.ModelViewSet):
     """
     ViewSet for the SubCategory model.
 
@@ -132,9 +433,11 @@ class SubCategoryViewSet(viewsets.ModelViewSet):
     Attributes:
         serializer_class (Serializer): The serializer class used for this ViewSet.
         permission_classes (list): The list of permissions required for this ViewSet.
+        throttle_scope (str): The rate limit bucket of this ViewSet.
     """
     serializer_class = SubCategorySerializer
     permission_classes = [IsAuthenticated]
+    throttle_scope = 'catalog'
 
     def get_queryset(self):
         """
@@ -143,6 +446,9 @@ class SubCategoryViewSet(viewsets.ModelViewSet):
         Returns:
             QuerySet: The filtered queryset of subcategories.
         """
+        if getattr(self, 'swagger_fake_view', False):
+            # Inspected for the OpenAPI document, without URL kwargs.
+            return SubCategory.objects.none()
         category_id = self.kwargs['category_pk']
         department_id = self.kwargs['department_pk']
         location_id = self.kwargs['location_pk']
@@ -174,13 +480,43 @@ class SubCategoryViewSet(viewsets.ModelViewSet):
             dict: The context dictionary.
         """
         context = super().get_serializer_context()
-        context['category_pk'] = self.kwargs['category_pk']
-        context['department_pk'] = self.kwargs['department_pk']
-        context['location_pk'] = self.kwargs['location_pk']
+        context['category_pk'] = self.kwargs.get('category_pk')
+        context['department_pk'] = self.kwargs.get('department_pk')
+        context['location_pk'] = self.kwargs.get('location_pk')
         return context
 
+    @cache_not_found('subcategory_list')
+    def list(self, request, *args, **kwargs):
+        """
+        Overrides the list method to cache failed lookups, including unknown parents.
+
+        Args:
+            request (Request): The HTTP request.
+            *args: Additional positional arguments.
+            **kwargs: Additional keyword arguments.
+
+        Returns:
+            Response: The HTTP response.
+        """
+        return super().list(request, *args, **kwargs)
+
+    @cache_not_found('subcategory_retrieve')
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Overrides the retrieve method to cache failed lookups, including unknown parents.
+
+        Args:
+            request (Request): The HTTP request.
+            *args: Additional positional arguments.
+            **kwargs: Additional keyword arguments.
+
+        Returns:
+            Response: The HTTP response.
+        """
+        return super().retrieve(request, *args, **kwargs)
+
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ShardedViewSetMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     """
     ViewSet for the Product model.
 
@@ -189,9 +525,17 @@ class ProductViewSet(viewsets.ModelViewSet):
     Attributes:
         serializer_class (Serializer): The serializer class used for this ViewSet.
         permission_classes (list): The list of permissions required for this ViewSet.
+        pagination_class (Pagination): Caches the list counts, see `ProductPageNumberPagination`.
+        throttle_scope (str): The rate limit bucket of this ViewSet.
+        bulk_retrieve_max_ids (int): The maximum number of ids accepted by `bulk_retrieve`.
+        list_cache_mode (str): ``pages`` to cache whole list pages, ``objects`` to cache id lists.
     """
     serializer_class = ProductSerializer
+    pagination_class = ProductPageNumberPagination
     permission_classes = [IsAuthenticated]
+    throttle_scope = 'catalog'
+    bulk_retrieve_max_ids = getattr(settings, 'BULK_RETRIEVE_MAX_IDS', 100)
+    list_cache_mode = PRODUCT_LIST_CACHE_MODE
 
     def get_queryset(self):
         """
@@ -207,8 +551,10 @@ class ProductViewSet(viewsets.ModelViewSet):
         subcategory_name = self.request.query_params.get('subcategory_name')
 
         if location_name:
+            # Compared to the location column rather than joined, so Postgres only scans
+            # the location's partition.
             queryset = queryset.filter(
-                subcategory__category__department__location__name=location_name
+                location=Subquery(Location.objects.filter(name=location_name).values('pk'))
             )
         if department_name:
             queryset = queryset.filter(
@@ -236,10 +582,46 @@ class ProductViewSet(viewsets.ModelViewSet):
             return ProductDetailSerializer
         return ProductSerializer
 
-    @cache_response('product_list')
+    def get_shard(self, request, kwargs):
+        """
+        Routes lists filtered by ``location_name`` to the location's shard and new products
+        to the shard of their subcategory; other requests scatter-gather.
+
+        Args:
+            request (Request): The HTTP request.
+            kwargs (dict): The URL keyword arguments.
+
+        Returns:
+            str: The database alias of the shard, or None to scatter-gather.
+        """
+        location_name = request.query_params.get('location_name')
+        if location_name:
+            return shard_directory.get_shard_by_name(location_name)
+        if self.action == 'create' and request.data.get('subcategory'):
+            return locate(SubCategory, request.data['subcategory'])
+        return None
+
     def list(self, request, *args, **kwargs):
         """
-        Overrides the list method to cache the response.
+        Overrides the list method to cache the response, either as whole pages or, when
+        ``PRODUCT_LIST_CACHE_MODE`` is ``objects``, as id lists composed with per-object entries.
+
+        Args:
+            request (Request): The HTTP request.
+            *args: Additional positional arguments.
+            **kwargs: Additional keyword arguments.
+
+        Returns:
+            Response: The HTTP response.
+        """
+        if self.list_cache_mode == 'objects':
+            return self.list_from_object_cache(request, *args, **kwargs)
+        return self.list_from_page_cache(request, *args, **kwargs)
+
+    @cache_response('product_list')
+    def list_from_page_cache(self, request, *args, **kwargs):
+        """
+        Lists products, caching the whole serialized page.
 
         Args:
             request (Request): The HTTP request.
@@ -251,10 +633,60 @@ class ProductViewSet(viewsets.ModelViewSet):
         """
         return super().list(request, *args, **kwargs)
 
+    def list_from_object_cache(self, request, *args, **kwargs):
+        """
+        Lists products, caching only the ordered ids of the page under
+        ``product_list_ids:{filters}:{query}``. Product bodies come from the shared
+        ``product_retrieve`` entries, so editing a product invalidates a single entry and
+        only the id lists whose membership changed.
+
+        Args:
+            request (Request): The HTTP request.
+            *args: Additional positional arguments.
+            **kwargs: Additional keyword arguments.
+
+        Returns:
+            Response: The HTTP response.
+        """
+        filters = {param: request.query_params.get(param) for param in PRODUCT_FILTER_PARAMS}
+        cache_key = get_cache_key('product_list_ids', [get_filter_key(filters)], request.GET)
+        with memory_phase('cache'):
+            id_list = cache.get(cache_key)
+        if id_list is not None:
+            cache_stats.record_hits('product_list_ids', [cache_key])
+        else:
+            cache_stats.record_misses('product_list_ids')
+            page = self.paginate_queryset(self.get_queryset().only('id', 'created_at'))
+            id_list = {
+                'count': self.paginator.page.paginator.count,
+                'count_is_estimate': self.paginator.page.paginator.count_is_estimate,
+                'next': self.paginator.get_next_link(),
+                'previous': self.paginator.get_previous_link(),
+                'ids': [str(obj.pk) for obj in page],
+            }
+            with memory_phase('cache'):
+                cache.set(cache_key, id_list, CACHE_TTL)
+            cache_stats.record_sets('product_list_ids', {cache_key: id_list})
+
+        shape_params = request.GET.copy()
+        for param in list(shape_params):
+            if param not in ('detail', 'fields', 'expand'):
+                shape_params.pop(param)
+        products = self.get_cached_products(id_list['ids'], shape_params)
+        return Response({
+            'count': id_list['count'],
+            'next': id_list['next'],
+            'previous': id_list['previous'],
+            'results': [products[pk] for pk in id_list['ids'] if pk in products],
+            'count_is_estimate': id_list['count_is_estimate'],
+        })
+
+    @cache_not_found('product_retrieve')
     @cache_response('product_retrieve')
     def retrieve(self, request, *args, **kwargs):
         """
-        Overrides the retrieve method to cache the response.
+        Overrides the retrieve method to cache the response and failed lookups. Ids missing
+        from the product id Bloom filter are rejected without a database query.
 
         Args:
             request (Request): The HTTP request.
@@ -264,4 +696,711 @@ class ProductViewSet(viewsets.ModelViewSet):
         Returns:
             Response: The HTTP response.
         """
+        try:
+            pk = uuid.UUID(str(kwargs['pk']))
+        except ValueError:
+            raise NotFound()
+        if not product_id_filter.might_contain(pk):
+            raise NotFound()
         return super().retrieve(request, *args, **kwargs)
+
+    def get_cached_products(self, ids, query_params):
+        """
+        Serializes the given products through the per-object ``product_retrieve`` cache entries.
+
+        The entries are read with a single multi-get; the misses are checked against the
+        product id filter in one round trip, and those that may exist are fetched from the
+        database, in one query, and written back to the cache.
+
+        Args:
+            ids (list): The product ids as strings.
+            query_params (QueryDict): The query parameters selecting the serialized shape.
+
+        Returns:
+            dict: The serialized products keyed by id; ids that don't exist are left out.
+        """
+        # The keys of `get_cache_key('product_retrieve', [pk], query_params)`, canonicalizing the query once.
+        query = canonicalize_query(query_params)
+        cache_keys = {pk: f"product_retrieve:{pk}:{query}" for pk in ids}
+        with memory_phase('cache'):
+            cached = cache.get_many(cache_keys.values())
+        found = {pk: cached[key] for pk, key in cache_keys.items() if key in cached}
+        cache_stats.record_hits('product_retrieve', cached)
+        cache_stats.record_misses('product_retrieve', len(cache_keys) - len(cached))
+
+        misses = [pk for pk in ids if pk not in found]
+        misses = [pk for pk, might_exist in zip(misses, product_id_filter.might_contain_many(misses)) if might_exist]
+        if misses:
+            queryset = self.filter_queryset(self.get_queryset()).filter(id__in=misses)
+            with memory_phase('queryset'):
+                objects = [obj for shard_queryset in self.get_shard_querysets(queryset) for obj in shard_queryset]
+            fetched = {str(obj.pk): self.get_serializer(obj).data for obj in objects}
+            entries = {cache_keys[pk]: data for pk, data in fetched.items()}
+            with memory_phase('cache'):
+                cache.set_many(entries, CACHE_TTL)
+            cache_stats.record_sets('product_retrieve', entries)
+            found.update(fetched)
+        return found
+
+    @action(detail=False, methods=['get'], url_path='bulk')
+    def bulk_retrieve(self, request, *args, **kwargs):
+        """
+        Retrieves several products in one request, in the order of the ``ids`` query parameter.
+
+        Args:
+            request (Request): The HTTP request.
+            *args: Additional positional arguments.
+            **kwargs: Additional keyword arguments.
+
+        Returns:
+            Response: The HTTP response with the found products and the ids that were not found.
+        """
+        ids = list(dict.fromkeys(str_to_list(request.query_params.get('ids'))))
+        if not ids:
+            raise ValidationError("ids is required.")
+        if len(ids) > self.bulk_retrieve_max_ids:
+            raise ValidationError(f"At most {self.bulk_retrieve_max_ids} ids can be retrieved at once.")
+        try:
+            ids = [str(uuid.UUID(pk)) for pk in ids]
+        except ValueError:
+            raise ValidationError("ids must be a comma separated list of UUIDs.")
+
+        query_params = request.GET.copy()
+        query_params.pop('ids')
+        found = self.get_cached_products(ids, query_params)
+        return Response({
+            'results': [found[pk] for pk in ids if pk in found],
+            'not_found': [pk for pk in ids if pk not in found],
+        })
+
+    @action(detail=False, methods=['post'], url_path='upsert')
+    def upsert(self, request, *args, **kwargs):
+        """
+        Idempotently resolves or creates products by name path, creating missing ancestors,
+        in one transaction per shard. Paths under new locations go to the least loaded shard,
+        reserved before the locations are created, see `ShardDirectory.assign_shard`. The
+        reservations of locations left uncreated by a failed shard are released.
+
+        Args:
+            request (Request): The HTTP request.
+            *args: Additional positional arguments.
+            **kwargs: Additional keyword arguments.
+
+        Returns:
+            Response: The HTTP response with the product id of each path and the created counts.
+        """
+        serializer = ProductPathUpsertSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        paths = serializer.validated_data['paths']
+
+        location_shards = {}
+        shard_paths = defaultdict(list)
+        for index, path in enumerate(paths):
+            if path[0] not in location_shards:
+                location_shards[path[0]] = shard_directory.assign_shard(path[0])
+            shard_paths[location_shards[path[0]]].append(index)
+        product_ids = [None] * len(paths)
+        created = defaultdict(int)
+        try:
+            for alias, indexes in shard_paths.items():
+                with use_shard(alias):
+                    shard_product_ids, shard_created = upsert_paths([paths[index] for index in indexes])
+                for index, pk in zip(indexes, shard_product_ids):
+                    product_ids[index] = pk
+                for model_name, count in shard_created.items():
+                    created[model_name] += count
+        except Exception:
+            for location_name in location_shards:
+                shard_directory.release(location_name)
+            raise
+        return Response({
+            'results': [{'path': path, 'id': str(pk)} for path, pk in zip(paths, product_ids)],
+            'created': created,
+        })
+
+
+class ChangeFeedViewSet(viewsets.ViewSet):
+    """
+    ViewSet exposing an incremental change feed of the catalog.
+
+    Returns the upserts and deletes of one model after a watermark, ordered by
+    ``(updated_at, id)`` across all shards. The model is chosen with the ``model`` query
+    parameter (defaults to ``product``); the watermark comes from ``updated_since`` or ``cursor``.
+
+    Attributes:
+        permission_classes (list): The list of permissions required for this ViewSet.
+        throttle_scope (str): The rate limit bucket of this ViewSet.
+        feed_models (dict): The models available in the feed with their serializers.
+    """
+    permission_classes = [IsAuthenticated]
+    throttle_scope = 'feed'
+    feed_models = {
+        'location': (Location, LocationSerializer),
+        'department': (Department, DepartmentSerializer),
+        'category': (Category, CategorySerializer),
+        'subcategory': (SubCategory, SubCategorySerializer),
+        'product': (Product, ProductSerializer),
+    }
+
+    def list(self, request, *args, **kwargs):
+        """
+        Lists the changes of the requested model after the watermark.
+
+        Args:
+            request (Request): The HTTP request.
+            *args: Additional positional arguments.
+            **kwargs: Additional keyword arguments.
+
+        Returns:
+            Response: The HTTP response.
+        """
+        model_name = request.query_params.get('model', 'product')
+        if model_name not in self.feed_models:
+            raise ValidationError(f"model must be one of: {', '.join(self.feed_models)}.")
+        model, serializer_class = self.feed_models[model_name]
+
+        paginator = ChangeFeedPagination()
+        querysets = []
+        for alias in CATALOG_SHARDS:
+            querysets += [model.objects.using(alias), Tombstone.objects.using(alias).filter(model_name=model_name)]
+        page = paginator.paginate_querysets(querysets, request)
+        results = []
+        for obj in page:
+            if isinstance(obj, Tombstone):
+                results.append({'op': 'delete', 'id': str(obj.object_id), 'updated_at': obj.updated_at})
+            else:
+                results.append({'op': 'upsert', 'id': str(obj.pk), 'updated_at': obj.updated_at,
+                                'data': serializer_class(obj).data})
+        return paginator.get_paginated_response(results)
+
+
+class DeleteJobViewSet(viewsets.ViewSet):
+    """
+    ViewSet reporting the status of asynchronous subtree deletes.
+
+    Attributes:
+        permission_classes (list): The list of permissions required for this ViewSet.
+        throttle_scope (str): The rate limit bucket of this ViewSet.
+    """
+    permission_classes = [IsAuthenticated]
+    throttle_scope = 'jobs'
+
+    def retrieve(self, request, pk=None):
+        """
+        Returns the status of a delete job.
+
+        Args:
+            request (Request): The HTTP request.
+            pk (str): The job id.
+
+        Returns:
+            Response: The HTTP response.
+        """
+        job = get_delete_job(pk)
+        if job is None:
+            raise NotFound()
+        return Response(job)
+
+
+class BatchViewSet(viewsets.ViewSet):
+    """
+    ViewSet running several GET requests of the API in one round trip.
+
+    The requests are dispatched internally through the URLconf as the caller, so they skip
+    authentication and middleware but keep their own permissions, throttling and caching.
+
+    Attributes:
+        permission_classes (list): The list of permissions required for this ViewSet.
+        throttle_scope (str): The rate limit bucket of this ViewSet.
+    """
+    permission_classes = [IsAuthenticated]
+    throttle_scope = 'catalog'
+
+    def create(self, request, *args, **kwargs):
+        """
+        Runs the requested GETs and returns their responses in one envelope.
+
+        Args:
+            request (Request): The HTTP request.
+            *args: Additional positional arguments.
+            **kwargs: Additional keyword arguments.
+
+        Returns:
+            Response: The HTTP response with the URL, status code and body of each request, in order.
+        """
+        serializer = BatchRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = dispatch_batch(request, serializer.validated_data['requests'], reverse('api-root'))
+        return Response({'results': results})
+
+
+class NameConflict(APIException):
+    """
+    Raised when a change would give two objects under the same parent the same name.
+    """
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Objects would have the same name as another object under the same parent."
+    default_code = 'conflict'
+
+
+class HierarchyViewSet(viewsets.ViewSet):
+    """
+    ViewSet reorganizing departments, categories and subcategories in bulk: moving them
+    under another parent, merging them and renaming them with set-based UPDATEs, instead of
+    one PUT per node. See `metadata_store.reorganize`.
+
+    Name conflicts are reported with status 409 and the list of conflicting objects;
+    nothing is changed then.
+
+    Attributes:
+        permission_classes (list): The list of permissions required for this ViewSet.
+        throttle_scope (str): The rate limit bucket of this ViewSet.
+    """
+    permission_classes = [IsAuthenticated]
+    throttle_scope = 'catalog'
+
+    def reorganize(self, operation, model, *args):
+        """
+        Runs a reorganization on the current shard, turning its errors into API errors.
+
+        Args:
+            operation (callable): `move_nodes`, `merge_nodes` or `rename_nodes`.
+            model (Model): The model of the nodes.
+            *args: The arguments of the operation.
+
+        Returns:
+            dict: The result of the operation.
+        """
+        try:
+            return operation(model, *args)
+        except HierarchyConflict as exc:
+            raise NameConflict({'detail': str(exc), 'conflicts': exc.conflicts})
+        except ReorganizeError as exc:
+            raise ValidationError(str(exc))
+
+    @action(detail=False, methods=['post'])
+    def move(self, request, *args, **kwargs):
+        """
+        Moves nodes and their subtrees under another parent, which has to be on the same
+        shard, in one transaction.
+
+        Args:
+            request (Request): The HTTP request.
+            *args: Additional positional arguments.
+            **kwargs: Additional keyword arguments.
+
+        Returns:
+            Response: The HTTP response with the number of moved nodes.
+        """
+        serializer = HierarchyMoveSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        model = REORGANIZE_MODELS[data['type']]
+        parent_model = get_parent_model(model)
+        alias = locate(parent_model, data['parent'])
+        if alias is None:
+            raise ValidationError(f"Unknown {parent_model._meta.model_name} id: {data['parent']}.")
+        with use_shard(alias):
+            return Response(self.reorganize(move_nodes, model, data['ids'], data['parent']))
+
+    @action(detail=False, methods=['post'])
+    def merge(self, request, *args, **kwargs):
+        """
+        Merges nodes into another node of the same level on the same shard, in one transaction.
+
+        Args:
+            request (Request): The HTTP request.
+            *args: Additional positional arguments.
+            **kwargs: Additional keyword arguments.
+
+        Returns:
+            Response: The HTTP response with the number of merged nodes and moved children.
+        """
+        serializer = HierarchyMergeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        model = REORGANIZE_MODELS[data['type']]
+        alias = locate(model, data['target'])
+        if alias is None:
+            raise ValidationError(f"Unknown {data['type']} id: {data['target']}.")
+        with use_shard(alias):
+            return Response(self.reorganize(merge_nodes, model, data['sources'], data['target']))
+
+    @action(detail=False, methods=['post'])
+    def rename(self, request, *args, **kwargs):
+        """
+        Renames nodes, in one transaction per shard holding some of them; the transactions
+        commit together once every shard's renames succeeded.
+
+        Args:
+            request (Request): The HTTP request.
+            *args: Additional positional arguments.
+            **kwargs: Additional keyword arguments.
+
+        Returns:
+            Response: The HTTP response with the number of renamed nodes.
+        """
+        serializer = HierarchyRenameSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        model = REORGANIZE_MODELS[data['type']]
+        names = data['names']
+        shard_names = {}
+        for alias in CATALOG_SHARDS:
+            pks = list(model.objects.using(alias).filter(pk__in=list(names)).values_list('pk', flat=True))
+            if pks:
+                shard_names[alias] = {pk: names[pk] for pk in pks}
+        missing = set(names).difference(*shard_names.values())
+        if missing:
+            raise ValidationError(f"Unknown {data['type']} ids: {', '.join(sorted(map(str, missing)))}.")
+        result = Counter()
+        with ExitStack() as stack:
+            for alias, pks in shard_names.items():
+                stack.enter_context(transaction.atomic(using=alias))
+                with use_shard(alias):
+                    result.update(self.reorganize(rename_nodes, model, pks))
+        return Response({'renamed': result['renamed']})
+
+
+class AutocompleteViewSet(viewsets.ViewSet):
+    """
+    ViewSet suggesting catalog objects by name prefix, for typeahead.
+
+    Query parameters:
+        q: The name prefix, matched case-insensitively.
+        type: Comma separated model names to search; all of them by default.
+        location_id, department_id: Restrict the suggestions to a node's subtree.
+        limit: The number of suggestions, at most ``max_limit``.
+
+    Attributes:
+        permission_classes (list): The list of permissions required for this ViewSet.
+        throttle_scope (str): The rate limit bucket of this ViewSet.
+        max_limit (int): The maximum number of suggestions per request.
+    """
+    permission_classes = [IsAuthenticated]
+    throttle_scope = 'catalog'
+    max_limit = getattr(settings, 'AUTOCOMPLETE_MAX_LIMIT', 50)
+
+    def list(self, request, *args, **kwargs):
+        """
+        Returns the objects whose name starts with ``q``, ordered by name.
+
+        Args:
+            request (Request): The HTTP request.
+            *args: Additional positional arguments.
+            **kwargs: Additional keyword arguments.
+
+        Returns:
+            Response: The HTTP response with the suggestions.
+        """
+        prefix = request.query_params.get('q', '').strip()
+        if not prefix:
+            raise ValidationError("q is required.")
+        model_names = str_to_list(request.query_params.get('type')) or list(AUTOCOMPLETE_MODELS)
+        unknown = [name for name in model_names if name not in AUTOCOMPLETE_MODELS]
+        if unknown:
+            raise ValidationError(f"type must be among: {', '.join(AUTOCOMPLETE_MODELS)}.")
+        limit = request.query_params.get('limit', '10')
+        if not limit.isdigit() or not 1 <= int(limit) <= self.max_limit:
+            raise ValidationError(f"limit must be between 1 and {self.max_limit}.")
+        scope = {}
+        for param in ('location_id', 'department_id'):
+            value = request.query_params.get(param)
+            if value is None:
+                continue
+            try:
+                scope[param] = str(uuid.UUID(value))
+            except ValueError:
+                raise ValidationError(f"{param} must be a UUID.")
+
+        return Response({'results': autocomplete(prefix, model_names, limit=int(limit), **scope)})
+
+
+class SnapshotUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'No catalog snapshot has been built yet.'
+    default_code = 'snapshot_unavailable'
+
+
+class SnapshotViewSet(viewsets.ViewSet):
+    """
+    ViewSet serving reads from the point-in-time catalog snapshot built with
+    ``python manage.py build_catalog_snapshot``.
+
+    Records are served from the memory-mapped snapshot file exactly as they were rendered
+    when it was built, without the database or the cache. The user is taken from the
+    token without a database lookup, and reads aren't shed on database latency. Responses
+    carry the snapshot version in an ``X-Snapshot-Version`` header.
+
+    Endpoints:
+        snapshot/: The version, creation time and record counts of the snapshot.
+        snapshot/<model>/: The objects of a model in id order, paged with ``after`` and ``limit``.
+        snapshot/<model>/<id>/: One object.
+
+    Attributes:
+        authentication_classes (list): The list of authentication classes of this ViewSet.
+        permission_classes (list): The list of permissions required for this ViewSet.
+        throttle_classes (list): The list of throttles of this ViewSet.
+        throttle_scope (str): The rate limit bucket of this ViewSet.
+        max_limit (int): The maximum number of objects per range read.
+    """
+    authentication_classes = [JWTStatelessUserAuthentication]
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [throttle for throttle in api_settings.DEFAULT_THROTTLE_CLASSES
+                        if not issubclass(throttle, LoadSheddingThrottle)]
+    throttle_scope = 'catalog'
+    max_limit = getattr(settings, 'CATALOG_SNAPSHOT_MAX_LIMIT', 1000)
+
+    def get_snapshot(self, model_name=None):
+        """
+        Returns the current snapshot, checking the requested model is part of it.
+
+        Args:
+            model_name (str): The model name, if any.
+
+        Returns:
+            CatalogSnapshot: The snapshot.
+
+        Raises:
+            NotFound: If the model isn't in the snapshot.
+            SnapshotUnavailable: If no snapshot can be read.
+        """
+        if model_name is not None and model_name not in SNAPSHOT_MODELS:
+            raise NotFound(f"model must be one of: {', '.join(SNAPSHOT_MODELS)}.")
+        try:
+            return catalog_snapshot.get()
+        except SnapshotError:
+            raise SnapshotUnavailable()
+
+    def parse_id(self, value, param):
+        try:
+            return uuid.UUID(value)
+        except ValueError:
+            raise ValidationError(f"{param} must be a UUID.")
+
+    def json_response(self, snapshot, body):
+        response = HttpResponse(body, content_type='application/json')
+        response['X-Snapshot-Version'] = snapshot.version
+        return response
+
+    def list(self, request, *args, **kwargs):
+        """
+        Describes the current snapshot.
+
+        Args:
+            request (Request): The HTTP request.
+            *args: Additional positional arguments.
+            **kwargs: Additional keyword arguments.
+
+        Returns:
+            Response: The HTTP response.
+        """
+        snapshot = self.get_snapshot()
+        return Response({'version': snapshot.version, 'created_at': snapshot.created_at, 'counts': snapshot.counts},
+                        headers={'X-Snapshot-Version': snapshot.version})
+
+    def retrieve(self, request, pk=None):
+        """
+        Reads a page of a model's objects in id order, resuming after the ``after`` id.
+
+        The records are joined into the response body as stored, without being parsed.
+
+        Args:
+            request (Request): The HTTP request.
+            pk (str): The model name.
+
+        Returns:
+            HttpResponse: The HTTP response with the objects and the ``after`` id of the next page.
+        """
+        snapshot = self.get_snapshot(pk)
+        after = request.query_params.get('after')
+        after = self.parse_id(after, 'after') if after else None
+        limit = request.query_params.get('limit', '100')
+        if not limit.isdigit() or not 1 <= int(limit) <= self.max_limit:
+            raise ValidationError(f"limit must be between 1 and {self.max_limit}.")
+        records, next_after = snapshot.range(pk, after=after, limit=int(limit))
+        next_after = f'"{next_after}"' if next_after else 'null'
+        return self.json_response(snapshot, b''.join([b'{"results":[', b','.join(records), b'],"next":',
+                                                      next_after.encode(), b'}']))
+
+    @action(detail=True, methods=['get'], url_path=r'(?P<object_id>[^/.]+)', url_name='object')
+    def retrieve_object(self, request, pk=None, object_id=None):
+        """
+        Looks up one object of a model.
+
+        Args:
+            request (Request): The HTTP request.
+            pk (str): The model name.
+            object_id (str): The object id.
+
+        Returns:
+            HttpResponse: The HTTP response with the object as stored.
+        """
+        snapshot = self.get_snapshot(pk)
+        record = snapshot.get(pk, self.parse_id(object_id, 'id'))
+        if record is None:
+            raise NotFound()
+        return self.json_response(snapshot, record)
+
+
+class MemoryProfilingDisabled(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Memory profiling is off; set MEMORY_PROFILING_ENABLED to trace allocations.'
+    default_code = 'memory_profiling_disabled'
+
+
+class MemoryProfileViewSet(viewsets.ViewSet):
+    """
+    Staff-only ViewSet exposing the memory profile of the worker serving the request, as
+    recorded by `memory_profiler` when ``MEMORY_PROFILING_ENABLED`` is set. Every worker
+    keeps its own profile; the ``pid`` in the report tells them apart.
+
+    Endpoints:
+        memory/: Net and peak allocations per endpoint and phase, and the periodic samples.
+        memory/diff/: The allocation sites that grew the most since the baseline snapshot
+            (``since=baseline``) or the latest sample (``since=sample``), grouped by
+            ``lineno`` or ``traceback``.
+        memory/sample/: Takes a sample now.
+        memory/reset/: Clears the statistics and takes a new baseline snapshot.
+
+    Attributes:
+        permission_classes (list): The list of permissions required for this ViewSet.
+        throttle_scope (str): The rate limit bucket of this ViewSet.
+    """
+    permission_classes = [IsAdminUser]
+    throttle_scope = 'jobs'
+
+    def check_tracing(self):
+        if not memory_profiler.active:
+            raise MemoryProfilingDisabled()
+
+    def list(self, request, *args, **kwargs):
+        """
+        Returns the memory profile of the worker.
+
+        Args:
+            request (Request): The HTTP request.
+            *args: Additional positional arguments.
+            **kwargs: Additional keyword arguments.
+
+        Returns:
+            Response: The HTTP response.
+        """
+        return Response(memory_profiler.report())
+
+    @action(detail=False, methods=['get'])
+    def diff(self, request, *args, **kwargs):
+        """
+        Compares the allocations of the worker now with an earlier snapshot.
+
+        Args:
+            request (Request): The HTTP request.
+            *args: Additional positional arguments.
+            **kwargs: Additional keyword arguments.
+
+        Returns:
+            Response: The HTTP response.
+        """
+        self.check_tracing()
+        since = request.query_params.get('since', 'baseline')
+        group_by = request.query_params.get('group_by', 'lineno')
+        limit = request.query_params.get('limit', '')
+        if since not in ('baseline', 'sample'):
+            raise ValidationError("since must be one of: baseline, sample.")
+        if group_by not in ('lineno', 'traceback'):
+            raise ValidationError("group_by must be one of: lineno, traceback.")
+        if limit and not limit.isdigit():
+            raise ValidationError("limit must be a positive integer.")
+        return Response(memory_profiler.diff(since, group_by, int(limit) if limit else None))
+
+    @action(detail=False, methods=['post'])
+    def sample(self, request, *args, **kwargs):
+        """
+        Samples the allocations of the worker now.
+
+        Args:
+            request (Request): The HTTP request.
+            *args: Additional positional arguments.
+            **kwargs: Additional keyword arguments.
+
+        Returns:
+            Response: The HTTP response.
+        """
+        self.check_tracing()
+        return Response(memory_profiler.sample())
+
+    @action(detail=False, methods=['post'])
+    def reset(self, request, *args, **kwargs):
+        """
+        Clears the memory statistics of the worker and takes a new baseline snapshot.
+
+        Args:
+            request (Request): The HTTP request.
+            *args: Additional positional arguments.
+            **kwargs: Additional keyword arguments.
+
+        Returns:
+            Response: The HTTP response.
+        """
+        memory_profiler.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ReadinessView(APIView):
+    """
+    Readiness probe: responds 200 once the worker finished its startup warmup and 503
+    until then, with the outcome of each warmup step.
+
+    Attributes:
+        authentication_classes (list): The list of authentication classes of this view.
+        permission_classes (list): The list of permissions required for this view.
+        throttle_classes (list): The list of throttles of this view.
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    throttle_classes = []
+    swagger_schema = None
+
+    def get(self, request, *args, **kwargs):
+        """
+        Reports whether the worker is ready.
+
+        Args:
+            request (Request): The HTTP request.
+            *args: Additional positional arguments.
+            **kwargs: Additional keyword arguments.
+
+        Returns:
+            Response: The HTTP response.
+        """
+        warmup_status = startup_warmup.status()
+        return Response(warmup_status, status=status.HTTP_200_OK if warmup_status['ready']
+                        else status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+class OpenAPISchemaView(APIView):
+    """
+    Serves the OpenAPI document generated by ``python manage.py generate_openapi_schema``,
+    read once per worker instead of introspecting the API on every request.
+
+    Attributes:
+        authentication_classes (list): The list of authentication classes of this view.
+        permission_classes (list): The list of permissions required for this view.
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    swagger_schema = None
+
+    def get(self, request, *args, **kwargs):
+        """
+        Returns the OpenAPI document.
+
+        Args:
+            request (Request): The HTTP request.
+            *args: Additional positional arguments.
+            **kwargs: Additional keyword arguments.
+
+        Returns:
+            HttpResponse: The HTTP response.
+        """
+        return HttpResponse(openapi_schema.get(), content_type='application/json')
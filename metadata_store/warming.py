@@ -0,0 +1,182 @@
+import fnmatch
+import logging
+import queue
+import threading
+import time
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connection
+
+from metadata_store.sharding import use_shard
+
+logger = logging.getLogger(__name__)
+
+CACHE_WARMING_ENABLED = getattr(settings, 'CACHE_WARMING_ENABLED', False)
+CACHE_WARMING_TRACKED_KEYS = getattr(settings, 'CACHE_WARMING_TRACKED_KEYS', 500)
+CACHE_WARMING_TOP_K = getattr(settings, 'CACHE_WARMING_TOP_K', 50)
+CACHE_WARMING_DELAY = getattr(settings, 'CACHE_WARMING_DELAY', 1.0)
+CACHE_WARMING_RATE = getattr(settings, 'CACHE_WARMING_RATE', 20)
+
+
+class TopKSketch:
+    """
+    Space-Saving sketch of the most frequent items of a stream, in bounded memory.
+
+    Keeps at most ``capacity`` counters; an untracked item replaces the least frequent
+    one and inherits its count, so counts are over-estimates by at most that minimum.
+    Each item carries the latest value recorded with it.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def record(self, item, value=None):
+        """
+        Counts one occurrence of an item.
+
+        Args:
+            item (str): The item.
+            value: Data to keep with the item, replacing what was recorded before.
+        """
+        with self.lock:
+            if item not in self.counts and len(self.counts) >= self.capacity:
+                evicted = min(self.counts, key=self.counts.get)
+                self.counts[item] = self.counts.pop(evicted)
+                del self.values[evicted]
+            self.counts[item] = self.counts.get(item, 0) + 1
+            self.values[item] = value
+
+    def top(self, k):
+        """
+        Returns the k most frequent items with their values.
+
+        Args:
+            k (int): The number of items.
+
+        Returns:
+            list: ``(item, value)`` pairs, most frequent first.
+        """
+        with self.lock:
+            items = sorted(self.counts, key=self.counts.get, reverse=True)[:k]
+            return [(item, self.values[item]) for item in items]
+
+
+class CacheWarmer:
+    """
+    Recomputes the hottest `cache_response` entries in a background thread after they
+    are invalidated, so users don't pay for the first miss.
+
+    Requests to warm are debounced by ``delay`` seconds and deduplicated, so a burst of
+    writes warms each key once; workers coordinate through a short cache lock so a key
+    is only recomputed by one of them, and at most ``rate`` keys are warmed per second.
+    """
+    def __init__(self, capacity, top_k, delay, rate, enabled=True):
+        self.enabled = enabled
+        self.sketch = TopKSketch(capacity)
+        self.top_k = top_k
+        self.delay = delay
+        self.rate = rate
+        self.queue = queue.Queue()
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def record(self, cache_key, viewset, method_name, request, kwargs):
+        """
+        Records a read of a cached response together with what is needed to replay it.
+
+        Args:
+            cache_key (str): The cache key of the response.
+            viewset (ViewSet): The viewset serving the request.
+            method_name (str): The name of the cached viewset method.
+            request (Request): The HTTP request.
+            kwargs (dict): The URL keyword arguments.
+        """
+        if not self.enabled:
+            return
+        replay = (type(viewset), viewset.action, method_name, dict(kwargs), request.path, request.GET.urlencode(),
+                  request.get_host(), request.scheme)
+        self.sketch.record(cache_key, replay)
+
+    def schedule(self, key_formats):
+        """
+        Queues the hottest tracked keys matching the invalidated key formats for warming.
+
+        Args:
+            key_formats (list): The invalidated cache key formats.
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            for cache_key, replay in self.sketch.top(self.top_k):
+                if cache_key in self.pending:
+                    continue
+                if any(fnmatch.fnmatchcase(cache_key, key_format) for key_format in key_formats):
+                    self.pending.add(cache_key)
+                    self.queue.put((time.monotonic() + self.delay, cache_key, replay))
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='cache-warmer', daemon=True)
+                self.thread.start()
+
+    def run(self):
+        """
+        Worker loop warming queued keys, releasing its database connection when idle.
+        """
+        while True:
+            due, cache_key, replay = self.queue.get()
+            time.sleep(max(0, due - time.monotonic()))
+            with self.lock:
+                self.pending.discard(cache_key)
+            try:
+                self.warm(cache_key, replay)
+            except Exception:
+                logger.exception("Failed to warm %s", cache_key)
+            if self.queue.empty():
+                connection.close()
+            time.sleep(1 / self.rate)
+
+    def warm(self, cache_key, replay):
+        """
+        Replays the request behind a cache key, which stores a fresh response in the cache.
+
+        Args:
+            cache_key (str): The cache key to warm.
+            replay (tuple): The request data recorded by `record`.
+        """
+        if cache.get(cache_key) is not None or not cache.add(f"warming:{cache_key}", 1, 30):
+            return
+        viewset_class, action, method_name, kwargs, path, query_string, host, scheme = replay
+        request = WSGIRequest({
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': path,
+            'QUERY_STRING': query_string,
+            'HTTP_HOST': host,
+            'SERVER_NAME': host.split(':')[0],
+            'SERVER_PORT': '443' if scheme == 'https' else '80',
+            'wsgi.url_scheme': scheme,
+            'wsgi.input': BytesIO(),
+        })
+        viewset = viewset_class()
+        viewset.action_map = {'get': action}
+        viewset.args = ()
+        viewset.kwargs = kwargs
+        viewset.format_kwarg = None
+        viewset.headers = {}
+        viewset.request = viewset.initialize_request(request)
+        shard = viewset.get_shard(viewset.request, kwargs) if hasattr(viewset, 'get_shard') else None
+        with use_shard(shard):
+            getattr(viewset, method_name)(viewset.request, **kwargs)
+
+
+cache_warmer = CacheWarmer(
+    capacity=CACHE_WARMING_TRACKED_KEYS,
+    top_k=CACHE_WARMING_TOP_K,
+    delay=CACHE_WARMING_DELAY,
+    rate=CACHE_WARMING_RATE,
+    enabled=CACHE_WARMING_ENABLED,
+)
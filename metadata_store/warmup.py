@@ -0,0 +1,214 @@
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.urls import reverse
+from django_redis import get_redis_connection
+
+from metadata_store.autocomplete import autocomplete_index
+from metadata_store.cache_stats import cache_stats
+from metadata_store.models import Product
+from metadata_store.openapi import openapi_schema
+from metadata_store.serializers import (LocationSerializer, DepartmentSerializer, DepartmentDetailSerializer,
+                                        CategorySerializer, CategoryDetailSerializer, SubCategorySerializer,
+                                        SubCategoryDetailSerializer, ProductSerializer, ProductDetailSerializer)
+from metadata_store.shard_directory import shard_directory
+from metadata_store.sharding import CATALOG_SHARDS
+from metadata_store.snapshots import SnapshotError, catalog_snapshot
+from metadata_store.write_through import REFRESHED_SHAPES, refresh_products
+
+logger = logging.getLogger(__name__)
+
+STARTUP_WARMUP_ENABLED = getattr(settings, 'STARTUP_WARMUP_ENABLED', False)
+STARTUP_WARMUP_HOT_KEYS = getattr(settings, 'STARTUP_WARMUP_HOT_KEYS', 1000)
+STARTUP_WARMUP_RETRY_INTERVAL = getattr(settings, 'STARTUP_WARMUP_RETRY_INTERVAL', 5)
+STARTUP_WARMUP_FORK_TIMEOUT = getattr(settings, 'STARTUP_WARMUP_FORK_TIMEOUT', 60)
+
+# The serializers the API responds with, whose fields are built on first use.
+WARMUP_SERIALIZERS = [
+    LocationSerializer, DepartmentSerializer, DepartmentDetailSerializer, CategorySerializer,
+    CategoryDetailSerializer, SubCategorySerializer, SubCategoryDetailSerializer, ProductSerializer,
+    ProductDetailSerializer,
+]
+
+
+def open_connections():
+    """
+    Connects to every database and to Redis, failing if one of them is unreachable.
+    """
+    for alias in connections:
+        connections[alias].ensure_connection()
+    if settings.CACHES['default']['BACKEND'].startswith('django_redis.'):
+        get_redis_connection('default').ping()
+
+
+def prepare_serializers():
+    """
+    Builds the fields of every serializer, serializes one object of each and resolves
+    the URLconf, so the first requests don't pay for the introspection.
+    """
+    for serializer_class in WARMUP_SERIALIZERS:
+        serializer = serializer_class()
+        serializer.fields
+        queryset = serializer.optimize_queryset(serializer_class.Meta.model.objects.using(CATALOG_SHARDS[0]))
+        instance = queryset.first()
+        if instance is not None:
+            serializer_class(instance).data
+    reverse('api-root')
+
+
+def load_autocomplete_index():
+    if autocomplete_index.enabled:
+        autocomplete_index.refresh()
+
+
+def open_snapshot():
+    """
+    Maps the catalog snapshot, if one has been written.
+    """
+    try:
+        catalog_snapshot.get()
+    except SnapshotError:
+        pass
+
+
+def warm_hot_keys(limit=STARTUP_WARMUP_HOT_KEYS):
+    """
+    Recomputes the most read product responses the cache no longer holds.
+
+    Only the plain and ``detail=true`` product responses are rebuilt, the shapes written
+    through on save; other entries would need the original request. They are written
+    with `refresh_products`, so a save committed meanwhile is never overwritten.
+
+    Args:
+        limit (int): The number of most read keys to consider.
+
+    Returns:
+        int: The number of products whose responses were written.
+    """
+    if not cache_stats.enabled:
+        return 0
+    candidates = {}
+    for key in cache_stats.hottest_keys(limit):
+        prefix, _, rest = key.partition(':')
+        pk, _, query = rest.partition(':')
+        if prefix == 'product_retrieve' and query in REFRESHED_SHAPES:
+            candidates[key] = pk
+    if not candidates:
+        return 0
+    client = get_redis_connection('default')
+    pipeline = client.pipeline(transaction=False)
+    for key in candidates:
+        pipeline.exists(cache.make_key(key))
+    pks = {pk for (key, pk), exists in zip(candidates.items(), pipeline.execute()) if not exists}
+    products = [(alias, pk) for alias in CATALOG_SHARDS
+                for pk in Product.objects.using(alias).filter(pk__in=pks).values_list('pk', flat=True)]
+    if products:
+        refresh_products(products, prune=False)
+    return len(products)
+
+
+def load_openapi_schema():
+    return len(openapi_schema.get())
+
+
+# ``(name, function, required)``, in order: the worker isn't ready until the required steps
+# succeed, the others only log their failure.
+STARTUP_WARMUP_STEPS = [
+    ('connections', open_connections, True),
+    ('shard_directory', shard_directory.load, False),
+    ('serializers', prepare_serializers, False),
+    ('autocomplete_index', load_autocomplete_index, False),
+    ('snapshot', open_snapshot, False),
+    ('hot_keys', warm_hot_keys, False),
+    ('openapi_schema', load_openapi_schema, False),
+]
+
+
+class StartupWarmup:
+    """
+    Prepares a worker for traffic in a background thread once it is started: connects to
+    the databases and Redis, builds the in-process indexes and serializers, and rewarms
+    the hottest cache entries. The readiness probe reports the worker ready once it is
+    done, so a load balancer only routes to workers that won't stall their first requests.
+
+    The required steps are retried every ``retry_interval`` seconds until they succeed.
+    Started in a process that forks its workers, as a preloading Gunicorn master does, the
+    fork waits up to ``fork_timeout`` seconds for the warmup to finish, and every child
+    runs it again for its own connections.
+    """
+    def __init__(self, steps, retry_interval, fork_timeout, enabled=True):
+        self.steps = steps
+        self.retry_interval = retry_interval
+        self.fork_timeout = fork_timeout
+        self.enabled = enabled
+        self.thread = None
+        self.fork_hooks = False
+        self.reset()
+
+    def reset(self):
+        self.ready = not self.enabled
+        self.attempts = 0
+        self.results = {}
+
+    def start(self):
+        """
+        Starts the warmup, once per process.
+        """
+        if not self.enabled or self.thread is not None:
+            return
+        if not self.fork_hooks:
+            os.register_at_fork(before=self.before_fork, after_in_child=self.after_fork_in_child)
+            self.fork_hooks = True
+        self.thread = threading.Thread(target=self.run, name='startup-warmup', daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            self.attempts += 1
+            failed = False
+            for name, function, required in self.steps:
+                started_at = time.monotonic()
+                try:
+                    result = {'ok': True, 'result': function()}
+                except Exception as exc:
+                    logger.exception("Startup warmup step %s failed", name)
+                    result = {'ok': False, 'error': str(exc)}
+                    failed = required
+                result['seconds'] = round(time.monotonic() - started_at, 3)
+                self.results[name] = result
+                if failed:
+                    break
+            # The thread's connections aren't shared with the request threads.
+            connections.close_all()
+            if not failed:
+                break
+            time.sleep(self.retry_interval)
+        self.ready = True
+        logger.info("Startup warmup finished in %s", ', '.join(
+            f"{name} {result['seconds']}s" for name, result in self.results.items()))
+
+    def before_fork(self):
+        if self.thread is not None:
+            self.thread.join(self.fork_timeout)
+
+    def after_fork_in_child(self):
+        self.thread = None
+        self.reset()
+        self.start()
+
+    def status(self):
+        """
+        Returns:
+            dict: Whether the worker is ready, the number of attempts and the outcome and
+            duration of each step of the last one.
+        """
+        return {'ready': self.ready, 'attempts': self.attempts, 'steps': dict(self.results)}
+
+
+startup_warmup = StartupWarmup(STARTUP_WARMUP_STEPS, STARTUP_WARMUP_RETRY_INTERVAL, STARTUP_WARMUP_FORK_TIMEOUT,
+                               enabled=STARTUP_WARMUP_ENABLED)
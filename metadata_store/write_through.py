@@ -0,0 +1,119 @@
+import atexit
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django_redis import get_redis_connection
+
+from metadata_store.cache_stats import cache_stats
+from metadata_store.invalidation import CACHE_INVALIDATION_ASYNC, CACHE_INVALIDATION_WINDOW, InvalidationQueue
+from metadata_store.models import Product
+from metadata_store.serializers import ProductSerializer, ProductDetailSerializer
+from metadata_store.utils import CACHE_TTL, get_cache_key
+
+PRODUCT_CACHE_WRITE_THROUGH = getattr(settings, 'PRODUCT_CACHE_WRITE_THROUGH', False)
+
+# The cached shapes of a product rewritten after it is saved, by canonical query: the
+# plain and the ``detail=true`` retrieve responses. Other shapes are deleted.
+REFRESHED_SHAPES = {'': ProductSerializer, 'detail=true': ProductDetailSerializer}
+
+# The version recorded for a deleted product, newer than that of any save.
+DELETED_VERSION = 2 ** 53
+
+# Writes the entries of one product unless the cache holds a newer version of it.
+# KEYS: the version key, then the entry keys. ARGV: the version, the TTL, then the value
+# of each entry key; keys without a value are deleted.
+REFRESH_SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1]))
+if current and current > tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+for index = 2, #KEYS do
+    local value = ARGV[index + 1]
+    if value then
+        redis.call('SET', KEYS[index], value, 'EX', ARGV[2])
+    else
+        redis.call('DEL', KEYS[index])
+    end
+end
+return 1
+"""
+
+
+def get_version_key(pk):
+    return f'product_version:{pk}'
+
+
+def get_version(product):
+    """
+    Returns the version of a product's cache entries, its ``updated_at`` in microseconds.
+    """
+    return int(product.updated_at.timestamp() * 1000000)
+
+
+def refresh_products(products, prune=True):
+    """
+    Rewrites the cached ``product_retrieve`` entries of saved products from the database,
+    and deletes those of deleted products.
+
+    The plain and ``detail=true`` shapes are serialized again and written with
+    `REFRESH_SCRIPT`, together with the deletion of the product's other cached shapes, in
+    one pipeline. A write is skipped when the cache already holds a newer version of the
+    product, so a slower refresh that read an older row never overwrites a newer entry.
+
+    Args:
+        products (iterable): ``(database alias, product id)`` pairs.
+        prune (bool): Whether to delete the products' other cached shapes; they are only
+            stale after a save.
+    """
+    shard_ids = defaultdict(set)
+    for alias, pk in products:
+        shard_ids[alias].add(str(pk))
+    client = get_redis_connection('default')
+    script = client.register_script(REFRESH_SCRIPT)
+    pipeline = client.pipeline(transaction=False)
+    entries = {}
+    for alias, pks in shard_ids.items():
+        queryset = ProductDetailSerializer().optimize_queryset(Product.objects.using(alias).filter(pk__in=pks))
+        found = {str(product.pk): product for product in queryset}
+        for pk in pks:
+            product = found.get(pk)
+            values = {}
+            if product is not None:
+                values = {get_cache_key('product_retrieve', [pk], query): serializer_class(product).data
+                          for query, serializer_class in REFRESHED_SHAPES.items()}
+                entries.update(values)
+            stale = [key for key in cache.keys(f'product_retrieve:{pk}:*') if key not in values] if prune else []
+            version = get_version(product) if product is not None else DELETED_VERSION
+            script(keys=[cache.make_key(get_version_key(pk))] + [cache.make_key(key) for key in [*values, *stale]],
+                   args=[version, CACHE_TTL] + [cache.client.encode(value) for value in values.values()],
+                   client=pipeline)
+    pipeline.execute()
+    cache_stats.record_sets('product_retrieve', entries)
+
+
+class ProductCacheRefresher(InvalidationQueue):
+    """
+    Refreshes the cached responses of saved products in a background thread once their
+    transaction commits, instead of deleting them, so the first reader after an edit
+    doesn't pay a cache miss. Saves of the same product within ``window`` seconds are
+    refreshed once.
+    """
+    thread_name = 'cache-refresher'
+
+    def apply(self, products):
+        """
+        Refreshes the cache entries of merged products, see `refresh_products`.
+
+        Args:
+            products (list): The unique ``(database alias, product id)`` pairs.
+        """
+        refresh_products(products)
+        if self.asynchronous and self.queue.empty():
+            connections.close_all()
+
+
+product_cache_refresher = ProductCacheRefresher(window=CACHE_INVALIDATION_WINDOW, asynchronous=CACHE_INVALIDATION_ASYNC)
+atexit.register(product_cache_refresher.flush)
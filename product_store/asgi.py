@@ -13,4 +13,15 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'product_store.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up.
+from metadata_store.events import EventStreamApplication  # noqa: E402
+
+application = EventStreamApplication(django_application, '/api/v1/events/')
+
+# Warms the worker up in the background; /ready/ reports when it is done. With a
+# preloading server, every forked worker warms up again.
+from metadata_store.warmup import startup_warmup  # noqa: E402
+
+startup_warmup.start()
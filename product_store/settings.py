@@ -44,6 +44,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework_simplejwt',
     'auth_app',
@@ -52,6 +53,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'metadata_store.middleware.MemoryProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -59,6 +61,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'metadata_store.middleware.DatabaseLatencyMiddleware',
 ]
 
 ROOT_URLCONF = 'product_store.urls'
@@ -97,6 +100,18 @@ DATABASES = {
     }
 }
 
+# Catalog shards: each location's subtree lives on one of these databases, picked by
+# metadata_store.sharding.ShardRouter. DB_SHARDS lists extra aliases ("shard1,shard2"), each
+# a copy of the default database settings named "<DB_NAME>_<alias>"; create their tables with
+# `migrate --database=<alias>`.
+DB_SHARDS = [alias for alias in os.environ.get("DB_SHARDS", "").split(",") if alias]
+for alias in DB_SHARDS:
+    DATABASES[alias] = {**DATABASES['default'], 'NAME': f"{DATABASES['default']['NAME']}_{alias}"}
+
+CATALOG_SHARDS = ['default'] + DB_SHARDS
+
+DATABASE_ROUTERS = ['metadata_store.sharding.ShardRouter']
+
 CACHES = {
     'default': {
         'BACKEND': 'django_redis.cache.RedisCache',
@@ -110,6 +125,111 @@ CACHES = {
 
 CACHE_TTL = 60 * 15  # 15 minutes
 
+# 'pages' caches whole product list pages, 'objects' caches id lists and composes
+# them with the per-product cache entries.
+PRODUCT_LIST_CACHE_MODE = 'pages'
+
+NEGATIVE_CACHE_TTL = 30  # seconds
+
+# Rewrite the cached plain and detail=true responses of a saved product after its
+# transaction commits, instead of deleting them for the next reader to recompute.
+PRODUCT_CACHE_WRITE_THROUGH = True
+
+# Cache keys hash their canonical query string past this length.
+CACHE_KEY_MAX_QUERY_LENGTH = 200
+
+# Count cache hits, misses and bytes per key prefix in Redis, flushed by each worker this
+# often, and track the size and hits of this many of the largest entries. Reported by
+# `python manage.py cache_report`.
+CACHE_STATS_ENABLED = True
+CACHE_STATS_FLUSH_INTERVAL = 10  # seconds
+CACHE_STATS_TRACKED_KEYS = 10000
+
+BULK_RETRIEVE_MAX_IDS = 100
+
+SUBTREE_DELETE_CHUNK_SIZE = 5000
+
+# Dropping the product partition of a deleted location locks the whole product table; give
+# up after this long instead of stalling product queries behind the lock, and delete the
+# products row by row. `python manage.py sync_product_partitions` drops what is left.
+PARTITION_DROP_LOCK_TIMEOUT = 2  # seconds
+
+# The changes/ feed only returns rows older than this, so transactions committing late
+# don't fall behind a client's cursor. Delete tombstones older than the retention are
+# removed by `python manage.py prune_tombstones`; feeds resumed from before it restart
+# with reset set.
+CHANGE_FEED_VISIBILITY_LAG = 5  # seconds
+TOMBSTONE_RETENTION = 60 * 60 * 24 * 30  # 30 days
+TOMBSTONE_PRUNE_CHUNK_SIZE = 5000
+
+# Worker threads running the sub-requests of batch requests concurrently.
+BATCH_MAX_WORKERS = 4
+
+# Serve autocomplete from an in-memory name index per process, synced with other
+# processes' writes this often; larger catalogs are searched in the database.
+AUTOCOMPLETE_INDEX_ENABLED = True
+AUTOCOMPLETE_INDEX_MAX_ENTRIES = 2000000
+AUTOCOMPLETE_REFRESH_INTERVAL = 5  # seconds
+AUTOCOMPLETE_MAX_LIMIT = 50
+
+# Catalog change events for the events/ stream, kept in a Redis stream of about this many
+# events for resuming clients. Streams send a heartbeat this often and are closed after
+# the max duration; clients reconnect and resume from their last event.
+EVENT_STREAM_ENABLED = True
+EVENT_STREAM_MAX_LENGTH = 100000
+EVENT_STREAM_QUEUE_SIZE = 1000
+EVENT_STREAM_HEARTBEAT = 15  # seconds
+EVENT_STREAM_MAX_DURATION = 300  # seconds
+
+# Read-only catalog snapshot written by `python manage.py build_catalog_snapshot` and
+# served from a memory-mapped file by the snapshot/ endpoints. Workers check for a newly
+# swapped in snapshot this often.
+CATALOG_SNAPSHOT_PATH = os.path.join(BASE_DIR, 'snapshots', 'catalog.snap')
+CATALOG_SNAPSHOT_CHECK_INTERVAL = 5  # seconds
+CATALOG_SNAPSHOT_MAX_LIMIT = 1000
+
+# Apply cache invalidations after commit in a background thread, merging those
+# queued within CACHE_INVALIDATION_WINDOW seconds.
+CACHE_INVALIDATION_ASYNC = True
+CACHE_INVALIDATION_WINDOW = 0.1
+
+# Recompute the most read cached responses in the background after they are invalidated.
+CACHE_WARMING_ENABLED = True
+CACHE_WARMING_TRACKED_KEYS = 500
+CACHE_WARMING_TOP_K = 50
+CACHE_WARMING_DELAY = 1.0  # seconds to wait for more invalidations before warming
+CACHE_WARMING_RATE = 20  # keys per second
+
+# Shared Bloom filter of product ids, rebuilt with `python manage.py rebuild_bloom_filter`.
+PRODUCT_BLOOM_FILTER_ENABLED = False
+PRODUCT_BLOOM_FILTER_CAPACITY = 1000000
+PRODUCT_BLOOM_FILTER_ERROR_RATE = 0.01
+
+# Warm workers up in the background when the WSGI/ASGI application is loaded: connect to
+# the databases and Redis, build the in-process indexes and rewrite the most read product
+# responses missing from the cache. /ready/ responds 503 until it is done. Retried this
+# often while a database is unreachable; a preloading master waits at most
+# STARTUP_WARMUP_FORK_TIMEOUT seconds for it before forking the workers.
+STARTUP_WARMUP_ENABLED = True
+STARTUP_WARMUP_HOT_KEYS = 1000
+STARTUP_WARMUP_RETRY_INTERVAL = 5  # seconds
+STARTUP_WARMUP_FORK_TIMEOUT = 60  # seconds
+
+# OpenAPI document generated at deploy time by `python manage.py generate_openapi_schema`
+# and served by api/v1/schema/; generated on first use if missing. OPENAPI_SCHEMA_URL is
+# the scheme and host it points clients to; empty, they use the host they fetched it from.
+OPENAPI_SCHEMA_PATH = os.path.join(BASE_DIR, 'openapi.json')
+OPENAPI_SCHEMA_URL = os.environ.get('OPENAPI_SCHEMA_URL', '')
+
+# Trace memory allocations with tracemalloc, keeping this many frames per allocation, to
+# report net and peak allocations per endpoint and phase at api/v1/memory/ (staff only)
+# and sample the largest allocation sites this often. Slows workers down severalfold.
+MEMORY_PROFILING_ENABLED = False
+MEMORY_PROFILING_FRAMES = 5
+MEMORY_PROFILING_SAMPLE_INTERVAL = 60  # seconds
+MEMORY_PROFILING_SAMPLES = 60
+MEMORY_PROFILING_TOP_SITES = 20
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
@@ -135,8 +255,39 @@ REST_FRAMEWORK = {
     ),
     'DEFAULT_PAGINATION_CLASS': 'metadata_store.pagination.CustomPageNumberPagination',
     'PAGE_SIZE': 10,
+    'DEFAULT_THROTTLE_CLASSES': (
+        'metadata_store.throttling.TokenBucketThrottle',
+        'metadata_store.throttling.LoadSheddingThrottle',
+    ),
+    'DEFAULT_THROTTLE_RATES': {
+        'default': '120/min',
+        'catalog': '600/min',
+        'feed': '120/min',
+        'jobs': '120/min',
+    },
+}
+
+# Report planner estimates instead of exact counts for result sets of this many
+# rows or more, and cache exact product list counts per filter set for this long.
+PAGINATION_ESTIMATE_COUNT_THRESHOLD = 100000
+PAGINATION_COUNT_CACHE_TTL = 60  # seconds
+
+# Token cost of a request per view action, and the multiplier for detail=true.
+THROTTLE_COSTS = {
+    'detail': 3,
+    'bulk_retrieve': 5,
+    'upsert': 10,
+    'move': 10,
+    'merge': 10,
+    'rename': 10,
 }
 
+# Shed reads costing LOAD_SHEDDING_MIN_COST tokens or more while the average
+# database query takes longer than LOAD_SHEDDING_LATENCY seconds.
+LOAD_SHEDDING_LATENCY = 0.25
+LOAD_SHEDDING_MIN_COST = 3
+LOAD_SHEDDING_RETRY_AFTER = 5
+
 
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
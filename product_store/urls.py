@@ -15,26 +15,12 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-
-schema_view = get_schema_view(
-    openapi.Info(
-        title="Products metadata",
-        default_version='v1',
-        description="Product metadata",
-    ),
-    public=True,
-    permission_classes=[permissions.AllowAny,],
-)
+from metadata_store.views import OpenAPISchemaView, ReadinessView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('ready/', ReadinessView.as_view(), name='ready'),
+    path('api/v1/schema/', OpenAPISchemaView.as_view(), name='openapi-schema'),
     path('api/v1/', include('metadata_store.urls')),
     path('api/v1/auth/', include('auth_app.urls')),
-    # path('', schema_view.with_ui('swagger', cache_timeout=0),
-    #      name='schema-swagger-ui'),
-    # path('redoc/', schema_view.with_ui('redoc',
-    #      cache_timeout=0), name='schema-redoc'),
 ]
@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'product_store.settings')
 
 application = get_wsgi_application()
+
+# Warms the worker up in the background; /ready/ reports when it is done. With a
+# preloading server, every forked worker warms up again.
+from metadata_store.warmup import startup_warmup  # noqa: E402
+
+startup_warmup.start()